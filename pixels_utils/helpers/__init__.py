@@ -1,6 +1,24 @@
-from pixels_utils.helpers._helper import filter_scenes_with_all_nodata, get_satellite_expression_as_df
+from pixels_utils.helpers._datacube import build_datacube
+from pixels_utils.helpers._field_mask_cache import FieldMaskCache
+from pixels_utils.helpers._helper import filter_scenes_with_all_nodata, get_satellite_expression_as_df, preflight_scl
+from pixels_utils.helpers._sample import sample_points, xy_to_rowcol
+from pixels_utils.helpers._scene_quality import filter_scenes_with_low_quality, scene_quality, scl_class_counts
+from pixels_utils.helpers._scene_quality_index import SceneQualityIndex, geometry_key
+from pixels_utils.helpers._scheduler import scene_priority, schedule_clear_observations
 
 __all__ = (
+    "FieldMaskCache",
+    "SceneQualityIndex",
+    "build_datacube",
     "filter_scenes_with_all_nodata",
+    "filter_scenes_with_low_quality",
+    "geometry_key",
     "get_satellite_expression_as_df",
+    "preflight_scl",
+    "sample_points",
+    "scene_priority",
+    "scene_quality",
+    "schedule_clear_observations",
+    "scl_class_counts",
+    "xy_to_rowcol",
 )
@@ -0,0 +1,238 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from enum import Enum
+from math import isclose
+from typing import List, MutableMapping, Tuple, Union
+
+import numpy.ma as ma
+import zarr
+from geojson.feature import Feature
+from numcodecs import Blosc
+from numpy import arange as np_arange
+from numpy import asarray as np_asarray
+from numpy import dtype as np_dtype
+from numpy import float32, floating
+from numpy import full as np_full
+from numpy import int64, issubdtype, nan
+from numpy.typing import ArrayLike
+from pandas import DataFrame, to_datetime
+from rasterio.crs import CRS
+from rasterio.profiles import Profile
+from rasterio.transform import Affine
+from rasterio.warp import Resampling, reproject
+
+from pixels_utils.stac_catalogs.earthsearch.v1 import EARTHSEARCH_SCENE_URL, EarthSearchCollections
+from pixels_utils.titiler import TITILER_ENDPOINT
+from pixels_utils.titiler.endpoints.stac import Crop, QueryParamsCrop
+
+DEFAULT_COMPRESSOR = Blosc(cname="zstd", clevel=5, shuffle=Blosc.BITSHUFFLE)
+
+
+def _check_grid(scene_id: str, profile: Profile, crs: str, transform: Affine):
+    """Raises ValueError if a crop is not on the grid of the cube (same CRS and pixel size, whole-pixel offset)."""
+    src_transform = Affine(*tuple(profile["transform"])[:6])
+    offsets = ((src_transform.c - transform.c) / transform.a, (src_transform.f - transform.f) / transform.e)
+    if (
+        CRS.from_user_input(profile["crs"]) != CRS.from_user_input(crs)
+        or not isclose(src_transform.a, transform.a)
+        or not isclose(src_transform.e, transform.e)
+        or any(abs(offset - round(offset)) > 1e-6 for offset in offsets)
+    ):
+        raise ValueError(
+            f'Scene "{scene_id}" ({profile["crs"]}, {tuple(src_transform)[:6]}) is not on the grid of the datacube '
+            f"({crs}, {tuple(transform)[:6]}); only pass scenes of a single grid (e.g., a single MGRS tile)."
+        )
+
+
+def _align_to_grid(
+    data: ArrayLike, profile: Profile, crs: str, transform: Affine, shape: Tuple[int, int], fill_value: float
+) -> ArrayLike:
+    """Returns `data` filled with `fill_value` and placed on the cube grid (crops must be on the grid; see above)."""
+    data = ma.asarray(data).filled(fill_value)
+    if Affine(*tuple(profile["transform"])[:6]).almost_equals(transform) and data.shape[-2:] == tuple(shape):
+        return data
+    aligned = np_full((data.shape[0],) + tuple(shape), fill_value, dtype=data.dtype)
+    reproject(
+        source=data,
+        destination=aligned,
+        src_transform=profile["transform"],
+        src_crs=profile["crs"],
+        src_nodata=fill_value,
+        dst_transform=transform,
+        dst_crs=crs,
+        dst_nodata=fill_value,
+        resampling=Resampling.nearest,
+    )
+    return aligned
+
+
+def _create_cube(
+    group: zarr.Group,
+    n_bands: int,
+    band_names: List[str],
+    profile: Profile,
+    dtype: np_dtype,
+    fill_value: float,
+    chunk_size: int,
+    compressor: object,
+):
+    """Creates the data and coordinate arrays of an (empty) datacube on the grid of `profile`."""
+    height, width, transform = profile["height"], profile["width"], profile["transform"]
+    n_times = group["time"].shape[0]
+    data = group.create_dataset(
+        "data",
+        shape=(n_times, n_bands, height, width),
+        chunks=(1, 1, min(height, chunk_size), min(width, chunk_size)),
+        dtype=dtype,
+        fill_value=fill_value,
+        compressor=compressor,
+    )
+    data.attrs["_ARRAY_DIMENSIONS"] = ["time", "band", "y", "x"]
+    group.array("band", np_asarray(band_names, dtype=str)).attrs["_ARRAY_DIMENSIONS"] = ["band"]
+    group.array("x", transform.c + (np_arange(width) + 0.5) * transform.a).attrs["_ARRAY_DIMENSIONS"] = ["x"]
+    group.array("y", transform.f + (np_arange(height) + 0.5) * transform.e).attrs["_ARRAY_DIMENSIONS"] = ["y"]
+    group.attrs.update(crs=CRS.from_user_input(profile["crs"]).to_string(), transform=list(transform)[:6])
+
+
+def build_datacube(
+    store: Union[str, MutableMapping],
+    feature: Feature,
+    df_scenes: DataFrame,
+    expression: str = None,
+    assets: List[str] = None,
+    band_names: List[str] = None,
+    gsd: Union[float, int] = None,
+    dtype: np_dtype = float32,
+    nodata: Union[float, int] = None,
+    collection: EarthSearchCollections = EarthSearchCollections.sentinel_2_l2a,
+    chunk_size: int = 512,
+    compressor: object = DEFAULT_COMPRESSOR,
+    max_workers: int = 4,
+    titiler_endpoint: str = TITILER_ENDPOINT,
+    mask_enum: List[Enum] = None,
+    mask_asset: str = None,
+    whitelist: bool = True,
+) -> zarr.Group:
+    """
+    Builds (or extends) a chunked, compressed Zarr datacube with dimensions (time, band, y, x) from `Crop` responses.
+
+    Crops of each scene are requested concurrently (snapped to the native grid of the item; see `Crop`), placed on the
+    grid of the cube, and each time slice is written to the store as soon as it arrives, rather than keeping every crop
+    in memory. The grid of the cube (CRS, transform, and shape) is set by the crop of the earliest scene when the cube
+    is created, and scenes on another grid (e.g., another UTM zone) raise a ValueError rather than being resampled.
+
+    Calling this again with the same store only requests scenes that are not yet complete in the cube. New scenes are
+    appended to the end of the time dimension (sorted by datetime within each call), so the time dimension is in
+    datetime order only if scenes are added chronologically; the "time" array holds the datetime of each slice, so
+    readers can sort (e.g., `xarray.open_zarr(store).sortby("time")`).
+
+    The store follows the xarray Zarr conventions, so it can be opened with `xarray.open_zarr(store)`; masked pixels are
+    set to the fill value (NaN for float dtypes, otherwise `nodata`).
+
+    Example:
+        >>> df_scenes = search_stac_scenes(feature, date_start="2022-04-01", date_end="2022-09-30")
+        >>> cube = build_datacube("field_1.zarr", feature, df_scenes, expression="(nir-red)/(nir+red)", gsd=10)
+        >>> cube["data"][:, 0, 10, 10]  # time series of one pixel
+
+    Args:
+        store (Union[str, MutableMapping]): Path (or Zarr store) of the datacube.
+        feature (Feature): Feature (e.g., field or region) to crop.
+        df_scenes (DataFrame): Scenes to add (e.g., from `search_stac_scenes()`); "id" and "datetime" are required.
+        expression (str, optional): Semicolon (;) delimited expression(s); one band per expression. Defaults to None.
+        assets (List[str], optional): Assets to crop (one band per asset). Defaults to None.
+        band_names (List[str], optional): Band names. Defaults to the expressions or assets.
+        gsd (Union[float, int], optional): Ground sample distance (the grid origin of the item is kept). Defaults to the
+        native resolution.
+
+        dtype (np_dtype, optional): Data type of the cube. Defaults to float32.
+        nodata (Union[float, int], optional): Fill value of masked pixels. Defaults to NaN (or 0 for integer dtypes).
+        collection (EarthSearchCollections, optional): Collection of the scenes. Defaults to sentinel_2_l2a.
+        chunk_size (int, optional): Chunk size (in pixels) of the y and x dimensions; each chunk holds one time slice of
+        one band. Defaults to 512.
+
+        compressor (object, optional): Numcodecs compressor. Defaults to Blosc (zstd, bit shuffle).
+        max_workers (int, optional): Maximum number of crops to request concurrently. Defaults to 4.
+        titiler_endpoint (str): The titiler endpoint. Defaults to `https://pixels.sentera.com`.
+        mask_enum (List[Enum], optional): Classes to consider for pixel-based masking (see `Crop`). Defaults to None.
+        mask_asset (str, optional): Asset containing the classes for pixel-based masking. Defaults to None.
+        whitelist (bool, optional): Whether `mask_enum` classes are valid (True) or invalid (False). Defaults to True.
+
+    Raises:
+        ValueError: If the crop of a scene is not on the grid of the cube.
+
+    Returns:
+        zarr.Group: The datacube, with arrays "data" (time, band, y, x), "time" (seconds since 1970-01-01), "scene_id",
+        "complete" (whether each time slice was written), "band", "y", and "x", and "crs" and "transform" attributes.
+    """
+    dtype = np_dtype(dtype)
+    fill_value = (nan if issubdtype(dtype, floating) else 0) if nodata is None else nodata
+    if band_names is None:
+        band_names = [expr for expr in expression.split(";") if expr] if expression is not None else list(assets)
+
+    group = zarr.open_group(store, mode="a")
+    if "time" not in group:
+        group.create_dataset("time", shape=(0,), chunks=(4096,), dtype=int64)
+        group.create_dataset("scene_id", shape=(0,), chunks=(4096,), dtype="<U128")
+        group.create_dataset("complete", shape=(0,), chunks=(4096,), dtype=bool)
+        group["time"].attrs.update(_ARRAY_DIMENSIONS=["time"], units="seconds since 1970-01-01", calendar="standard")
+        group["scene_id"].attrs["_ARRAY_DIMENSIONS"] = ["time"]
+        group["complete"].attrs["_ARRAY_DIMENSIONS"] = ["time"]
+
+    # Position of each scene along the time dimension; new scenes are appended (in datetime order)
+    positions = {scene_id: i for i, scene_id in enumerate(group["scene_id"][:])}
+    complete = group["complete"][:]
+    df_scenes = df_scenes.assign(_time=to_datetime(df_scenes["datetime"], utc=True)).sort_values("_time")
+    df_new = df_scenes.loc[~df_scenes["id"].isin(list(positions.keys()))].drop_duplicates("id")
+    if len(df_new) > 0:
+        n_times = len(positions) + len(df_new)
+        for name in ["time", "scene_id", "complete"] + (["data"] if "data" in group else []):
+            group[name].resize((n_times,) + group[name].shape[1:])
+        positions.update({scene_id: len(positions) + i for i, scene_id in enumerate(df_new["id"])})
+        new = slice(n_times - len(df_new), n_times)
+        group["time"][new] = (df_new["_time"].astype("int64") // 10**9).to_numpy()
+        group["scene_id"][new] = df_new["id"].to_numpy(dtype=str)
+        complete = group["complete"][:]
+    df_todo = df_scenes.loc[[not complete[positions[scene_id]] for scene_id in df_scenes["id"]]]
+    logging.info("Adding %s scenes to datacube (%s already complete).", len(df_todo), int(complete.sum()))
+
+    def crop_scene(scene_id: str) -> Tuple[str, ArrayLike, Profile]:
+        query_params = QueryParamsCrop(
+            url=EARTHSEARCH_SCENE_URL.format(collection=collection.name, id=scene_id),
+            feature=feature,
+            expression=expression,
+            assets=assets,
+            asset_as_band=True,
+            gsd=gsd,
+            snap_to_grid=True,
+        )
+        crop = Crop(
+            query_params=query_params,
+            titiler_endpoint=titiler_endpoint,
+            mask_enum=mask_enum,
+            mask_asset=mask_asset,
+            whitelist=whitelist,
+        )
+        data, profile, _ = crop.to_rasterio(dtype=dtype, band_names=band_names)
+        return scene_id, data, profile
+
+    def write_scene(scene_id: str, data: ArrayLike, profile: Profile):
+        crs, transform = group.attrs["crs"], Affine(*group.attrs["transform"])
+        _check_grid(scene_id, profile, crs, transform)
+        shape = group["data"].shape[-2:]
+        group["data"][positions[scene_id]] = _align_to_grid(
+            data.astype(dtype, copy=False), profile, crs, transform, shape, fill_value
+        )
+        group["complete"][positions[scene_id]] = True
+        logging.debug("%s: wrote time slice %s", scene_id, positions[scene_id])
+
+    scene_ids = list(df_todo["id"].unique())  # in datetime order
+    if "data" not in group and len(scene_ids) > 0:
+        # The earliest scene sets the grid of the cube, so the grid does not depend on which crop finishes first
+        scene_id, data, profile = crop_scene(scene_ids.pop(0))
+        _create_cube(group, data.shape[0], band_names, profile, dtype, fill_value, chunk_size, compressor)
+        write_scene(scene_id, data, profile)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Futures are not referenced after they are written, so crops are released as soon as they are in the store
+        for future in as_completed(executor.submit(crop_scene, scene_id) for scene_id in scene_ids):
+            write_scene(*future.result())
+    return group
@@ -0,0 +1,152 @@
+import logging
+from math import ceil, floor
+from typing import Any, Dict, Hashable, Tuple
+
+from numpy import asarray as np_asarray
+from numpy import ndarray as np_ndarray
+from numpy import packbits as np_packbits
+from numpy import unpackbits as np_unpackbits
+from numpy import zeros as np_zeros
+from pyproj.crs import CRS
+from rasterio.features import geometry_mask
+from rasterio.transform import Affine
+from shapely.geometry.base import BaseGeometry
+
+from pixels_utils.helpers._sample import xy_to_rowcol
+from pixels_utils.titiler.endpoints.stac.crop._crop_grid import geometry_to_crs
+
+GridKey = Tuple[str, Tuple[float, ...], Tuple[int, int]]
+
+
+class FieldMaskCache:
+    """
+    Rasterizes each field geometry once per output grid, and stores it as a packed bitmask.
+
+    Crops of the same field(s) on the same grid (e.g., with `snap_to_grid=True`, or the same `Crop` query across many
+    scenes) share their transform and shape, so geometry work (reprojection, rasterization, and centroids) only has to
+    be done for the first scene. Each field mask is stored for the window of the grid that covers the field's bounds
+    (packed to 1 bit per pixel), so memory scales with the field area rather than the grid area.
+
+    Example:
+        >>> cache = FieldMaskCache(gdf_fields.geometry)  # keyed by the GeoSeries index
+        >>> for scene in scenes:
+        >>>     data, profile, _ = crop(scene).to_rasterio()  # rasterized on the first scene only
+        >>>     (rows, cols), inside = cache.window("field_1", profile["transform"], data.shape, crs=profile["crs"])
+        >>>     values = data[0, rows, cols][inside]
+
+    Args:
+        geometries (Any): Field geometries; a GeoSeries (keyed by index), a dict of {field_id: geometry}, or an
+        iterable of geometries (keyed by position).
+
+        crs (str, optional): CRS of `geometries`. Defaults to the CRS of the GeoSeries, otherwise "EPSG:4326".
+        all_touched (bool, optional): Whether to include all pixels touched by a geometry (True), or only pixels whose
+        center is within the geometry (False). Defaults to False.
+    """
+
+    def __init__(self, geometries: Any, crs: str = None, all_touched: bool = False):
+        crs = getattr(geometries, "crs", None) if crs is None else crs
+        self.crs = CRS.from_user_input("EPSG:4326" if crs is None else crs).to_string()
+        self.all_touched = all_touched
+        self.geometries = dict(geometries.items() if hasattr(geometries, "items") else enumerate(geometries))
+        self._geometries_by_crs = {self.crs: self.geometries}
+        self._windows = {}  # {grid_key: {field_id: (row_off, col_off, height, width, packed_bits)}}
+        self._centroids = {}  # {grid_key: (rows, cols)}
+
+    @property
+    def field_ids(self) -> list:
+        return list(self.geometries.keys())
+
+    def grid_key(self, transform: Affine, shape: Tuple[int, int], crs: str = None) -> GridKey:
+        """Returns the key of an output grid (CRS, affine transform, and shape)."""
+        crs = self.crs if crs is None else CRS.from_user_input(crs).to_string()
+        return crs, tuple(Affine(*tuple(transform)[:6]))[:6], tuple(int(n) for n in tuple(shape)[-2:])
+
+    def _geometries(self, crs: str) -> Dict[Hashable, BaseGeometry]:
+        """Field geometries in `crs` (reprojected once per CRS)."""
+        if crs not in self._geometries_by_crs:
+            logging.debug("Reprojecting %s field geometries to %s", len(self.geometries), crs)
+            self._geometries_by_crs[crs] = {
+                field_id: geometry_to_crs(geometry, dst_crs=crs, src_crs=self.crs)
+                for field_id, geometry in self.geometries.items()
+            }
+        return self._geometries_by_crs[crs]
+
+    def _rasterize(self, geometry: BaseGeometry, transform: Affine, shape: Tuple[int, int]) -> Tuple:
+        """Rasterizes `geometry` over the window of the grid that covers its bounds."""
+        minx, miny, maxx, maxy = geometry.bounds
+        col_min, row_min = ~transform * (minx, maxy)
+        col_max, row_max = ~transform * (maxx, miny)
+        col_min, col_max = sorted((col_min, col_max))
+        row_min, row_max = sorted((row_min, row_max))
+        row_off, col_off = max(floor(row_min), 0), max(floor(col_min), 0)
+        height, width = min(ceil(row_max), shape[0]) - row_off, min(ceil(col_max), shape[1]) - col_off
+        if height <= 0 or width <= 0 or geometry.is_empty:
+            return 0, 0, 0, 0, np_packbits(np_zeros(0, dtype=bool))
+        inside = geometry_mask(
+            [geometry],
+            out_shape=(height, width),
+            transform=transform * Affine.translation(col_off, row_off),
+            all_touched=self.all_touched,
+            invert=True,
+        )
+        return row_off, col_off, height, width, np_packbits(inside, axis=None)
+
+    def _grid_windows(self, transform: Affine, shape: Tuple[int, int], crs: str = None) -> Dict[Hashable, Tuple]:
+        key = self.grid_key(transform, shape, crs=crs)
+        if key not in self._windows:
+            logging.debug("Rasterizing %s field masks for grid %s", len(self.geometries), key)
+            transform = Affine(*key[1])
+            self._windows[key] = {
+                field_id: self._rasterize(geometry, transform, key[2])
+                for field_id, geometry in self._geometries(key[0]).items()
+            }
+        return self._windows[key]
+
+    def window(
+        self, field_id: Hashable, transform: Affine, shape: Tuple[int, int], crs: str = None
+    ) -> Tuple[Tuple[slice, slice], np_ndarray]:
+        """
+        Gets the window of the grid covering a field, and the field mask within that window.
+
+        Args:
+            field_id (Hashable): Field ID.
+            transform (Affine): Affine transform of the grid (e.g., `profile["transform"]` from `Crop.to_rasterio()`).
+            shape (Tuple[int, int]): Shape of the grid (rows, columns); leading dimensions (e.g., bands) are ignored.
+            crs (str, optional): CRS of the grid. Defaults to the CRS of the field geometries.
+
+        Returns:
+            Tuple[Tuple[slice, slice], np_ndarray]: Row and column slices of the window, and the boolean field mask
+            (True within the field) with the shape of the window.
+        """
+        row_off, col_off, height, width, packed = self._grid_windows(transform, shape, crs=crs)[field_id]
+        inside = np_unpackbits(packed, count=height * width).astype(bool).reshape(height, width)
+        return (slice(row_off, row_off + height), slice(col_off, col_off + width)), inside
+
+    def mask(self, field_id: Hashable, transform: Affine, shape: Tuple[int, int], crs: str = None) -> np_ndarray:
+        """Gets the boolean field mask (True within the field) over the full grid (see `FieldMaskCache.window()`)."""
+        shape = tuple(int(n) for n in tuple(shape)[-2:])
+        (rows, cols), inside = self.window(field_id, transform, shape, crs=crs)
+        mask = np_zeros(shape, dtype=bool)
+        mask[rows, cols] = inside
+        return mask
+
+    def centroids(self, transform: Affine, shape: Tuple[int, int], crs: str = None) -> Tuple[np_ndarray, np_ndarray]:
+        """
+        Gets the row and column of the pixel containing each field centroid (computed once per grid).
+
+        Args:
+            transform (Affine): Affine transform of the grid.
+            shape (Tuple[int, int]): Shape of the grid (rows, columns); leading dimensions are ignored.
+            crs (str, optional): CRS of the grid. Defaults to the CRS of the field geometries.
+
+        Returns:
+            Tuple[np_ndarray, np_ndarray]: Rows and columns (in the order of `FieldMaskCache.field_ids`); centroids
+            outside of the grid are set to -1.
+        """
+        key = self.grid_key(transform, shape, crs=crs)
+        if key not in self._centroids:
+            xy = np_asarray([geometry.centroid.coords[0] for geometry in self._geometries(key[0]).values()]).reshape(
+                -1, 2
+            )
+            self._centroids[key] = xy_to_rowcol(Affine(*key[1]), xy[:, 0], xy[:, 1], shape=key[2])
+        return self._centroids[key]
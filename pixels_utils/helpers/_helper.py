@@ -1,28 +1,67 @@
 import logging
 from datetime import datetime
-from typing import Union
+from enum import Enum
+from typing import List, Union
 
 from geojson.feature import Feature
+from numpy import asarray as np_asarray
 from numpy import float32
 from pandas import DataFrame, Series, concat
-from rasterio import MemoryFile
 from rasterio.enums import Resampling
-from rasterio.sample import sample_gen
+from shapely import centroid as shapely_centroid
+from shapely import get_x as shapely_get_x
+from shapely import get_y as shapely_get_y
 from tqdm import tqdm
 
+from pixels_utils.helpers._field_mask_cache import FieldMaskCache
+from pixels_utils.helpers._sample import sample_points, xy_to_rowcol
+from pixels_utils.helpers._scene_quality import scl_class_counts
 from pixels_utils.scenes import parse_nested_stac_data
 from pixels_utils.stac_catalogs.earthsearch.v1 import EARTHSEARCH_SCENE_URL, EarthSearchCollections, Expression
 from pixels_utils.titiler import TITILER_ENDPOINT
 from pixels_utils.titiler.endpoints.stac import Crop, QueryParamsCrop, QueryParamsStatistics, Statistics
+from pixels_utils.titiler.mask._local_mask import build_mask_lut
 from pixels_utils.titiler.mask.enum_classes import Sentinel2_SCL_Group
 
 
+def preflight_scl(
+    scene_url: str,
+    feature: Feature,
+    gsd: Union[float, int] = 60,
+    mask_enum: List[Enum] = Sentinel2_SCL_Group.ARABLE,
+) -> bool:
+    """
+    Checks whether a scene has any pixels of the `mask_enum` classes over a feature with a coarse SCL request.
+
+    A single categorical statistics request of only the "scl" asset (at a coarse `gsd`) is a fraction of the server and
+    transfer cost of a full-resolution expression, so it is used to reject scenes (e.g., cloudy scenes) before any
+    full-resolution request is made.
+
+    Note:
+        Pixels are resampled with nearest neighbor, so small patches of the `mask_enum` classes may be missed at a
+        coarse `gsd`; use a `gsd` closer to the native resolution (20 m) to reject fewer scenes.
+
+    Args:
+        scene_url (str): STAC item URL.
+        feature (Feature): Feature to check.
+        gsd (Union[float, int], optional): Coarse ground sample distance of the request. Defaults to 60.
+        mask_enum (List[Enum], optional): SCL classes considered valid. Defaults to `Sentinel2_SCL_Group.ARABLE`.
+
+    Returns:
+        bool: Whether at least one pixel of the `mask_enum` classes is within the feature.
+    """
+    counts, _ = scl_class_counts(scene_url, feature, gsd=gsd)
+    return bool(counts[build_mask_lut(mask_enum, whitelist=True)].any())
+
+
 def filter_scenes_with_all_nodata(
     df_scenes: DataFrame,
     feature: Feature,
     expression_obj: Expression,
     gsd: Union[float, int] = 10,
     nodata: Union[float, int] = -999,
+    preflight: bool = False,
+    preflight_gsd: Union[float, int] = 60,
 ) -> list:
     """
     Finds the index of all scenes without any valid pixels across the extent of the field group geometry.
@@ -34,6 +73,10 @@ def filter_scenes_with_all_nodata(
 
     Args:
         df_scenes (DataFrame): Initial list of scenes to process.
+        preflight (bool, optional): Whether to first check each scene with a coarse SCL request (see `preflight_scl()`);
+        the full-resolution request is only made for scenes that pass. Defaults to False.
+
+        preflight_gsd (Union[float, int], optional): Ground sample distance of the preflight request. Defaults to 60.
 
     Returns:
         list: Index values of df_scenes that can safely be removed because they do not have any valid pixels.
@@ -53,6 +96,11 @@ def filter_scenes_with_all_nodata(
 
         scene_url = EARTHSEARCH_SCENE_URL.format(collection=EarthSearchCollections.sentinel_2_l2a.name, id=scene["id"])
 
+        if preflight is True and not preflight_scl(scene_url, feature, gsd=preflight_gsd):
+            logging.debug("%s: No valid pixels available (preflight)", date.date())
+            ind_nodata += [ind]
+            continue
+
         query_params = QueryParamsStatistics(
             url=scene_url,
             feature=feature,
@@ -101,11 +149,18 @@ def get_satellite_expression_as_df(
     expression_obj: Expression,
     gsd: Union[float, int],
     nodata: Union[float, int],
+    field_mask_cache: FieldMaskCache = None,
 ) -> DataFrame:
     """
     Retrieves image for `scene_url` via sentera.pixels.com based on `expression_obj`, then samples the NDVI value for
     each centroid in `gdf_fields_subset`.
 
+    Centroids are converted to pixel rows/columns with a vectorized affine inverse and gathered directly from the
+    in-memory masked array (see `sample_points()`).
+
+    Args:
+        field_mask_cache (FieldMaskCache, optional): Cache built from `gdf_fields_subset` geometries (in the same order);
+        if passed, centroid rows/columns are only computed once per grid and reused across scenes. Defaults to None.
 
     Returns:
         DataFrame: NDVI values with "field_id" and "geom_id" join keys.
@@ -136,23 +191,17 @@ def get_satellite_expression_as_df(
         }
     )
 
-    with MemoryFile() as memfile:
-        with memfile.open(**profile_mask) as src:  # Open as DatasetWriter
-            src.write(data_mask)
-
-            # Do not sort xy in sample_gen function; order must be maintained for merging to primary keys
-            df_data = DataFrame(
-                data=sample_gen(
-                    src,
-                    xy=list(
-                        gdf_fields_subset[gdf_fields_subset.geometry.name].apply(
-                            lambda geometry: geometry.centroid.coords[0]
-                        )
-                    ),
-                ),
-                # columns=["ndvi"],
-                columns=[expression_obj.short_name],
-            )
+    if field_mask_cache is not None:
+        rows, cols = field_mask_cache.centroids(profile_mask["transform"], data_mask.shape, crs=profile_mask["crs"])
+    else:
+        centroids = shapely_centroid(np_asarray(gdf_fields_subset[gdf_fields_subset.geometry.name]))
+        rows, cols = xy_to_rowcol(
+            profile_mask["transform"], shapely_get_x(centroids), shapely_get_y(centroids), shape=data_mask.shape
+        )
+    # Order of points is maintained for merging to primary keys
+    values = sample_points(data_mask, rows, cols)[0]
+    df_data = DataFrame(data=values.filled(nodata), columns=[expression_obj.short_name])
+
     # Remove any rows where ndvi is set to NODATA
     # df_data.drop(df_data.loc[df_data["ndvi"] == nodata].index, inplace=True)
     df_data.drop(df_data.loc[df_data[expression_obj.short_name] == nodata].index, inplace=True)
@@ -0,0 +1,64 @@
+from typing import Tuple
+
+import numpy.ma as ma
+from numpy import asarray as np_asarray
+from numpy import clip as np_clip
+from numpy import float64
+from numpy import floor as np_floor
+from numpy import ndarray as np_ndarray
+from numpy.typing import ArrayLike
+from rasterio.transform import Affine
+
+
+def xy_to_rowcol(
+    transform: Affine, x: ArrayLike, y: ArrayLike, shape: Tuple[int, int] = None
+) -> Tuple[np_ndarray, np_ndarray]:
+    """
+    Converts coordinates to the row and column of the pixel containing them, for all points at once.
+
+    Args:
+        transform (Affine): Affine transform of the grid (e.g., `profile["transform"]` from `Crop.to_rasterio()`).
+        x (ArrayLike): X coordinates (e.g., longitude), in the CRS of the grid.
+        y (ArrayLike): Y coordinates (e.g., latitude), in the CRS of the grid.
+        shape (Tuple[int, int], optional): Shape of the grid (rows, columns); leading dimensions are ignored. If passed,
+        points outside of the grid are set to -1. Defaults to None.
+
+    Returns:
+        Tuple[np_ndarray, np_ndarray]: Rows and columns of each point.
+    """
+    cols, rows = ~Affine(*tuple(transform)[:6]) * (np_asarray(x, dtype=float64), np_asarray(y, dtype=float64))
+    rows, cols = np_floor(rows).astype(int), np_floor(cols).astype(int)
+    if shape is not None:
+        outside = (rows < 0) | (rows >= shape[-2]) | (cols < 0) | (cols >= shape[-1])
+        rows[outside], cols[outside] = -1, -1
+    return rows, cols
+
+
+def sample_points(data: ArrayLike, rows: ArrayLike, cols: ArrayLike) -> ArrayLike:
+    """
+    Gathers the values of many points from a (masked) raster or stack of rasters in a single fancy-indexing operation.
+
+    Unlike `rasterio.sample.sample_gen()`, this reads directly from the in-memory array, so crops do not have to be
+    written to a `MemoryFile` and reopened to be sampled.
+
+    Example:
+        >>> rows, cols = xy_to_rowcol(profile["transform"], gdf.centroid.x, gdf.centroid.y, shape=data.shape)
+        >>> values = sample_points(data_stack, rows, cols)  # (scenes, bands, points)
+
+    Args:
+        data (ArrayLike): Masked data array; the last two dimensions must be (rows, columns), e.g. (bands, rows,
+        columns) or (scenes, bands, rows, columns).
+
+        rows (ArrayLike): Row of each point (see `xy_to_rowcol()`); points outside of the grid should be -1.
+        cols (ArrayLike): Column of each point; points outside of the grid should be -1.
+
+    Returns:
+        ArrayLike: Masked array with shape (..., points); points that are masked in `data` or outside of the grid are
+        masked.
+    """
+    rows, cols = np_asarray(rows, dtype=int), np_asarray(cols, dtype=int)
+    outside = (rows < 0) | (rows >= data.shape[-2]) | (cols < 0) | (cols >= data.shape[-1])
+    rows, cols = np_clip(rows, 0, data.shape[-2] - 1), np_clip(cols, 0, data.shape[-1] - 1)
+    values = ma.getdata(data)[..., rows, cols]
+    mask = ma.getmaskarray(data)[..., rows, cols] | outside
+    return ma.masked_array(values, mask=mask, fill_value=ma.asarray(data).fill_value)
@@ -0,0 +1,160 @@
+import logging
+from enum import Enum
+from typing import Dict, List, Tuple, Union
+
+from geojson.feature import Feature
+from numpy import asarray as np_asarray
+from numpy import int64
+from numpy import ndarray as np_ndarray
+from numpy import zeros as np_zeros
+from pandas import DataFrame
+from rasterio.enums import Resampling
+from tqdm import tqdm
+
+from pixels_utils.helpers._scene_quality_index import SceneQualityIndex
+from pixels_utils.stac_catalogs.earthsearch.v1 import EARTHSEARCH_SCENE_URL, EarthSearchCollections
+from pixels_utils.titiler import TITILER_ENDPOINT
+from pixels_utils.titiler.endpoints.stac import QueryParamsStatistics, Statistics
+from pixels_utils.titiler.endpoints.stac.crop._count_crop_pixels import B3, C1, C2, _class_breakdown
+from pixels_utils.titiler.mask._local_mask import N_CLASSES
+from pixels_utils.titiler.mask.enum_classes import Sentinel2_SCL, Sentinel2_SCL_Group
+
+
+def _categorical_counts(statistics: Dict) -> Tuple[np_ndarray, int]:
+    """
+    Parses the statistics of a categorical band (histogram is [counts, classes]) into counts of each class value.
+
+    Returns:
+        Tuple[np_ndarray, int]: Count of each class value within the feature (256), and count of masked pixels.
+    """
+    counts = np_zeros(N_CLASSES, dtype=int64)
+    for n, c in zip(*statistics["histogram"]):
+        counts[int(c)] += int(n)
+    return counts, int(statistics.get("masked_pixels") or 0)
+
+
+def scl_class_counts(
+    scene_url: str, feature: Feature, gsd: Union[float, int] = 20, clear_cache: bool = False
+) -> Tuple[np_ndarray, int]:
+    """
+    Counts the pixels of each SCL class over a feature with a single categorical statistics request.
+
+    Only the "scl" asset is requested (with nearest neighbor resampling), so this is much cheaper than evaluating an
+    expression (e.g., masked NDVI) over the feature.
+
+    Args:
+        scene_url (str): STAC item URL.
+        feature (Feature): Feature to count pixels over.
+        gsd (Union[float, int], optional): Ground sample distance of the request; use a coarse `gsd` (e.g., 60) for a
+        cheaper (but approximate) preflight. Defaults to 20 (the native resolution of the "scl" asset).
+
+        clear_cache (bool, optional): Whether to clear the cache. Defaults to False.
+
+    Returns:
+        Tuple[np_ndarray, int]: Count of each class value within the feature (256), and count of masked pixels (e.g.,
+        outside the feature).
+    """
+    query_params = QueryParamsStatistics(
+        url=scene_url,
+        feature=feature,
+        assets=["scl"],
+        asset_as_band=True,
+        gsd=gsd,
+        resampling=Resampling.nearest.name,
+        categorical=True,
+        c=[scl.value for scl in Sentinel2_SCL],
+    )
+    stats_scl = Statistics(query_params=query_params, clear_cache=clear_cache, titiler_endpoint=TITILER_ENDPOINT)
+    statistics = stats_scl.response.json()["properties"]["statistics"]
+    return _categorical_counts(list(statistics.values())[0])
+
+
+def scene_quality(
+    df_scenes: DataFrame,
+    feature: Feature,
+    mask_enum: List[Enum] = Sentinel2_SCL_Group.ARABLE,
+    whitelist: bool = True,
+    gsd: Union[float, int] = 20,
+    index: SceneQualityIndex = None,
+) -> DataFrame:
+    """
+    Gets the SCL class breakdown of each scene over a feature (one categorical request per scene).
+
+    Example:
+        >>> df_quality = scene_quality(df_scenes, feature)
+        >>> df_scenes_clear = df_scenes.loc[df_quality["whitelist_pct"] >= 80]
+
+    Args:
+        df_scenes (DataFrame): Scenes to check (e.g., from `search_stac_scenes()`); "id" is required.
+        feature (Feature): Feature to count pixels over.
+        mask_enum (List[Enum], optional): SCL classes to consider for pixel-based masking. Defaults to
+        `Sentinel2_SCL_Group.ARABLE`.
+
+        whitelist (bool, optional): Whether `mask_enum` classes are considered "valid" (True) or "invalid" (False).
+        Defaults to True.
+
+        gsd (Union[float, int], optional): Ground sample distance of each request. Defaults to 20.
+        index (SceneQualityIndex, optional): Persistent index of SCL class counts; scenes already in the index are not
+        requested, and the counts of requested scenes are added to it. Defaults to None.
+
+    Returns:
+        DataFrame: Mask ENUM pixel stats of each scene (see `count_valid_whitelist_pixels()`), with the pixel count of
+        each SCL class as its own column, indexed like `df_scenes`.
+    """
+    indexed = index.get(feature, df_scenes["id"], gsd=gsd) if index is not None else {}
+    counts, n_outside = [], []
+    for ind in tqdm(list(df_scenes.index), desc="Counting SCL classes over the plot area"):
+        scene_id = df_scenes.loc[ind, "id"]
+        if scene_id in indexed:
+            counts_scene, n_outside_scene = indexed[scene_id]
+        else:
+            scene_url = EARTHSEARCH_SCENE_URL.format(collection=EarthSearchCollections.sentinel_2_l2a.name, id=scene_id)
+            counts_scene, n_outside_scene = scl_class_counts(scene_url, feature, gsd=gsd)
+            if index is not None:
+                index.put(feature, scene_id, counts_scene, n_outside_scene, gsd=gsd)
+        counts.append(counts_scene)
+        n_outside.append(n_outside_scene)
+
+    counts = np_asarray(counts, dtype=int64).reshape(-1, N_CLASSES)
+    stats = _class_breakdown(
+        counts, np_asarray(n_outside, dtype=int64), mask_enum=mask_enum, whitelist=whitelist, stack=True
+    )
+    pix_by_class = stats.pop(C1)
+    _ = stats.pop(C2)
+    return DataFrame({**stats, **pix_by_class}, index=df_scenes.index)
+
+
+def filter_scenes_with_low_quality(
+    df_scenes: DataFrame,
+    feature: Feature,
+    min_clear_pct: float = 50.0,
+    mask_enum: List[Enum] = Sentinel2_SCL_Group.ARABLE,
+    gsd: Union[float, int] = 20,
+    index: SceneQualityIndex = None,
+) -> list:
+    """
+    Finds the index of all scenes where less than `min_clear_pct` of the feature is clear (see `scene_quality()`).
+
+    This replaces evaluating a masked expression per scene (see `filter_scenes_with_all_nodata()`) with one cheap
+    categorical SCL request per scene.
+
+    Args:
+        df_scenes (DataFrame): Initial list of scenes to process.
+        feature (Feature): Feature to check.
+        min_clear_pct (float, optional): Minimum percentage of pixels within the feature that are of the `mask_enum`
+        classes. Use 0 to only remove scenes without any clear pixels. Defaults to 50.
+
+        mask_enum (List[Enum], optional): SCL classes considered clear. Defaults to `Sentinel2_SCL_Group.ARABLE`.
+        gsd (Union[float, int], optional): Ground sample distance of each request. Defaults to 20.
+        index (SceneQualityIndex, optional): Persistent index of SCL class counts (see `scene_quality()`). Defaults to
+        None.
+
+    Returns:
+        list: Index values of df_scenes that can be removed because they do not have enough clear pixels.
+    """
+    df_quality = scene_quality(df_scenes, feature, mask_enum=mask_enum, whitelist=True, gsd=gsd, index=index)
+    clear_pct = df_quality[B3].fillna(0)
+    keep = (clear_pct >= min_clear_pct) & (clear_pct > 0)
+    for ind in df_quality.index[~keep]:
+        logging.debug("%s: %s%% clear pixels", df_scenes.loc[ind, "id"], round(clear_pct[ind], 1))
+    return list(df_quality.index[~keep])
@@ -0,0 +1,126 @@
+import logging
+import sqlite3
+from contextlib import closing
+from hashlib import sha1
+from json import dumps as json_dumps
+from json import loads as json_loads
+from os import makedirs
+from os.path import dirname
+from typing import Any, Dict, Iterable, Tuple, Union
+
+from geo_utils.vector import geojson_to_shapely
+from numpy import int64
+from numpy import ndarray as np_ndarray
+from numpy import nonzero as np_nonzero
+from numpy import zeros as np_zeros
+from shapely import normalize as shapely_normalize
+from shapely import set_precision as shapely_set_precision
+from shapely import to_wkb as shapely_to_wkb
+
+from pixels_utils.titiler.mask._local_mask import N_CLASSES
+
+SCENE_QUALITY_INDEX_PATH = "/tmp/pixels-utils-cache/scene_quality.sqlite"
+
+
+def geometry_key(feature: Any, precision: float = 1e-7) -> str:
+    """Returns a stable key of a feature's geometry (a hash of the normalized geometry, snapped to `precision`)."""
+    geometry = shapely_normalize(shapely_set_precision(geojson_to_shapely(feature), precision))
+    return sha1(shapely_to_wkb(geometry)).hexdigest()
+
+
+class SceneQualityIndex:
+    """
+    Persistent (SQLite) index of SCL class counts per field geometry and scene.
+
+    SCL class counts (see `scl_class_counts()`) do not depend on the expression being computed, so once a (field, scene)
+    pair is in the index, any pipeline (e.g., a different spectral index over the same season) can look up scene
+    quality without a request. The index populates incrementally as new scenes are checked.
+
+    Example:
+        >>> index = SceneQualityIndex()
+        >>> df_quality = scene_quality(df_scenes, feature, index=index)  # only requests scenes not yet indexed
+
+    Args:
+        path (str, optional): Path to the SQLite database (created if it does not exist). Defaults to
+        "/tmp/pixels-utils-cache/scene_quality.sqlite".
+    """
+
+    def __init__(self, path: str = SCENE_QUALITY_INDEX_PATH):
+        self.path = path
+        if path != ":memory:" and dirname(path):
+            makedirs(dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS scene_quality (
+                    geometry_key TEXT NOT NULL,
+                    scene_id TEXT NOT NULL,
+                    gsd REAL NOT NULL,
+                    counts TEXT NOT NULL,
+                    n_outside INTEGER NOT NULL,
+                    PRIMARY KEY (geometry_key, scene_id, gsd)
+                )
+                """,
+            )
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self) -> int:
+        with closing(self._conn.cursor()) as cursor:
+            return cursor.execute("SELECT COUNT(*) FROM scene_quality").fetchone()[0]
+
+    def get(
+        self, feature: Any, scene_ids: Iterable[str], gsd: Union[float, int] = 20
+    ) -> Dict[str, Tuple[np_ndarray, int]]:
+        """
+        Gets the indexed SCL class counts of a feature for many scenes (in batched queries).
+
+        Args:
+            feature (Any): GeoJSON Feature (or geometry).
+            scene_ids (Iterable[str]): Scene IDs.
+            gsd (Union[float, int], optional): Ground sample distance of the counts. Defaults to 20.
+
+        Returns:
+            Dict[str, Tuple[np_ndarray, int]]: Count of each class value within the feature (256) and count of masked
+            pixels, keyed by scene ID; scenes that are not indexed are omitted.
+        """
+        scene_ids = list(scene_ids)
+        if len(scene_ids) == 0:
+            return {}
+        key = geometry_key(feature)
+        indexed = {}
+        with closing(self._conn.cursor()) as cursor:
+            for i in range(0, len(scene_ids), 500):  # stay within SQLite's limit of query parameters
+                chunk = scene_ids[i : i + 500]
+                rows = cursor.execute(
+                    "SELECT scene_id, counts, n_outside FROM scene_quality "
+                    f"WHERE geometry_key = ? AND gsd = ? AND scene_id IN ({','.join('?' * len(chunk))})",
+                    [key, float(gsd)] + chunk,
+                ).fetchall()
+                for scene_id, counts_json, n_outside in rows:
+                    counts = np_zeros(N_CLASSES, dtype=int64)
+                    for c, n in json_loads(counts_json).items():
+                        counts[int(c)] = n
+                    indexed[scene_id] = counts, n_outside
+        logging.debug("%s of %s scenes found in the scene quality index.", len(indexed), len(scene_ids))
+        return indexed
+
+    def put(self, feature: Any, scene_id: str, counts: np_ndarray, n_outside: int, gsd: Union[float, int] = 20) -> None:
+        """
+        Adds (or replaces) the SCL class counts of a feature for a scene.
+
+        Args:
+            feature (Any): GeoJSON Feature (or geometry).
+            scene_id (str): Scene ID.
+            counts (np_ndarray): Count of each class value within the feature (256; see `scl_class_counts()`).
+            n_outside (int): Count of masked pixels (e.g., outside the feature).
+            gsd (Union[float, int], optional): Ground sample distance of the counts. Defaults to 20.
+        """
+        counts_json = json_dumps({int(c): int(counts[c]) for c in np_nonzero(counts)[0]})
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scene_quality VALUES (?, ?, ?, ?, ?)",
+                (geometry_key(feature), scene_id, float(gsd), counts_json, int(n_outside)),
+            )
@@ -0,0 +1,165 @@
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Hashable, List, Tuple, Union
+
+from geojson.feature import Feature
+from numpy import asarray as np_asarray
+from pandas import DataFrame, Series, Timestamp, to_datetime
+
+from pixels_utils.helpers._scene_quality_index import SceneQualityIndex
+from pixels_utils.titiler.mask._local_mask import build_mask_lut
+from pixels_utils.titiler.mask.enum_classes import Sentinel2_SCL_Group
+
+
+def scene_priority(
+    df_scenes: DataFrame,
+    feature: Feature = None,
+    target_date: Union[datetime, str] = None,
+    date_weight: float = 0.01,
+    index: SceneQualityIndex = None,
+    mask_enum: List[Enum] = Sentinel2_SCL_Group.ARABLE,
+    gsd: Union[float, int] = 20,
+) -> Series:
+    """
+    Scores the expected quality of each scene (higher is better).
+
+    The expected clear fraction of each scene is its indexed clear fraction over `feature` (if `index` is passed and the
+    scene is indexed; see `SceneQualityIndex`), otherwise `1 - eo:cloud_cover / 100` of the item (or 0.5 if unknown).
+    If `target_date` is passed, `date_weight` is subtracted for every day between the scene and `target_date`.
+
+    Args:
+        df_scenes (DataFrame): Candidate scenes (e.g., from `search_stac_scenes()`); "id", "datetime", and
+        "properties" are used.
+
+        feature (Feature, optional): Feature to look up in `index`. Defaults to None.
+        target_date (Union[datetime, str], optional): Target date of the observations. Defaults to None.
+        date_weight (float, optional): Penalty per day from `target_date` (e.g., 0.01 ranks a perfectly clear scene 30
+        days away the same as a 70% clear scene on the target date). Defaults to 0.01.
+
+        index (SceneQualityIndex, optional): Persistent index of SCL class counts. Defaults to None.
+        mask_enum (List[Enum], optional): SCL classes considered clear. Defaults to `Sentinel2_SCL_Group.ARABLE`.
+        gsd (Union[float, int], optional): Ground sample distance of the indexed counts. Defaults to 20.
+
+    Returns:
+        Series: Priority of each scene, indexed like `df_scenes`.
+    """
+    cloud_cover = df_scenes["properties"].apply(lambda properties: properties.get("eo:cloud_cover"))
+    priority = (1 - cloud_cover.astype(float) / 100).fillna(0.5)
+    if index is not None and feature is not None:
+        lut = build_mask_lut(mask_enum, whitelist=True)
+        indexed = index.get(feature, df_scenes["id"], gsd=gsd)
+        for ind, scene_id in df_scenes["id"].items():
+            if scene_id in indexed and indexed[scene_id][0].sum() > 0:
+                counts = indexed[scene_id][0]
+                priority[ind] = counts[lut].sum() / counts.sum()
+    if target_date is not None:
+        dates = to_datetime(df_scenes["datetime"], utc=True)
+        days = (dates - Timestamp(target_date, tz="UTC")).abs().dt.total_seconds() / 86400
+        priority -= date_weight * days
+    return priority
+
+
+def schedule_clear_observations(
+    df_scenes: DataFrame,
+    features: Dict[Hashable, Feature],
+    process: Callable[[Series, Hashable, Feature], Any],
+    k: int = 1,
+    freq: str = None,
+    date_weight: float = 0.01,
+    index: SceneQualityIndex = None,
+    mask_enum: List[Enum] = Sentinel2_SCL_Group.ARABLE,
+    gsd: Union[float, int] = 20,
+    max_workers: int = 4,
+) -> Dict[Tuple[Hashable, Any], List[Tuple[Hashable, Any]]]:
+    """
+    Processes the best scenes of each field (and time window) concurrently, until `k` valid observations are collected.
+
+    Rather than processing every scene in datetime order, the candidate scenes of each (field, window) are ordered by
+    `scene_priority()` (cloud cover or indexed scene quality, and proximity to the middle of the window), and `process`
+    is only called for the next best scene while fewer than `k` valid observations have been collected (counting those
+    in progress). Once a (field, window) has `k` valid observations, no more requests are issued for it.
+
+    Example:
+        >>> def process(scene, field_id, feature):
+        >>>     df = get_satellite_expression_as_df(...)  # returns None if the field is not clear in the scene
+        >>>     return df if len(df) > 0 else None
+        >>> observations = schedule_clear_observations(df_scenes, features, process, k=2, freq="M")
+
+    Args:
+        df_scenes (DataFrame): Candidate scenes (e.g., from `search_stac_scenes()`); "id", "datetime", and
+        "properties" are used.
+
+        features (Dict[Hashable, Feature]): Features (e.g., fields) keyed by field ID.
+        process (Callable[[Series, Hashable, Feature], Any]): Function called with a scene (row of `df_scenes`), field
+        ID, and feature; it must return None if the observation is not valid (e.g., too cloudy).
+
+        k (int, optional): Number of valid observations to collect for each field and window. Defaults to 1.
+        freq (str, optional): Pandas period frequency of the time windows (e.g., "W", "M"). Defaults to None (a single
+        window for all scenes).
+
+        date_weight (float, optional): Penalty per day from the middle of the window (see `scene_priority()`).
+        Defaults to 0.01.
+
+        index (SceneQualityIndex, optional): Persistent index of SCL class counts used to rank scenes. Defaults to None.
+        mask_enum (List[Enum], optional): SCL classes considered clear. Defaults to `Sentinel2_SCL_Group.ARABLE`.
+        gsd (Union[float, int], optional): Ground sample distance of the indexed counts. Defaults to 20.
+        max_workers (int, optional): Maximum number of scenes to process concurrently. Defaults to 4.
+
+    Returns:
+        Dict[Tuple[Hashable, Any], List[Tuple[Hashable, Any]]]: Index of each valid scene in `df_scenes` and the output
+        of `process`, keyed by (field ID, window); the window is a pandas Period (or None if `freq` is None).
+    """
+    dates = to_datetime(df_scenes["datetime"], utc=True)
+    windows = dates.dt.tz_localize(None).dt.to_period(freq) if freq is not None else Series(0, index=df_scenes.index)
+
+    queues = {}  # {(field_id, window): deque of scene indexes, best first}
+    for field_id, feature in features.items():
+        for window, df_window in df_scenes.groupby(windows, sort=True):
+            window = None if freq is None else window
+            target_date = window.start_time + (window.end_time - window.start_time) / 2 if window is not None else None
+            priority = scene_priority(
+                df_window,
+                feature=feature,
+                target_date=target_date,
+                date_weight=date_weight,
+                index=index,
+                mask_enum=mask_enum,
+                gsd=gsd,
+            )
+            order = (-np_asarray(priority.values)).argsort(kind="stable")  # ties stay in datetime order
+            queues[(field_id, window)] = deque(df_window.index[order])
+
+    observations = {key: [] for key in queues}
+    in_progress = {key: 0 for key in queues}
+    pending = {}  # {future: ((field_id, window), scene index)}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def submit(key):
+            while queues[key] and len(observations[key]) + in_progress[key] < k:
+                ind = queues[key].popleft()
+                pending[executor.submit(process, df_scenes.loc[ind], key[0], features[key[0]])] = key, ind
+                in_progress[key] += 1
+
+        for key in queues:
+            submit(key)
+        while pending:
+            done, _ = wait(list(pending.keys()), return_when=FIRST_COMPLETED)
+            for future in done:
+                key, ind = pending.pop(future)
+                in_progress[key] -= 1
+                result = future.result()
+                if result is not None:
+                    observations[key].append((ind, result))
+                submit(key)
+
+    n_processed = len(df_scenes) * len(features) - sum(len(queue) for queue in queues.values())
+    logging.debug(
+        "Processed %s of %s (scene, field) pairs to collect %s valid observations.",
+        n_processed,
+        len(df_scenes) * len(features),
+        sum(len(obs) for obs in observations.values()),
+    )
+    return observations
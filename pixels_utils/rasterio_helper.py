@@ -3,7 +3,7 @@ from contextlib import suppress
 from os import remove as os_remove
 from os.path import dirname, split
 from pathlib import Path
-from typing import List
+from typing import List, Union
 
 import numpy.typing as npt
 from rasterio import Env
@@ -18,7 +18,46 @@ def combine_profile_tags(ds: DatasetReader) -> Profile:
     return ds.tags() | ds.profile.copy()
 
 
-def set_driver_tags(profile: Profile, driver: str = "Gtiff", interleave: str = None) -> Profile:
+COG_COMPRESS = ["DEFLATE", "ZSTD", "LERC", "LERC_DEFLATE", "LERC_ZSTD", "LZW", "NONE"]
+
+
+def set_driver_tags(
+    profile: Profile,
+    driver: str = "Gtiff",
+    interleave: str = None,
+    compress: str = None,
+    overview_resampling: str = "AVERAGE",
+    max_z_error: float = None,
+    num_threads: Union[int, str] = "ALL_CPUS",
+) -> Profile:
+    """
+    Sets the creation options of `driver` in `profile`.
+
+    For "COG", the image is written as a Cloud Optimized GeoTIFF: internally tiled (512x512), compressed (with a
+    predictor chosen for the dtype, except for LERC), and with overviews; compression and overview generation are
+    multi-threaded.
+
+    Args:
+        profile (Profile): Rasterio Profile to update.
+        driver (str, optional): One of ["ENVI", "Gtiff", "COG"]. Defaults to "Gtiff".
+        interleave (str, optional): The interleave format of "ENVI" images. Defaults to None.
+        compress (str, optional): Compression of "COG" images (one of `COG_COMPRESS`). Defaults to "DEFLATE" ("Gtiff"
+        images are always uncompressed).
+
+        overview_resampling (str, optional): Resampling of the overviews of "COG" images; use "NEAREST" for categorical
+        data (e.g., SCL). Defaults to "AVERAGE".
+
+        max_z_error (float, optional): Maximum error of LERC compression (0 is lossless). Defaults to None (0).
+        num_threads (Union[int, str], optional): Number of threads used to compress "COG" images. Defaults to
+        "ALL_CPUS".
+
+    Raises:
+        ValueError: If `interleave` or `compress` is not valid for `driver`.
+        AttributeError: If driver is set to "PostGISRaster" (read-only).
+
+    Returns:
+        Profile: The updated profile.
+    """
     if driver == "ENVI":
         if interleave not in ["bip", "bsq", "bil"]:
             raise ValueError('`interleave` must be one of ["bip", "bsq", "bil"].')
@@ -27,6 +66,22 @@ def set_driver_tags(profile: Profile, driver: str = "Gtiff", interleave: str = N
     elif driver == "Gtiff":
         profile["INTERLEAVE"] = "PIXEL"
         profile["COMPRESS"] = "NONE"
+    elif driver == "COG":
+        compress = "DEFLATE" if compress is None else compress.upper()
+        if compress not in COG_COMPRESS:
+            raise ValueError(f"`compress` must be one of {COG_COMPRESS}.")
+        for key in ["tiled", "blockxsize", "blockysize", "interleave", "compress", "INTERLEAVE"]:
+            profile.pop(key, None)  # GTiff layout options are not valid for the COG driver
+        profile["COMPRESS"] = compress
+        profile["BLOCKSIZE"] = 512
+        profile["OVERVIEWS"] = "AUTO"
+        profile["OVERVIEW_RESAMPLING"] = overview_resampling.upper()
+        profile["NUM_THREADS"] = str(num_threads)
+        profile["BIGTIFF"] = "IF_SAFER"
+        if compress.startswith("LERC"):
+            profile["MAX_Z_ERROR"] = 0 if max_z_error is None else max_z_error
+        elif compress != "NONE":
+            profile["PREDICTOR"] = "YES"  # horizontal differencing for integers, floating point predictor for floats
     elif driver == "PostGISRaster":  # provides read-only support to PostGIS raster data sources
         raise AttributeError('"PostGISRaster" provides read-only support.')
     return profile
@@ -48,7 +103,7 @@ def ensure_data_profile_consistency(
     )
     profile.update(nodata=array.get_fill_value()) if profile["nodata"] is not None else None
     try:
-        array = array.astype(profile["dtype"])
+        array = array.astype(profile["dtype"], copy=False)  # only copies if the dtype differs
     except KeyError:
         if check_dtype(array.dtype):
             profile.update(dtype=array.dtype)
@@ -94,6 +149,10 @@ def save_image(
     driver: str = "Gtiff",
     interleave: str = None,
     keep_xml: bool = False,
+    compress: str = None,
+    overview_resampling: str = "AVERAGE",
+    max_z_error: float = None,
+    num_threads: Union[int, str] = "ALL_CPUS",
 ):
     """Saves image array to disk with each <profile> items stored as tags.
 
@@ -103,7 +162,8 @@ def save_image(
         fname_out: The output filename.
 
         driver: The driver used to save the image array. Must be one of ["ENVI",
-            "Gtiff"]. The default is "Gtiff".
+            "Gtiff", "COG"]. Use "COG" to write a tiled, compressed Cloud Optimized
+            GeoTIFF with overviews (see `set_driver_tags()`). The default is "Gtiff".
 
         interleave (str): The intereave format to save image. Ignored if `driver` is
             not "ENVI". Defaults to None.
@@ -112,6 +172,18 @@ def save_image(
             well. Setting ``keep_xml`` to ``False`` deletes the .xml upon creation to
             avoid clutter in the folder directory. The default is False.
 
+        compress (str): Compression of "COG" images (e.g., "DEFLATE", "ZSTD", or
+            "LERC"). Defaults to None ("DEFLATE").
+
+        overview_resampling (str): Resampling of the overviews of "COG" images. Use
+            "NEAREST" for categorical data. Defaults to "AVERAGE".
+
+        max_z_error (float): Maximum error of "LERC" compression of "COG" images (0 is
+            lossless). Defaults to None (0).
+
+        num_threads: Number of threads used to compress "COG" images and build their
+            overviews. Defaults to "ALL_CPUS".
+
     Raises:
         AttributeError: If driver is set to "PostGISRaster" (not yet supported).
     """
@@ -122,11 +194,20 @@ def save_image(
         pass
     logging.debug('Saving "%s"', split(fname_out)[-1])
 
-    profile = set_driver_tags(profile, driver, interleave)
+    profile = set_driver_tags(
+        profile,
+        driver,
+        interleave,
+        compress=compress,
+        overview_resampling=overview_resampling,
+        max_z_error=max_z_error,
+        num_threads=num_threads,
+    )
     array, profile = ensure_data_profile_consistency(array, profile, driver)
     band_descriptions = get_band_description(profile)
 
-    with Env(), rio_open(fname_out, "w", **profile) as rast_out:
+    env_options = {"GDAL_NUM_THREADS": str(num_threads)} if driver == "COG" else {}  # multi-threaded overviews
+    with Env(**env_options), rio_open(fname_out, "w", **profile) as rast_out:
         rast_out.write(array)  # write raster first
         [rast_out.set_band_description(i + 1, info) for i, info in enumerate(band_descriptions)][0]
         rast_out.update_tags(**profile)
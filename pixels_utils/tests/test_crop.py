@@ -0,0 +1,598 @@
+from dataclasses import replace
+from json import dumps as json_dumps
+
+import mock
+import numpy as np
+import sure
+from marshmallow import ValidationError
+from rasterio.io import MemoryFile
+from rasterio.transform import Affine, from_bounds, from_origin
+from requests import Response
+from shapely.geometry import box, mapping
+
+from pixels_utils.tests.data.load_data import sample_feature, sample_scene_url
+from pixels_utils.titiler.endpoints.stac import (
+    Crop,
+    CropExpressions,
+    CropMultiPart,
+    CropRegional,
+    CropTiled,
+    QueryParamsCrop,
+    assets_from_expressions,
+    cluster_geometries,
+    evaluate_expressions,
+)
+from pixels_utils.titiler.endpoints.stac.crop import (
+    crop_statistics,
+    parse_crop_response,
+    rescale_stac_crop,
+    split_crop_bands,
+    zonal_statistics,
+)
+from pixels_utils.titiler.endpoints.stac.crop._count_crop_pixels import (
+    count_feature_pixels,
+    count_valid_whitelist_pixels,
+    feature_pixel_counts,
+)
+from pixels_utils.titiler.endpoints.stac.crop._crop_grid import geometry_to_crs, native_grid, snap_bounds_to_grid
+from pixels_utils.titiler.endpoints.stac.crop._crop_response_utils import _crop_set_mask
+from pixels_utils.titiler.endpoints.stac.crop._crop_tiled import split_bounds_to_tiles
+from pixels_utils.titiler.mask.enum_classes import Sentinel2_SCL, Sentinel2_SCL_Group
+
+_ = sure.version
+
+
+def crop_response(
+    data: np.ndarray,
+    alpha: np.ndarray,
+    crs: str = "EPSG:4326",
+    bounds: tuple = (-119.05, 46.23, -119.03, 46.25),
+) -> Response:
+    """Builds a STAC crop-like response (data bands followed by a 0/255 alpha band) as a GeoTIFF."""
+    count, height, width = data.shape[0] + 1, data.shape[1], data.shape[2]
+    profile = dict(
+        driver="GTiff",
+        count=count,
+        height=height,
+        width=width,
+        dtype=data.dtype,
+        crs=crs,
+        transform=from_bounds(*bounds, width, height),
+    )
+    with MemoryFile() as m:
+        with m.open(**profile) as ds:
+            ds.write(np.concatenate([data, alpha[np.newaxis].astype(data.dtype)]))
+        content = m.read()
+    r = Response()
+    r._content = content
+    r.status_code = 200
+    return r
+
+
+class Test_Crop_Split_Bands:
+    DATA = np.arange(3 * 4 * 5, dtype="float32").reshape(3, 4, 5)
+    ALPHA = np.full((4, 5), 255, dtype="uint8")
+    ALPHA[0, :] = 0
+    BAND_NAMES = ["NDVI", "NDRE", "GNDVI"]
+
+    def test_split_crop_bands_views(self):
+        data_mask = np.ma.masked_array(self.DATA.copy(), mask=np.zeros_like(self.DATA, dtype=bool))
+        bands = split_crop_bands(data_mask, self.BAND_NAMES)
+        list(bands.keys()).should.equal(self.BAND_NAMES)
+        for i, band_name in enumerate(self.BAND_NAMES):
+            bands[band_name].shape.should.equal((1, 4, 5))
+            np.shares_memory(bands[band_name].data, data_mask.data).should.be.true
+            np.array_equal(bands[band_name].data[0], self.DATA[i]).should.be.true
+
+    def test_split_crop_bands_length_mismatch(self):
+        split_crop_bands.when.called_with(self.DATA, self.BAND_NAMES[:2]).should.have.raised(ValueError)
+
+    def test_parse_crop_response_split_bands(self):
+        r = crop_response(self.DATA, self.ALPHA)
+        bands, profile, tags = parse_crop_response(r, split_bands=True, band_names=self.BAND_NAMES)
+        list(bands.keys()).should.equal(self.BAND_NAMES)
+        profile["count"].should.equal(3)
+        for i, band_name in enumerate(self.BAND_NAMES):
+            bands[band_name].mask[0, 0, :].all().should.be.true
+            bands[band_name].mask[0, 1:, :].any().should.be.false
+            np.array_equal(bands[band_name].data[0, 1:, :], self.DATA[i, 1:, :]).should.be.true
+
+
+class Test_Crop_Set_Mask:
+    DATA = np.arange(2 * 4 * 5, dtype="uint8").reshape(2, 4, 5)
+    ALPHA = np.full((4, 5), 255, dtype="uint8")
+    ALPHA[:, 0] = 0
+    PROFILE = {"driver": "GTiff", "nodata": None}
+
+    def test_crop_set_mask_no_copy(self):
+        data = np.concatenate([self.DATA, self.ALPHA[np.newaxis]])
+        data_mask, profile = _crop_set_mask(data, dict(self.PROFILE), nodata=0)
+        np.shares_memory(data_mask.data, data).should.be.true
+        data_mask.mask[:, :, 0].all().should.be.true
+        data_mask.mask[:, :, 1:].any().should.be.false
+        profile["dtype"].should.equal(np.dtype("uint8"))
+        data_mask[0, 1, 1] = np.ma.masked  # mask is writeable (not a read-only broadcast view)
+        data_mask.mask[1, 1, 1].should.be.false
+
+    def test_crop_set_mask_nodata_dtype(self):
+        data = np.concatenate([self.DATA, self.ALPHA[np.newaxis]])
+        data_mask, profile = _crop_set_mask(data, dict(self.PROFILE), nodata=-1)
+        data_mask.dtype.should.equal(np.dtype("int16"))  # holds both uint8 data and the nodata value
+        np.array_equal(data_mask.data, self.DATA).should.be.true
+        profile["nodata"].should.equal(-1)
+
+
+class Test_Crop_Rescale:
+    DATA = np.ma.masked_array(
+        np.stack([np.linspace(0.0, 1.0, 20).reshape(4, 5), np.linspace(-1.0, 1.0, 20).reshape(4, 5)]),
+        mask=np.zeros((2, 4, 5), dtype=bool),
+    )
+    DATA[:, 0, 0] = np.ma.masked
+    DATA.data[:, 0, 0] = -9999  # nodata under the mask must not affect the range
+
+    def test_rescale_stac_crop(self):
+        data_scaled = rescale_stac_crop(self.DATA, ["0,255", "0,100"], dtype="uint8")
+        data_scaled.dtype.should.equal(np.dtype("uint8"))
+        int(data_scaled[0].min()).should.equal(0)
+        int(data_scaled[0].max()).should.equal(255)
+        int(data_scaled[1].max()).should.equal(100)
+        data_scaled.mask[:, 0, 0].all().should.be.true
+        int(data_scaled.data[0, 0, 0]).should.equal(0)  # masked pixels are clipped to the output range
+
+    def test_rescale_stac_crop_output_min(self):
+        data_scaled = rescale_stac_crop(self.DATA, ["-1,1", "10,20"], dtype="float32")
+        float(data_scaled[0].min()).should.equal(-1.0, epsilon=1e-6)
+        float(data_scaled[1].min()).should.equal(10.0, epsilon=1e-6)
+        float(data_scaled[1].max()).should.equal(20.0, epsilon=1e-6)
+
+    def test_rescale_stac_crop_chunked(self):
+        data_scaled = rescale_stac_crop(self.DATA, ["0,255", "0,255"], dtype="uint8")
+        data_chunked = rescale_stac_crop(self.DATA, ["0,255", "0,255"], dtype="uint8", chunk_size=3)
+        np.array_equal(data_scaled.data, data_chunked.data).should.be.true
+
+    def test_rescale_stac_crop_constant_band(self):
+        data = np.ma.masked_array(np.ones((1, 4, 5), dtype="float32"), mask=False)
+        data_scaled = rescale_stac_crop(data, ["0,255"], dtype="uint8")
+        data_scaled.data.max().should.equal(0)
+
+    def test_rescale_stac_crop_format(self):
+        rescale_stac_crop.when.called_with(self.DATA, ["0,255"], dtype="uint8").should.have.raised(RuntimeError)
+        rescale_stac_crop.when.called_with(self.DATA, ["0,255", "255"], dtype="uint8").should.have.raised(ValueError)
+
+
+class Test_Crop_Statistics:
+    RNG = np.random.default_rng(42)
+    DATA = np.ma.masked_array(
+        RNG.integers(0, 20, size=(2, 30, 40)).astype("float32") / 10,
+        mask=RNG.random(size=(2, 30, 40)) > 0.7,
+    )
+    BAND_NAMES = ["NDVI", "NDRE"]
+
+    def test_crop_statistics_matches_numpy(self):
+        stats = crop_statistics(self.DATA, band_names=self.BAND_NAMES, p=[2, 50, 98])
+        list(stats.keys()).should.equal(self.BAND_NAMES)
+        for i, band_name in enumerate(self.BAND_NAMES):
+            band = self.DATA[i]
+            values = band.compressed().astype("float64")
+            keys, counts = np.unique(values, return_counts=True)
+            h_counts, h_edges = np.histogram(values, bins=10)
+            stats[band_name]["min"].should.equal(float(values.min()), epsilon=1e-9)
+            stats[band_name]["max"].should.equal(float(values.max()), epsilon=1e-9)
+            stats[band_name]["mean"].should.equal(float(values.mean()), epsilon=1e-9)
+            stats[band_name]["std"].should.equal(float(values.std()), epsilon=1e-9)
+            stats[band_name]["sum"].should.equal(float(values.sum()), epsilon=1e-6)
+            stats[band_name]["median"].should.equal(float(np.median(values)), epsilon=1e-9)
+            stats[band_name]["percentile_98"].should.equal(float(np.percentile(values, 98)), epsilon=1e-9)
+            stats[band_name]["count"].should.equal(float(band.count()))
+            stats[band_name]["masked_pixels"].should.equal(float(np.ma.count_masked(band)))
+            stats[band_name]["valid_percent"].should.equal(round(band.count() / band.size * 100, 2))
+            stats[band_name]["majority"].should.equal(float(keys[counts.argmax()]))
+            stats[band_name]["minority"].should.equal(float(keys[counts.argmin()]))
+            stats[band_name]["unique"].should.equal(float(keys.size))
+            stats[band_name]["histogram"][0].should.equal(h_counts.tolist())
+            np.allclose(stats[band_name]["histogram"][1], h_edges).should.be.true
+
+    def test_crop_statistics_histogram_params(self):
+        stats = crop_statistics(self.DATA, histogram_bins="4", histogram_range="0,2")
+        values = self.DATA[0].compressed()
+        h_counts, _ = np.histogram(values, bins=4, range=(0, 2))
+        stats["b1"]["histogram"][0].should.equal(h_counts.tolist())
+
+        stats = crop_statistics(self.DATA, histogram_bins="0,0.5,1.9")
+        h_counts, _ = np.histogram(values, bins=[0, 0.5, 1.9])
+        stats["b1"]["histogram"][0].should.equal(h_counts.tolist())
+
+    def test_crop_statistics_histogram_bin_edges(self):
+        data = np.ma.masked_array(self.RNG.integers(0, 16, size=(2, 30, 40)) / 10)  # many values on bin edges
+        for bins, histogram_range in [(3, None), (7, None), (10, None), (3, (0.1, 1.3))]:
+            stats = crop_statistics(data, histogram_bins=bins, histogram_range=histogram_range)
+            for i in range(2):
+                h_counts, h_edges = np.histogram(data[i].compressed(), bins=bins, range=histogram_range)
+                stats[f"b{i + 1}"]["histogram"][0].should.equal(h_counts.tolist())
+                stats[f"b{i + 1}"]["histogram"][1].should.equal(h_edges.tolist())
+
+    def test_crop_statistics_histogram_bin_edges_float32(self):
+        # Edges are computed in float32 for float32 data (as in numpy), so values near an edge may change bins
+        data = np.ma.masked_array((self.RNG.integers(0, 64, size=(2, 30, 40)) / 30).astype("float32"))
+        for bins, histogram_range in [(3, None), (7, None), (10, None), (3, (0.1, 1.3)), (9, (0.7, 1.9))]:
+            stats = crop_statistics(data, histogram_bins=bins, histogram_range=histogram_range)
+            for i in range(2):
+                h_counts, h_edges = np.histogram(data[i].compressed(), bins=bins, range=histogram_range)
+                h_edges.dtype.should.equal(np.float32)
+                stats[f"b{i + 1}"]["histogram"][0].should.equal(h_counts.tolist())
+                stats[f"b{i + 1}"]["histogram"][1].should.equal(h_edges.tolist())
+
+    def test_crop_statistics_categorical(self):
+        stats = crop_statistics(self.DATA, categorical=True)
+        for i in range(2):
+            keys, counts = np.unique(self.DATA[i].compressed().astype("float64"), return_counts=True)
+            stats[f"b{i + 1}"]["histogram"].should.equal([counts.tolist(), keys.tolist()])
+
+        stats = crop_statistics(self.DATA, categorical=True, c=[1.5, 0, 7])
+        values = self.DATA[0].compressed()
+        stats["b1"]["histogram"].should.equal([[int((values == 1.5).sum()), int((values == 0).sum()), 0], [1.5, 0, 7]])
+
+    def test_crop_statistics_json_all_masked(self):
+        data = self.DATA.copy()
+        data[1] = np.ma.masked
+        stats = crop_statistics(data)
+        stats["b2"]["count"].should.equal(0.0)
+        stats["b2"]["mean"].should.be.none
+        json_dumps(stats, allow_nan=False).should.be.a(str)
+
+
+class Test_Crop_Evaluate_Expressions:
+    RNG = np.random.default_rng(7)
+    BAND_NAMES = ["nir", "red", "green", "scl"]
+    NIR, RED, GREEN = RNG.random(size=(3, 20, 30)).astype("float32") + 0.01
+    SCL = RNG.integers(0, 12, size=(20, 30)).astype("float32")
+    FEATURE_MASK = RNG.random(size=(20, 30)) > 0.8
+    DATA = np.ma.masked_array(np.stack([NIR, RED, GREEN, SCL]), mask=np.broadcast_to(FEATURE_MASK, (4, 20, 30)).copy())
+    EXPRESSIONS = {"NDVI": "(nir-red)/(nir+red)", "GNDVI": "(nir-green)/(nir+green)"}
+
+    def test_assets_from_expressions(self):
+        assets_from_expressions(list(self.EXPRESSIONS.values()) + ["where(nir>0,sqrt(nir08),0)"]).should.equal(
+            ["nir", "red", "green", "nir08"]
+        )
+        assets_from_expressions("(nir-red)/(nir+red+L)*(1+L)", constants=["L"]).should.equal(["nir", "red"])
+
+    def test_evaluate_expressions(self):
+        arrays = evaluate_expressions(self.DATA, self.BAND_NAMES, self.EXPRESSIONS)
+        list(arrays.keys()).should.equal(["NDVI", "GNDVI"])
+        arrays["NDVI"].shape.should.equal((1, 20, 30))
+        np.allclose(arrays["NDVI"].data[0], (self.NIR - self.RED) / (self.NIR + self.RED)).should.be.true
+        np.array_equal(arrays["GNDVI"].mask[0], self.FEATURE_MASK).should.be.true
+
+    def test_evaluate_expressions_mask_enum(self):
+        mask_enum = Sentinel2_SCL_Group.ARABLE
+        arable = np.isin(self.SCL, [int(c) for c in mask_enum])
+        arrays_wl = evaluate_expressions(self.DATA, self.BAND_NAMES, self.EXPRESSIONS, mask_enum=mask_enum)
+        np.array_equal(arrays_wl["NDVI"].mask[0], self.FEATURE_MASK | ~arable).should.be.true
+        arrays_bl = evaluate_expressions(
+            self.DATA, self.BAND_NAMES, self.EXPRESSIONS, mask_enum=mask_enum, whitelist=False
+        )
+        np.array_equal(arrays_bl["NDVI"].mask[0], self.FEATURE_MASK | arable).should.be.true
+
+    def test_crop_expressions_mask_asset_resampling(self):
+        query_params = QueryParamsCrop(url=sample_scene_url(1), feature=sample_feature(1), resampling="bilinear")
+        CropExpressions.when.called_with(query_params, self.EXPRESSIONS, mask_asset="scl").should.have.raised(
+            ValueError, "nearest"
+        )
+
+    def test_evaluate_expressions_missing_asset(self):
+        evaluate_expressions.when.called_with(
+            self.DATA, self.BAND_NAMES, ["(nir-swir16)/(nir+swir16)"]
+        ).should.have.raised(ValueError)
+
+
+class Test_Crop_Count_Valid_Whitelist_Pixels:
+    RNG = np.random.default_rng(11)
+    SCL = RNG.integers(0, 12, size=(4, 20, 30)).astype("uint8")
+    FEATURE_MASK = RNG.random(size=(20, 30)) > 0.7
+    DATA = np.ma.masked_array(SCL, mask=np.broadcast_to(FEATURE_MASK, SCL.shape).copy())
+    MASK_ENUM = Sentinel2_SCL_Group.ARABLE
+
+    def test_count_valid_whitelist_pixels(self):
+        scl_in = self.SCL[0][~self.FEATURE_MASK]
+        arable = np.isin(scl_in, [int(c) for c in self.MASK_ENUM]).sum()
+        stats = count_valid_whitelist_pixels(self.DATA, self.MASK_ENUM, whitelist=True)
+        stats["feature_in_pix"].should.equal(scl_in.size)
+        stats["feature_out_pix"].should.equal(self.FEATURE_MASK.sum())
+        stats["whitelist_pix"].should.equal(arable)
+        stats["blacklist_pix"].should.equal(scl_in.size - arable)
+        stats["pix_by_class"].should.equal({scl.name: int((scl_in == scl).sum()) for scl in Sentinel2_SCL})
+        sum(stats["pct_by_class"].values()).should.equal(100.0, epsilon=1e-6)
+
+    def test_count_valid_whitelist_pixels_blacklist(self):
+        stats_wl = count_valid_whitelist_pixels(self.DATA, self.MASK_ENUM, whitelist=True)
+        stats_bl = count_valid_whitelist_pixels(self.DATA, self.MASK_ENUM, whitelist=False)
+        stats_bl["whitelist_pix"].should.equal(stats_wl["blacklist_pix"])
+        stats_bl["blacklist_pct"].should.equal(stats_wl["whitelist_pct"], epsilon=1e-6)
+
+    def test_count_valid_whitelist_pixels_no_mask_enum(self):
+        stats = count_valid_whitelist_pixels(self.DATA, None, whitelist=True)
+        stats["whitelist_pix"].should.be.none
+        stats["blacklist_pct"].should.be.none
+
+    def test_count_valid_whitelist_pixels_stack(self):
+        stats = count_valid_whitelist_pixels(self.DATA, self.MASK_ENUM, whitelist=True, stack=True)
+        stats["whitelist_pix"].shape.should.equal((4,))
+        for i in range(4):
+            stats_i = count_valid_whitelist_pixels(self.DATA[i : i + 1], self.MASK_ENUM, whitelist=True)
+            for key in ["feature_in_pix", "feature_out_pix", "whitelist_pix", "blacklist_pix"]:
+                stats[key][i].should.equal(stats_i[key])
+            stats["pix_by_class"]["VEGETATION"][i].should.equal(stats_i["pix_by_class"]["VEGETATION"])
+
+
+class Test_Crop_Count_Feature_Pixels:
+    RNG = np.random.default_rng(13)
+    BAND_NAMES = ["nir", "red"]
+    MASK = RNG.random(size=(3, 2, 20, 30)) > 0.6
+    DATA = np.ma.masked_array(RNG.random(size=(3, 2, 20, 30)), mask=MASK)
+
+    def test_count_feature_pixels(self):
+        stats = count_feature_pixels(self.DATA[0], self.BAND_NAMES)
+        for i, band_name in enumerate(self.BAND_NAMES):
+            stats["feature_in_pix"][band_name].should.equal(np.ma.count(self.DATA[0, i]))
+            stats["feature_out_pix"][band_name].should.equal(np.ma.count_masked(self.DATA[0, i]))
+            (stats["feature_in_pct"][band_name] + stats["feature_out_pct"][band_name]).should.equal(100.0, epsilon=1e-6)
+
+    def test_feature_pixel_counts_stack(self):
+        counts = feature_pixel_counts(self.DATA, self.BAND_NAMES)
+        counts.feature_in_pix.shape.should.equal((3, 2))
+        np.array_equal(counts.feature_out_pix, self.MASK.sum(axis=(2, 3))).should.be.true
+        counts.to_dict()["feature_out_pix"]["red"].tolist().should.equal(self.MASK[:, 1].sum(axis=(1, 2)).tolist())
+        df = counts.to_dataframe()
+        list(df.columns[:2]).should.equal(["scene", "band"])
+        len(df).should.equal(6)
+        df.loc[(df["scene"] == 2) & (df["band"] == "red"), "feature_out_pix"].item().should.equal(self.MASK[2, 1].sum())
+
+    def test_feature_pixel_counts_band_names(self):
+        feature_pixel_counts.when.called_with(self.DATA, ["nir"]).should.have.raised(ValueError)
+
+
+class Test_Crop_Snap_To_Grid:
+    FEATURE = sample_feature(1)
+    URL = sample_scene_url(1)
+    TRANSFORM_10M = [10.0, 0.0, 300000.0, 0.0, -10.0, 5200020.0]
+    TRANSFORM_20M = [20.0, 0.0, 300000.0, 0.0, -20.0, 5200020.0]
+    ITEM = {
+        "id": "S2B_10TGS_20220419_0_L2A",
+        "properties": {"proj:epsg": 32611},
+        "assets": {"nir": {"proj:transform": TRANSFORM_10M}, "scl": {"proj:transform": TRANSFORM_20M}},
+    }
+
+    def test_native_grid(self):
+        crs, transform = native_grid(self.ITEM, assets=["where((scl==4),nir,0)"])
+        crs.should.equal("EPSG:32611")
+        transform.a.should.equal(10.0)
+        native_grid(self.ITEM, assets=["scl"])[1].a.should.equal(20.0)
+        native_grid.when.called_with(self.ITEM, assets=["red"]).should.have.raised(ValueError)
+
+    def test_snap_bounds_to_grid(self):
+        transform = Affine(*self.TRANSFORM_10M)
+        bounds, width, height = snap_bounds_to_grid((300012.5, 5199901.0, 300047.0, 5199979.9), transform)
+        bounds.should.equal((300010.0, 5199900.0, 300050.0, 5199980.0))
+        (width, height).should.equal((4, 8))
+        _, width_gsd, height_gsd = snap_bounds_to_grid((300012.5, 5199901.0, 300047.0, 5199979.9), transform, gsd=20)
+        (width_gsd, height_gsd).should.equal((3, 4))
+
+    def test_query_params_snap_to_grid(self):
+        query_params = QueryParamsCrop(url=self.URL, expression="nir", height=10, width=10, snap_to_grid=True)
+        errors = QueryParamsCrop.Schema().validate(QueryParamsCrop.Schema().dump(query_params))
+        errors.should_not.be.empty
+        Crop.when.called_with(query_params=query_params).should.have.raised(ValidationError)
+
+    def test_crop_snap_to_grid(self):
+        requests = []
+
+        def mock_get(url, params=None, headers=None):
+            requests.append((url, params))
+            if url == self.URL:
+                r = Response()
+                r.status_code = 200
+                r._content = json_dumps(self.ITEM).encode()
+                return r
+            minx, miny, maxx, maxy = [float(v) for v in url.split("/")[-2].split(",")]
+            width, height = [int(v) for v in url.split("/")[-1].split(".")[0].split("x")]
+            data = np.ones((1, height, width), dtype="float32")
+            return crop_response(data, np.full((height, width), 255), crs="EPSG:32611", bounds=(minx, miny, maxx, maxy))
+
+        with mock.patch("pixels_utils.titiler.endpoints.stac.crop._crop.online_status_stac"), mock.patch(
+            "pixels_utils.titiler.endpoints.stac.crop._crop.get", side_effect=mock_get
+        ):
+            query_params = QueryParamsCrop(
+                url=self.URL, feature=self.FEATURE, expression="nir", asset_as_band=True, snap_to_grid=True
+            )
+            crop = Crop(query_params=query_params)
+            crs, _, bounds, width, height = crop.grid
+            url, params = requests[-1]
+            params["coord-crs"].should.equal("EPSG:32611")
+            params["dst-crs"].should.equal("EPSG:32611")
+            "snap_to_grid".shouldnt.be.within(params)
+            url.should.match(rf"/{width}x{height}$")
+            [(b - 300000.0) % 10 for b in bounds].should.equal([0.0, 0.0, 0.0, 0.0])
+
+            data, profile, _ = crop.to_rasterio()
+            data.shape.should.equal((1, height, width))
+            data.mask.any().should.be.true  # pixels outside of the feature are masked locally
+            data.mask.all().should.be.false
+
+
+class Test_Crop_Zonal_Statistics:
+    RNG = np.random.default_rng(17)
+    DATA = np.ma.masked_array(RNG.random(size=(2, 20, 30)), mask=RNG.random(size=(2, 20, 30)) > 0.85)
+    PROFILE = {"transform": from_origin(300000.0, 5200000.0, 10.0, 10.0), "crs": None}
+    ZONES = {
+        "field_a": box(300020.0, 5199900.0, 300060.0, 5199960.0),  # rows 4-9, cols 2-5
+        "field_b": box(300100.0, 5199850.0, 300250.0, 5199990.0),  # rows 1-14, cols 10-24
+        "field_outside": box(400000.0, 5000000.0, 400100.0, 5000100.0),
+    }
+
+    def test_zonal_statistics(self):
+        stats = zonal_statistics(self.DATA, self.PROFILE, self.ZONES, band_names=["nir", "red"], p=[10, 90])
+        list(stats.keys()).should.equal(["field_a", "field_b", "field_outside"])
+        for zone_id, (rows, cols) in {
+            "field_a": (slice(4, 10), slice(2, 6)),
+            "field_b": (slice(1, 15), slice(10, 25)),
+        }.items():
+            expected = crop_statistics(self.DATA[:, rows, cols], band_names=["nir", "red"], p=[10, 90])
+            for band_name in ["nir", "red"]:
+                for key in ["count", "valid_pixels", "masked_pixels", "valid_percent"]:
+                    stats[zone_id][band_name][key].should.equal(expected[band_name][key])
+                for key in ["min", "max", "mean", "sum", "std", "median", "percentile_10", "percentile_90"]:
+                    stats[zone_id][band_name][key].should.equal(expected[band_name][key], epsilon=1e-9)
+
+    def test_zonal_statistics_empty_zone(self):
+        stats = zonal_statistics(self.DATA, self.PROFILE, self.ZONES)
+        stats["field_outside"]["b1"]["count"].should.equal(0.0)
+        stats["field_outside"]["b1"]["mean"].should.be.none
+        json_dumps(stats, allow_nan=False).should.be.a(str)
+
+
+class Test_Crop_Regional:
+    URL = sample_scene_url(1)
+    ITEM = Test_Crop_Snap_To_Grid.ITEM
+    FIELDS_UTM = {
+        "field_a": box(300105.0, 5199005.0, 300195.0, 5199093.0),
+        "field_b": box(300230.0, 5198950.0, 300310.0, 5199020.0).union(box(300230.0, 5198900.0, 300250.0, 5198950.0)),
+        "field_c": box(330005.0, 5170005.0, 330075.0, 5170055.0),  # ~40 km away
+    }
+
+    def mock_get(self, requests):
+        def get(url, params=None, headers=None):
+            requests.append((url, params))
+            if url == self.URL:
+                r = Response()
+                r.status_code = 200
+                r._content = json_dumps(self.ITEM).encode()
+                return r
+            minx, miny, maxx, maxy = [float(v) for v in url.split("/")[-2].split(",")]
+            width, height = [int(v) for v in url.split("/")[-1].split(".")[0].split("x")]
+            cols = np.arange(width) + round((minx - 300000.0) / 10)  # values are unique to each native pixel
+            rows = np.arange(height) + round((5200020.0 - maxy) / 10)
+            data = (rows[:, None] * 10000 + cols[None, :])[np.newaxis].astype("float64")
+            return crop_response(data, np.full((height, width), 255), crs="EPSG:32611", bounds=(minx, miny, maxx, maxy))
+
+        return get
+
+    def features(self):
+        return [
+            {
+                "type": "Feature",
+                "id": field_id,
+                "properties": {},
+                "geometry": mapping(geometry_to_crs(geometry, dst_crs="EPSG:4326", src_crs="EPSG:32611")),
+            }
+            for field_id, geometry in self.FIELDS_UTM.items()
+        ]
+
+    def test_cluster_geometries(self):
+        geometries = [box(0, 0, 10, 10), box(25000, 0, 25010, 10), box(100, 100, 200, 200)]
+        cluster_geometries(geometries, tile_size=5000, crs="EPSG:32611").should.equal([[0, 2], [1]])
+        cluster_geometries(geometries, tile_size=50000, crs="EPSG:32611").should.equal([[0, 1, 2]])
+        cluster_geometries([]).should.equal([])
+
+    def test_crop_regional_matches_crop(self):
+        requests = []
+        with mock.patch("pixels_utils.titiler.endpoints.stac.crop._crop.online_status_stac"), mock.patch(
+            "pixels_utils.titiler.endpoints.stac.crop._crop.get", side_effect=self.mock_get(requests)
+        ):
+            query_params = QueryParamsCrop(url=self.URL, expression="nir", asset_as_band=True)
+            regional = CropRegional(query_params, self.features(), tile_size=20000)
+            regional.clusters.should.equal([[0, 1], [2]])
+            rasters = regional.to_rasterio()
+            n_crop_requests = len([url for url, _ in requests if url != self.URL])
+            n_crop_requests.should.equal(2)  # one crop per cluster
+
+            list(rasters.keys()).should.equal(["field_a", "field_b", "field_c"])
+            for feature in self.features():
+                crop = Crop(query_params=replace(query_params, feature=feature, snap_to_grid=True))
+                data, profile, _ = crop.to_rasterio()
+                data_clip, profile_clip, _ = rasters[feature["id"]]
+                data_clip.shape.should.equal(data.shape)
+                profile_clip["transform"].almost_equals(profile["transform"]).should.be.true
+                np.array_equal(data_clip.mask, data.mask).should.be.true
+                np.array_equal(data_clip.filled(-1), data.filled(-1)).should.be.true
+
+
+class Test_Crop_Tiled:
+    TRANSFORM = Affine(10.0, 0.0, 300000.0, 0.0, -10.0, 5200020.0)
+
+    def test_split_bounds_to_tiles(self):
+        bounds = (300030.0, 5199900.0, 300100.0, 5200000.0)  # cols 3-9, rows 2-11
+        tiles = split_bounds_to_tiles(bounds, self.TRANSFORM, tile_size=4)
+        tiles[0].should.equal((300030.0, 5199980.0, 300040.0, 5200000.0))  # tile edges are on the global tile grid
+        len(tiles).should.equal(3 * 3)
+        sum((maxx - minx) * (maxy - miny) for minx, miny, maxx, maxy in tiles).should.equal(70.0 * 100.0)
+        split_bounds_to_tiles(bounds, self.TRANSFORM, tile_size=1000).should.equal([bounds])
+
+    def test_crop_tiled_matches_crop(self):
+        requests = []
+        test_regional = Test_Crop_Regional()
+        feature = test_regional.features()[1]
+        with mock.patch("pixels_utils.titiler.endpoints.stac.crop._crop.online_status_stac"), mock.patch(
+            "pixels_utils.titiler.endpoints.stac.crop._crop.get", side_effect=test_regional.mock_get(requests)
+        ):
+            query_params = QueryParamsCrop(
+                url=test_regional.URL, feature=feature, expression="nir", asset_as_band=True, snap_to_grid=True
+            )
+            data, profile, _ = Crop(query_params=query_params).to_rasterio()
+            n_requests = len(requests)
+            crop_tiled = CropTiled(replace(query_params, snap_to_grid=None), max_pixels=16, max_workers=3)
+            data_tiled, profile_tiled, _ = crop_tiled.to_rasterio()
+            (len(requests) - n_requests).should.equal(len(crop_tiled.tiles))
+            len(crop_tiled.tiles).should.be.greater_than(1)
+
+            data_tiled.shape.should.equal(data.shape)
+            profile_tiled["transform"].almost_equals(profile["transform"]).should.be.true
+            (profile_tiled["width"], profile_tiled["height"]).should.equal((profile["width"], profile["height"]))
+            np.array_equal(data_tiled.mask, data.mask).should.be.true
+            np.array_equal(data_tiled.filled(-1), data.filled(-1)).should.be.true
+
+
+class Test_Crop_Multi_Part:
+    def crop_and_compare(self, geometry_utm, sparse: bool):
+        requests = []
+        test_regional = Test_Crop_Regional()
+        feature = {
+            "type": "Feature",
+            "properties": {},
+            "geometry": mapping(geometry_to_crs(geometry_utm, dst_crs="EPSG:4326", src_crs="EPSG:32611")),
+        }
+        with mock.patch("pixels_utils.titiler.endpoints.stac.crop._crop.online_status_stac"), mock.patch(
+            "pixels_utils.titiler.endpoints.stac.crop._crop.get", side_effect=test_regional.mock_get(requests)
+        ):
+            query_params = QueryParamsCrop(url=test_regional.URL, feature=feature, expression="nir", asset_as_band=True)
+            data, profile, _ = Crop(query_params=replace(query_params, snap_to_grid=True)).to_rasterio()
+            crop_multipart = CropMultiPart(query_params, tile_size=1000)
+            crop_multipart.is_sparse.should.equal(sparse)
+            data_composite, profile_composite, _ = crop_multipart.to_rasterio()
+            np.array_equal(data_composite.mask, data.mask).should.be.true
+            np.array_equal(data_composite.filled(-1), data.filled(-1)).should.be.true
+            profile_composite["transform"].almost_equals(profile["transform"]).should.be.true
+            return crop_multipart, requests
+
+    def test_crop_multipart_sparse(self):
+        fields = Test_Crop_Regional.FIELDS_UTM
+        crop_multipart, requests = self.crop_and_compare(fields["field_a"].union(fields["field_c"]), sparse=True)
+        crop_multipart.fill.should.be.lower_than(0.01)
+        parts = crop_multipart.to_rasterio(composite=False)
+        len(parts).should.equal(2)
+        sum(data.shape[1] * data.shape[2] for data, _, _ in parts).should.be.lower_than(
+            crop_multipart.width * crop_multipart.height / 1000
+        )
+
+    def test_crop_multipart_overlapping_parts(self):
+        # Parts on either side of a tile line, 2 m apart, so their grid-snapped windows share a column of pixels
+        geometry = box(300905.0, 5199405.0, 301006.0, 5199493.0).union(box(301008.0, 5199405.0, 301095.0, 5199493.0))
+        geometry = geometry.union(Test_Crop_Regional.FIELDS_UTM["field_c"])
+        crop_multipart, _ = self.crop_and_compare(geometry, sparse=True)
+        len(crop_multipart.parts).should.equal(3)
+
+    def test_crop_multipart_compact(self):
+        # Two parts 10 m apart, well inside the same 1000 m tile, so their cluster covers the whole bounding box
+        geometry = box(300405.0, 5199405.0, 300495.0, 5199493.0).union(box(300505.0, 5199405.0, 300595.0, 5199493.0))
+        crop_multipart, _ = self.crop_and_compare(geometry, sparse=False)
+        crop_multipart.fill.should.equal(1.0)
+        len(crop_multipart.parts).should.equal(1)
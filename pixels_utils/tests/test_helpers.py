@@ -0,0 +1,314 @@
+import geopandas as gpd
+import mock
+import numpy as np
+import pandas as pd
+import sure
+import zarr
+from rasterio.transform import from_origin
+from shapely.geometry import Point, box, mapping
+
+from pixels_utils.helpers import (
+    FieldMaskCache,
+    SceneQualityIndex,
+    build_datacube,
+    filter_scenes_with_all_nodata,
+    filter_scenes_with_low_quality,
+    geometry_key,
+    get_satellite_expression_as_df,
+    sample_points,
+    scene_priority,
+    scene_quality,
+    schedule_clear_observations,
+    xy_to_rowcol,
+)
+
+_ = sure.version
+
+
+class Test_Helpers_Field_Mask_Cache:
+    TRANSFORM = from_origin(300000.0, 5200000.0, 10.0, 10.0)
+    SHAPE = (20, 30)
+    FIELDS = {
+        "field_a": box(300020.0, 5199900.0, 300060.0, 5199960.0),  # rows 4-9, cols 2-5
+        "field_b": Point(300205.0, 5199805.0).buffer(15.0),
+        "field_outside": box(400000.0, 5000000.0, 400100.0, 5000100.0),
+    }
+
+    def test_field_mask_cache_window(self):
+        cache = FieldMaskCache(self.FIELDS, crs="EPSG:32611")
+        (rows, cols), inside = cache.window("field_a", self.TRANSFORM, (1,) + self.SHAPE)
+        (rows, cols).should.equal((slice(4, 10), slice(2, 6)))
+        inside.all().should.be.true
+        mask = cache.mask("field_a", self.TRANSFORM, self.SHAPE)
+        int(mask.sum()).should.equal(24)
+        int(cache.mask("field_outside", self.TRANSFORM, self.SHAPE).sum()).should.equal(0)
+
+    def test_field_mask_cache_reused(self):
+        cache = FieldMaskCache(self.FIELDS, crs="EPSG:32611")
+        cache.mask("field_b", self.TRANSFORM, self.SHAPE)
+        windows = cache._windows[cache.grid_key(self.TRANSFORM, self.SHAPE)]
+        cache.mask("field_b", self.TRANSFORM, (3,) + self.SHAPE)  # same grid (bands are ignored)
+        len(cache._windows).should.equal(1)
+        cache._windows[cache.grid_key(self.TRANSFORM, self.SHAPE)].should.be(windows)
+        cache.mask("field_b", from_origin(300000.0, 5200000.0, 20.0, 20.0), self.SHAPE)
+        len(cache._windows).should.equal(2)
+
+    def test_field_mask_cache_centroids(self):
+        cache = FieldMaskCache(self.FIELDS, crs="EPSG:32611")
+        rows, cols = cache.centroids(self.TRANSFORM, self.SHAPE)
+        rows.tolist().should.equal([7, 19, -1])
+        cols.tolist().should.equal([4, 20, -1])
+
+    def test_field_mask_cache_reproject(self):
+        cache = FieldMaskCache(self.FIELDS, crs="EPSG:32611")
+        cache_4326 = FieldMaskCache(
+            {k: v for k, v in cache._geometries("EPSG:4326").items() if k != "field_outside"}, crs="EPSG:4326"
+        )
+        mask = cache_4326.mask("field_a", self.TRANSFORM, self.SHAPE, crs="EPSG:32611")
+        np.array_equal(mask, cache.mask("field_a", self.TRANSFORM, self.SHAPE)).should.be.true
+
+
+class Test_Helpers_Sample_Points:
+    TRANSFORM = from_origin(-119.05, 46.25, 0.001, 0.001)
+    RNG = np.random.default_rng(3)
+    DATA = np.ma.masked_array(RNG.random(size=(4, 1, 20, 30)), mask=RNG.random(size=(4, 1, 20, 30)) > 0.8)
+    X = np.array([-119.0495, -119.0305, -119.0405, -119.1])
+    Y = np.array([46.2495, 46.2305, 46.2405, 46.24])
+
+    def test_xy_to_rowcol(self):
+        rows, cols = xy_to_rowcol(self.TRANSFORM, self.X, self.Y, shape=self.DATA.shape)
+        rows.tolist().should.equal([0, 19, 9, -1])
+        cols.tolist().should.equal([0, 19, 9, -1])
+
+    def test_sample_points_stack(self):
+        rows, cols = xy_to_rowcol(self.TRANSFORM, self.X, self.Y, shape=self.DATA.shape)
+        values = sample_points(self.DATA, rows, cols)
+        values.shape.should.equal((4, 1, 4))
+        for i, (row, col) in enumerate(zip(rows[:3], cols[:3])):
+            np.array_equal(values.data[:, 0, i], self.DATA.data[:, 0, row, col]).should.be.true
+            np.array_equal(values.mask[:, 0, i], self.DATA.mask[:, 0, row, col]).should.be.true
+        values.mask[:, :, 3].all().should.be.true  # outside of the grid
+
+    def test_get_satellite_expression_as_df(self):
+        data = self.DATA[0].copy()
+        data[0, 9, 9] = np.ma.masked
+        profile = {"transform": self.TRANSFORM, "crs": "EPSG:4326"}
+        gdf = gpd.GeoDataFrame(
+            {"field_id": ["a", "b", "c"]},
+            geometry=[Point(x, y).buffer(0.0001) for x, y in zip(self.X[:3], self.Y[:3])],
+            crs="EPSG:4326",
+        )
+        expression_obj = mock.Mock(short_name="NDVI", expression="(nir-red)/(nir+red)")
+        scene = {"id": "S2B_10TGS_20220419_0_L2A", "datetime": "2022-04-19T19:00:00Z"}
+        with mock.patch("pixels_utils.helpers._helper.Crop") as crop_patch:
+            crop_patch.return_value.to_rasterio.return_value = (data, profile, {})
+            df = get_satellite_expression_as_df(gdf, scene, None, expression_obj, gsd=10, nodata=-999)
+            cache = FieldMaskCache(gdf.geometry)
+            df_cache = get_satellite_expression_as_df(
+                gdf, scene, None, expression_obj, gsd=10, nodata=-999, field_mask_cache=cache
+            )
+        list(df["field_id"]).should.equal(["a", "b", "c"])
+        float(df.loc[0, "NDVI"]).should.equal(float(data.data[0, 0, 0]))
+        float(df.loc[1, "NDVI"]).should.equal(float(data.data[0, 19, 19]))
+        np.isnan(df.loc[2, "NDVI"]).should.be.true  # masked pixel is dropped
+        df_cache[["field_id", "NDVI"]].equals(df[["field_id", "NDVI"]]).should.be.true
+
+
+class Test_Helpers_Filter_Scenes:
+    SCL_COUNTS = {  # counts of SCL classes (0-11) over the feature for each scene
+        "S2B_10TGS_20220419_0_L2A": [0, 0, 0, 2, 30, 5, 0, 0, 10, 3, 0, 0],  # partly clear
+        "S2B_10TGS_20220429_0_L2A": [0, 0, 0, 5, 0, 0, 0, 0, 20, 25, 0, 0],  # cloudy
+    }
+
+    def mock_statistics(self, requests):
+        def statistics(query_params, **kwargs):
+            requests.append(query_params)
+            scene_id = query_params.url.split("/")[-1]
+            if query_params.categorical is True:
+                stats = {"scl": {"histogram": [self.SCL_COUNTS[scene_id], list(range(12))]}}
+            else:
+                stats = {
+                    "expr": {"min": 0.1 if sum(self.SCL_COUNTS[scene_id][4:6]) > 0 else -999, "count": 1.0, "mean": 0.5}
+                }
+            return mock.Mock(response=mock.Mock(json=mock.Mock(return_value={"properties": {"statistics": stats}})))
+
+        return statistics
+
+    DF_SCENES = pd.DataFrame(
+        {
+            "id": list(SCL_COUNTS.keys()),
+            "properties": [{"datetime": "2022-04-19T19:00:00Z"}, {"datetime": "2022-04-29T19:00:00Z"}],
+        }
+    )
+
+    def test_filter_scenes_with_all_nodata_preflight(self):
+        df_scenes = self.DF_SCENES
+        expression_obj = mock.Mock(short_name="NDVI", expression="(nir-red)/(nir+red)")
+        for preflight in [False, True]:
+            requests = []
+            with mock.patch(
+                "pixels_utils.helpers._helper.Statistics", side_effect=self.mock_statistics(requests)
+            ), mock.patch("pixels_utils.helpers._scene_quality.Statistics", side_effect=self.mock_statistics(requests)):
+                ind_nodata = filter_scenes_with_all_nodata(df_scenes, None, expression_obj, preflight=preflight)
+            ind_nodata.should.equal([1])
+            full_requests = [query_params for query_params in requests if query_params.categorical is None]
+            len(full_requests).should.equal(1 if preflight else 2)  # cloudy scene is rejected by the preflight
+
+    def test_scene_quality(self):
+        requests = []
+        with mock.patch("pixels_utils.helpers._scene_quality.Statistics", side_effect=self.mock_statistics(requests)):
+            df_quality = scene_quality(self.DF_SCENES, None)
+            ind_low_quality = filter_scenes_with_low_quality(self.DF_SCENES, None, min_clear_pct=60)
+        [query_params.assets for query_params in requests].should.equal([["scl"]] * 4)
+        list(df_quality["VEGETATION"]).should.equal([30, 0])
+        list(df_quality["whitelist_pix"]).should.equal([35, 0])
+        float(df_quality.loc[0, "whitelist_pct"]).should.equal(35 / 50 * 100)
+        ind_low_quality.should.equal([1])
+
+    def test_scene_quality_index(self):
+        feature = {"type": "Feature", "properties": {}, "geometry": mapping(box(-119.05, 46.23, -119.03, 46.25))}
+        feature_reordered = {"type": "Polygon", "coordinates": [list(reversed(feature["geometry"]["coordinates"][0]))]}
+        geometry_key(feature).should.equal(geometry_key(feature_reordered))
+
+        index = SceneQualityIndex(":memory:")
+        requests = []
+        with mock.patch("pixels_utils.helpers._scene_quality.Statistics", side_effect=self.mock_statistics(requests)):
+            df_quality = scene_quality(self.DF_SCENES.iloc[:1], feature, index=index)
+            len(requests).should.equal(1)
+            len(index).should.equal(1)
+            df_quality_indexed = scene_quality(self.DF_SCENES, feature_reordered, index=index)
+            len(requests).should.equal(2)  # only the scene that was not yet indexed is requested
+            len(index).should.equal(2)
+        df_quality_indexed.iloc[:1].equals(df_quality).should.be.true
+        counts, n_outside = index.get(feature, ["S2B_10TGS_20220429_0_L2A"])["S2B_10TGS_20220429_0_L2A"]
+        counts[:12].tolist().should.equal(self.SCL_COUNTS["S2B_10TGS_20220429_0_L2A"])
+        index.get(feature, ["S2B_10TGS_20220429_0_L2A"], gsd=60).should.be.empty
+
+
+class Test_Helpers_Schedule_Clear_Observations:
+    DF_SCENES = pd.DataFrame(
+        {
+            "id": [f"scene_{i}" for i in range(6)],
+            "datetime": [
+                "2022-04-02T19:00:00Z",
+                "2022-04-15T19:00:00Z",
+                "2022-04-28T19:00:00Z",
+                "2022-05-03T19:00:00Z",
+                "2022-05-16T19:00:00Z",
+                "2022-05-29T19:00:00Z",
+            ],
+            "properties": [{"eo:cloud_cover": cc} for cc in [5.0, 10.0, 60.0, 70.0, 20.0, 1.0]],
+        }
+    )
+    FEATURES = {"field_a": None, "field_b": None}
+
+    def test_scene_priority(self):
+        priority = scene_priority(self.DF_SCENES)
+        list(priority.sort_values(ascending=False).index).should.equal([5, 0, 1, 4, 2, 3])
+        priority_target = scene_priority(self.DF_SCENES, target_date="2022-04-28", date_weight=0.02)
+        int(priority_target.idxmax()).should.equal(1)  # 12 days from target with 10% cloud cover
+
+    def test_schedule_clear_observations(self):
+        processed = []
+
+        def process(scene, field_id, feature):
+            processed.append((scene["id"], field_id))
+            if field_id == "field_b" and scene["id"] == "scene_1":
+                return None  # e.g., field is covered by a cloud
+            return scene["id"]
+
+        observations = schedule_clear_observations(
+            self.DF_SCENES, self.FEATURES, process, k=1, freq="M", date_weight=0, max_workers=2
+        )
+        {
+            (field_id, str(window)): [ind for ind, _ in obs] for (field_id, window), obs in observations.items()
+        }.should.equal(
+            {
+                ("field_a", "2022-04"): [0],
+                ("field_a", "2022-05"): [5],
+                ("field_b", "2022-04"): [0],
+                ("field_b", "2022-05"): [5],
+            }
+        )
+        len(processed).should.equal(4)  # no other scenes are processed once one is valid
+
+        observations = schedule_clear_observations(self.DF_SCENES, self.FEATURES, process, k=2, date_weight=0)
+        sorted(ind for ind, _ in observations[("field_a", None)]).should.equal([0, 5])  # completion order may vary
+        sorted(ind for ind, _ in observations[("field_b", None)]).should.equal([0, 5])
+
+
+class Test_Helpers_Build_Datacube:
+    FEATURE = {"type": "Feature", "properties": {}, "geometry": mapping(box(300100.0, 5199000.0, 300200.0, 5199060.0))}
+    DF_SCENES = pd.DataFrame(
+        {
+            "id": ["scene_b", "scene_a", "scene_c", "scene_0"],
+            "datetime": [
+                "2022-04-15T19:00:00Z",
+                "2022-04-02T19:00:00Z",
+                "2022-04-28T19:00:00Z",
+                "2022-03-20T19:00:00Z",
+            ],
+        }
+    )
+    VALUES = {"scene_0": 0.0, "scene_a": 1.0, "scene_b": 2.0, "scene_c": 3.0, "scene_utm12": 4.0}
+
+    def mock_crop(self, requests):
+        def crop(query_params, **kwargs):
+            scene_id = query_params.url.split("/")[-1]
+            requests.append(scene_id)
+            data = np.ma.masked_array(np.full((1, 6, 10), self.VALUES[scene_id], dtype="float32"))
+            data[0, 0, 0] = np.ma.masked
+            transform = from_origin(300100.0, 5199060.0, 10, 10)
+            if scene_id == "scene_c":  # one pixel to the right of the cube grid
+                transform = from_origin(300110.0, 5199060.0, 10, 10)
+            crs = "EPSG:32612" if scene_id == "scene_utm12" else "EPSG:32611"
+            profile = {"crs": crs, "transform": transform, "height": 6, "width": 10, "count": 1}
+            return mock.Mock(to_rasterio=mock.Mock(return_value=(data, profile, {})))
+
+        return crop
+
+    def test_build_datacube(self):
+        store, requests = {}, []
+        with mock.patch("pixels_utils.helpers._datacube.Crop", side_effect=self.mock_crop(requests)):
+            build_datacube(store, self.FEATURE, self.DF_SCENES.iloc[:2], expression="nir", max_workers=2)
+            requests.should.equal(["scene_a", "scene_b"])  # the earliest scene is requested first (it sets the grid)
+            cube = build_datacube(store, self.FEATURE, self.DF_SCENES.iloc[:3], expression="nir")
+            requests[2:].should.equal(["scene_c"])  # scenes already in the cube are not requested again
+
+        cube["data"].shape.should.equal((3, 1, 6, 10))
+        cube["data"].attrs["_ARRAY_DIMENSIONS"].should.equal(["time", "band", "y", "x"])
+        list(cube["scene_id"][:]).should.equal(["scene_a", "scene_b", "scene_c"])
+        list(np.diff(cube["time"][:]) > 0).should.equal([True, True])
+        cube["complete"][:].all().should.be.true
+        list(cube["band"][:]).should.equal(["nir"])
+        cube["x"][0].should.equal(300105.0)
+        cube.attrs["crs"].should.equal("EPSG:32611")
+
+        data = cube["data"][:, 0]
+        np.isnan(data[:2, 0, 0]).all().should.be.true  # masked pixels are set to the fill value
+        float(data[1, 1, 1]).should.equal(2.0)
+        np.isnan(data[2, :, 0]).all().should.be.true  # not covered by the offset crop
+        float(data[2, 1, 1]).should.equal(3.0)
+
+    def test_build_datacube_append_order(self):
+        store, requests = {}, []
+        with mock.patch("pixels_utils.helpers._datacube.Crop", side_effect=self.mock_crop(requests)):
+            build_datacube(store, self.FEATURE, self.DF_SCENES.iloc[:3], expression="nir")
+            cube = build_datacube(store, self.FEATURE, self.DF_SCENES, expression="nir")
+        # scenes earlier than the cube are appended; readers sort by the stored times
+        list(cube["scene_id"][:]).should.equal(["scene_a", "scene_b", "scene_c", "scene_0"])
+        list(np.argsort(cube["time"][:])).should.equal([3, 0, 1, 2])
+        float(cube["data"][3, 0, 1, 1]).should.equal(0.0)
+
+    def test_build_datacube_grid_mismatch(self):
+        store, requests = {}, []
+        df_scenes = pd.DataFrame(
+            {"id": ["scene_a", "scene_utm12"], "datetime": ["2022-04-02T19:00:00Z", "2022-04-03T19:00:00Z"]}
+        )
+        with mock.patch("pixels_utils.helpers._datacube.Crop", side_effect=self.mock_crop(requests)):
+            build_datacube.when.called_with(store, self.FEATURE, df_scenes, expression="nir").should.throw(
+                ValueError, "not on the grid of the datacube"
+            )
+        cube = zarr.open_group(store, mode="r")
+        cube.attrs["crs"].should.equal("EPSG:32611")
+        list(cube["complete"][:]).should.equal([True, False])
@@ -1,8 +1,9 @@
+import numpy as np
 import sure
 
 from pixels_utils.stac_catalogs.earthsearch.v1 import EarthSearchCollections, expression_from_collection
-from pixels_utils.titiler.mask._mask import build_numexpr_mask_enum
-from pixels_utils.titiler.mask.enum_classes import Sentinel2_SCL_Group
+from pixels_utils.titiler.mask import apply_mask_lut, build_mask_lut, build_numexpr_mask_enum
+from pixels_utils.titiler.mask.enum_classes import Sentinel2_SCL, Sentinel2_SCL_Group
 
 _ = sure.version
 
@@ -60,17 +61,17 @@ class Test_Mask_Build_Numexpr_EXPRESSION_NDVI:
     def test_mask_asset_scl_wl(self):
         build_numexpr_mask_enum.when.called_with(
             expression=self.EXPRESSION, mask_enum=self.MASK_ENUM, mask_asset="scl", whitelist=True, mask_value=0
-        ).should.return_value("where(scl==4,(nir-red)/(nir+red),where(scl==5,(nir-red)/(nir+red),0));")
+        ).should.return_value("where((scl==4)|(scl==5),(nir-red)/(nir+red),0);")
 
     def test_mask_asset_maskasset_wl(self):
         build_numexpr_mask_enum.when.called_with(
             expression=self.EXPRESSION, mask_enum=self.MASK_ENUM, mask_asset="maskasset", whitelist=True, mask_value=0
-        ).should.return_value("where(maskasset==4,(nir-red)/(nir+red),where(maskasset==5,(nir-red)/(nir+red),0));")
+        ).should.return_value("where((maskasset==4)|(maskasset==5),(nir-red)/(nir+red),0);")
 
     def test_mask_asset_scl_bl(self):
         build_numexpr_mask_enum.when.called_with(
             expression=self.EXPRESSION, mask_enum=self.MASK_ENUM, mask_asset="scl", whitelist=False, mask_value=0
-        ).should.return_value("where(scl==4,0,where(scl==5,0,(nir-red)/(nir+red)));")
+        ).should.return_value("where((scl==4)|(scl==5),0,(nir-red)/(nir+red));")
 
     def test_mask_asset_scl_wl_nodata(self):
         NODATA = -1
@@ -80,9 +81,7 @@ class Test_Mask_Build_Numexpr_EXPRESSION_NDVI:
             mask_asset="scl",
             whitelist=True,
             mask_value=NODATA,
-        ).should.return_value(
-            "where(scl==4,(nir-red)/(nir+red),where(scl==5,(nir-red)/(nir+red),{nodata}));".format(nodata=NODATA)
-        )
+        ).should.return_value("where((scl==4)|(scl==5),(nir-red)/(nir+red),{nodata});".format(nodata=NODATA))
 
     def test_mask_asset_scl_bl_nodata(self):
         NODATA = -1
@@ -92,6 +91,54 @@ class Test_Mask_Build_Numexpr_EXPRESSION_NDVI:
             mask_asset="scl",
             whitelist=False,
             mask_value=NODATA,
+        ).should.return_value("where((scl==4)|(scl==5),{nodata},(nir-red)/(nir+red));".format(nodata=NODATA))
+
+
+class Test_Mask_Build_Numexpr_EXPRESSION_Multiple:
+    EXPRESSION = "(nir-red)/(nir+red);(nir-green)/(nir+green)"
+    MASK_ENUM = Sentinel2_SCL_Group.ARABLE
+
+    def test_mask_asset_scl_wl_multiple(self):
+        build_numexpr_mask_enum.when.called_with(
+            expression=self.EXPRESSION, mask_enum=self.MASK_ENUM, mask_asset="scl", whitelist=True, mask_value=0
         ).should.return_value(
-            "where(scl==4,{nodata},where(scl==5,{nodata},(nir-red)/(nir+red)));".format(nodata=NODATA)
+            "where((scl==4)|(scl==5),(nir-red)/(nir+red),0);where((scl==4)|(scl==5),(nir-green)/(nir+green),0);"
         )
+
+    def test_mask_asset_scl_bl_multiple_trailing_semicolon(self):
+        build_numexpr_mask_enum.when.called_with(
+            expression=self.EXPRESSION + ";", mask_enum=self.MASK_ENUM, mask_asset="scl", whitelist=False, mask_value=0
+        ).should.return_value(
+            "where((scl==4)|(scl==5),0,(nir-red)/(nir+red));where((scl==4)|(scl==5),0,(nir-green)/(nir+green));"
+        )
+
+    def test_mask_asset_scl_wl_single_class(self):
+        build_numexpr_mask_enum.when.called_with(
+            expression=self.EXPRESSION, mask_enum=[Sentinel2_SCL.VEGETATION], mask_asset="scl", mask_value=0
+        ).should.return_value("where((scl==4),(nir-red)/(nir+red),0);where((scl==4),(nir-green)/(nir+green),0);")
+
+    def test_mask_enum_empty(self):
+        build_numexpr_mask_enum.when.called_with(expression=self.EXPRESSION, mask_enum=[]).should.have.raised(
+            ValueError
+        )
+
+
+class Test_Mask_Lookup_Table:
+    SCL = np.ma.masked_array(
+        np.array([[[0, 4, 5, 8], [9, 4, 3, 11]]], dtype="uint8"), mask=[[[True, False, False, False]] * 2]
+    )
+
+    def test_build_mask_lut_wl(self):
+        lut = build_mask_lut(Sentinel2_SCL_Group.ARABLE, whitelist=True)
+        lut.shape.should.equal((256,))
+        list(np.flatnonzero(lut)).should.equal([Sentinel2_SCL.VEGETATION, Sentinel2_SCL.BARE_SOIL])
+
+    def test_build_mask_lut_bl(self):
+        lut = build_mask_lut(Sentinel2_SCL_Group.CLOUDS, whitelist=False)
+        [int(c) for c in Sentinel2_SCL if not lut[c]].should.equal([int(c) for c in Sentinel2_SCL_Group.CLOUDS])
+
+    def test_apply_mask_lut(self):
+        valid = apply_mask_lut(self.SCL, build_mask_lut(Sentinel2_SCL_Group.ARABLE, whitelist=True))
+        valid.tolist().should.equal([[[False, True, True, False], [False, True, False, False]]])
+        valid_float = apply_mask_lut(self.SCL.astype("float32"), build_mask_lut(Sentinel2_SCL_Group.ARABLE))
+        np.array_equal(valid, valid_float).should.be.true
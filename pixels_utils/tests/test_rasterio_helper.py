@@ -0,0 +1,58 @@
+import numpy as np
+import rasterio
+import sure
+from rasterio.transform import from_origin
+
+from pixels_utils.rasterio_helper import save_image, set_driver_tags
+
+_ = sure.version
+
+
+class Test_Rasterio_Helper_Save_Image_COG:
+    DATA = np.ma.masked_array(np.tile(np.arange(1100, dtype="float32") / 1100, (2, 1100, 1))[:, :, :900])
+
+    def profile(self):
+        return {
+            "crs": "EPSG:32611",
+            "transform": from_origin(300000.0, 5200020.0, 10, 10),
+            "nodata": None,
+            "band_names": ["nir", "red"],
+            "tiled": False,
+        }
+
+    def test_set_driver_tags_cog(self):
+        profile = set_driver_tags(self.profile(), driver="COG", compress="zstd")
+        profile["COMPRESS"].should.equal("ZSTD")
+        profile["PREDICTOR"].should.equal("YES")
+        "tiled".shouldnt.be.within(profile)
+        profile = set_driver_tags(self.profile(), driver="COG", compress="LERC", max_z_error=0.001)
+        profile["MAX_Z_ERROR"].should.equal(0.001)
+        "PREDICTOR".shouldnt.be.within(profile)
+        set_driver_tags.when.called_with(self.profile(), driver="COG", compress="JPEG2000").should.throw(ValueError)
+
+    def test_save_image_cog(self, tmp_path):
+        fname_cog, fname_gtiff = str(tmp_path / "crop_cog.tif"), str(tmp_path / "crop.tif")
+        save_image(self.DATA, self.profile(), fname_cog, driver="COG", compress="DEFLATE", num_threads=2)
+        save_image(self.DATA, self.profile(), fname_gtiff)
+        with rasterio.open(fname_cog) as ds:
+            ds.tags(ns="IMAGE_STRUCTURE")["LAYOUT"].should.equal("COG")
+            ds.tags(ns="IMAGE_STRUCTURE")["PREDICTOR"].should.equal("3")  # floating point predictor
+            ds.compression.value.should.equal("DEFLATE")
+            ds.block_shapes[0].should.equal((512, 512))
+            ds.overviews(1).should.equal([2, 4])
+            ds.descriptions.should.equal(("nir", "red"))
+            np.array_equal(ds.read(), self.DATA.data).should.be.true
+        (tmp_path / "crop_cog.tif").stat().st_size.should.be.lower_than((tmp_path / "crop.tif").stat().st_size)
+
+    def test_save_image_cog_lerc_max_z_error(self, tmp_path):
+        fname_lossless, fname_lossy = str(tmp_path / "crop_lerc.tif"), str(tmp_path / "crop_lerc_lossy.tif")
+        save_image(self.DATA, self.profile(), fname_lossless, driver="COG", compress="LERC")
+        save_image(self.DATA, self.profile(), fname_lossy, driver="COG", compress="LERC", max_z_error=0.01)
+        with rasterio.open(fname_lossless) as ds:
+            ds.tags(ns="IMAGE_STRUCTURE")["COMPRESSION"].should.equal("LERC")
+            "MAX_Z_ERROR".shouldnt.be.within(ds.tags(ns="IMAGE_STRUCTURE"))  # lossless
+            np.array_equal(ds.read(), self.DATA.data).should.be.true
+        with rasterio.open(fname_lossy) as ds:
+            float(ds.tags(ns="IMAGE_STRUCTURE")["MAX_Z_ERROR"]).should.equal(0.01)
+            np.abs(ds.read() - self.DATA.data).max().should.be.lower_than(0.01 + 1e-6)
+            np.array_equal(ds.read(), self.DATA.data).should.be.false
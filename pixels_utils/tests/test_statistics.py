@@ -1,5 +1,12 @@
+from copy import deepcopy
+from dataclasses import replace
+from glob import glob
+from json import dumps as json_dumps
+
 import mock
+import pyarrow.parquet as pq
 import sure
+from geo_utils.vector import geojson_to_shapely
 from requests import Response
 
 from pixels_utils.stac_catalogs.earthsearch.v1 import (
@@ -10,7 +17,15 @@ from pixels_utils.stac_catalogs.earthsearch.v1 import (
 )
 from pixels_utils.tests.data.load_data import sample_feature, sample_scene_url
 from pixels_utils.titiler import TITILER_ENDPOINT
-from pixels_utils.titiler.endpoints.stac import QueryParamsStatistics, Statistics, StatisticsPreValidation
+from pixels_utils.titiler.endpoints.stac import (
+    QueryParamsStatistics,
+    Statistics,
+    StatisticsFeatureCollection,
+    StatisticsParquetSink,
+    StatisticsPreValidation,
+    to_pixel_dimensions,
+    to_pixel_dimensions_batch,
+)
 from pixels_utils.titiler.mask.enum_classes import Sentinel2_SCL, Sentinel2_SCL_Group
 
 _ = sure.version
@@ -227,3 +242,140 @@ class Test_Titiler_Endpoint_Stac_Statistics_Expression_NDVI:
             stats["mean"].should.equal(0.0, epsilon=0.001)
             stats["count"].should.equal(stats["valid_pixels"])
             calculate_valid_pix_pct(stats).should.equal(stats["valid_percent"], epsilon=0.01)
+
+
+class Test_Titiler_Endpoint_Stac_Statistics_FeatureCollection:
+    DATA_ID = 1
+
+    FEATURE = sample_feature(DATA_ID)
+    URL = sample_scene_url(DATA_ID)
+    QUERY_PARAMS = QueryParamsStatistics(url=URL, expression="(nir-red)/(nir+red)", asset_as_band=True)
+
+    def features(self, n: int):
+        features = []
+        for i in range(n):
+            feature = deepcopy(dict(self.FEATURE))
+            _ = feature.pop("id", None)
+            feature["properties"] = {"field_id": f"field_{i}"}
+            features.append(feature)
+        return {"type": "FeatureCollection", "features": features}
+
+    @staticmethod
+    def mock_post(url, params, json, headers):
+        r = Response()
+        r.status_code = 200
+        features = [
+            dict(feature, properties=dict(feature["properties"], statistics={"b1": {"mean": i}}))
+            for i, feature in enumerate(json["features"])
+        ]
+        r._content = json_dumps({"type": "FeatureCollection", "features": features}).encode()
+        return r
+
+    def test_statistics_feature_collection_chunks(self):
+        with mock.patch("pixels_utils.titiler.endpoints.stac._statistics.online_status_stac"), mock.patch(
+            "pixels_utils.titiler.endpoints.stac._statistics.post", side_effect=self.mock_post
+        ) as post_patch:
+            stats = StatisticsFeatureCollection(
+                query_params=self.QUERY_PARAMS,
+                features=self.features(5),
+                max_features_per_request=2,
+                id_key="field_id",
+            )
+            post_patch.call_count.should.equal(3)
+            len(stats.response).should.equal(3)
+            stats_dict = stats.to_dict()
+            list(stats_dict.keys()).should.equal([f"field_{i}" for i in range(5)])
+            [s["b1"]["mean"] for s in stats_dict.values()].should.equal([0, 1, 0, 1, 0])
+
+    def test_statistics_feature_collection_default_ids(self):
+        with mock.patch("pixels_utils.titiler.endpoints.stac._statistics.online_status_stac"), mock.patch(
+            "pixels_utils.titiler.endpoints.stac._statistics.post", side_effect=self.mock_post
+        ):
+            stats = StatisticsFeatureCollection(query_params=self.QUERY_PARAMS, features=self.features(3)["features"])
+            list(stats.to_dict().keys()).should.equal([0, 1, 2])
+
+    def test_statistics_feature_collection_duplicate_ids(self):
+        features = self.features(3)
+        features["features"][2]["properties"]["field_id"] = "field_0"
+        with mock.patch("pixels_utils.titiler.endpoints.stac._statistics.online_status_stac"), mock.patch(
+            "pixels_utils.titiler.endpoints.stac._statistics.post", side_effect=self.mock_post
+        ) as post_patch:
+            StatisticsFeatureCollection.when.called_with(
+                query_params=self.QUERY_PARAMS, features=features, id_key="field_id"
+            ).should.throw(ValueError, "Feature IDs must be unique")
+            StatisticsFeatureCollection.when.called_with(
+                query_params=self.QUERY_PARAMS, features=features, id_key="plot_id"
+            ).should.throw(ValueError, "must be in the")
+            post_patch.call_count.should.equal(0)
+
+    def test_statistics_feature_collection_mask_enum(self):
+        with mock.patch("pixels_utils.titiler.endpoints.stac._statistics.online_status_stac"), mock.patch(
+            "pixels_utils.titiler.endpoints.stac._statistics.post", return_value=mock.Mock(status_code=200)
+        ):
+            kwargs = dict(mask_enum=Sentinel2_SCL_Group.ARABLE, mask_asset="scl", whitelist=True)
+            stats_fc = StatisticsFeatureCollection(query_params=self.QUERY_PARAMS, features=self.features(2), **kwargs)
+            stats = Statistics(query_params=replace(self.QUERY_PARAMS, feature=self.FEATURE), **kwargs)
+            for key in ["expression", "nodata"]:
+                stats_fc.serialized_query_params[key].should.equal(stats.serialized_query_params[key])
+            stats_fc.serialized_query_params["expression"].should.match(r"^where\(")
+
+
+class Test_Titiler_Endpoint_Stac_Statistics_Parquet_Sink:
+    STATS = {
+        "b1": {
+            "min": 0.1,
+            "max": 0.9,
+            "mean": 0.5,
+            "count": 10.0,
+            "histogram": [[4.0, 6.0], [0.1, 0.5, 0.9]],
+            "valid_percent": 100.0,
+            "masked_pixels": 0.0,
+            "valid_pixels": 10.0,
+            "percentile_2": 0.11,
+            "percentile_98": 0.89,
+        },
+        "b2": {"min": None, "max": None, "mean": None, "count": 0.0},
+    }
+
+    def test_statistics_parquet_sink(self, tmp_path):
+        root_path = str(tmp_path / "stats")
+        with StatisticsParquetSink(root_path, max_buffer_rows=3) as sink:
+            sink.add("field_0", "scene_a", self.STATS, datetime="2022-06-08T19:00:00Z", expression="NDVI").should.equal(
+                2
+            )
+            sink.add_feature_collection(
+                "scene_b", {1: self.STATS, 2: self.STATS}, datetime="2022-06-10T19:00:00Z", expression="NDVI"
+            ).should.equal(4)
+            sink.n_rows_written.should.equal(6)  # buffer was full, so all rows were written
+            sink.add("field_0", "scene_c", {"b1": self.STATS["b1"]}, datetime="2022-06-10T20:00:00Z")
+            sink.n_rows_written.should.equal(6)
+        sink.n_rows_written.should.equal(7)  # remaining rows are written on close
+        sorted(p.split("/")[-1] for p in glob(f"{root_path}/*")).should.equal(["date=2022-06-08", "date=2022-06-10"])
+
+        df = pq.read_table(root_path).to_pandas().sort_values(["scene_id", "field_id", "band"])
+        len(df).should.equal(7)
+        list(df["field_id"]).should.equal(["field_0", "field_0", "1", "1", "2", "2", "field_0"])
+        list(df["band"]).should.equal(["b1", "b2", "b1", "b2", "b1", "b2", "b1"])
+        df["mean"].iloc[0].should.equal(0.5)
+        df["mean"].isna().iloc[1].should.be.true
+        list(df["histogram_counts"].iloc[0]).should.equal([4.0, 6.0])
+        df["percentile_98"].iloc[0].should.equal(0.89)
+        str(df["datetime"].iloc[0]).should.equal("2022-06-08 19:00:00+00:00")
+
+        with StatisticsParquetSink(root_path) as sink:  # appends to the existing dataset
+            sink.add("field_0", "scene_d", self.STATS, datetime="2022-06-08T19:00:00Z")
+        len(pq.read_table(root_path)).should.equal(9)
+
+
+class Test_Titiler_Endpoint_Stac_Pixel_Dimensions:
+    FEATURE = sample_feature(1)
+    BOUNDS = geojson_to_shapely(FEATURE).bounds
+
+    def test_to_pixel_dimensions_batch(self):
+        height, width = to_pixel_dimensions(geojson=self.FEATURE, height=None, width=None, gsd=10)
+        heights, widths = to_pixel_dimensions_batch([self.BOUNDS, self.BOUNDS], gsd=10)
+        heights.tolist().should.equal([height, height])
+        widths.tolist().should.equal([width, width])
+
+    def test_to_pixel_dimensions_precomputed(self):
+        to_pixel_dimensions(geojson=None, height=20, width=30, gsd=None).should.equal((20, 30))
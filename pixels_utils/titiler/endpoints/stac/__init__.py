@@ -3,6 +3,7 @@ from pixels_utils.titiler.endpoints.stac._info import STAC_INFO_ENDPOINT, Info,
 from pixels_utils.titiler.endpoints.stac._utilities import (  # _check_asset_main,; _check_assets_expression,; get_assets_expression_query,
     is_asset_available,
     to_pixel_dimensions,
+    to_pixel_dimensions_batch,
     validate_assets,
 )
 
@@ -10,9 +11,15 @@ from pixels_utils.titiler.endpoints.stac._statistics import (  # isort:skip
     STAC_STATISTICS_ENDPOINT,
     QueryParamsStatistics,
     Statistics,
+    StatisticsFeatureCollection,
     StatisticsPreValidation,
 )  # isort:skip
 
+from pixels_utils.titiler.endpoints.stac._statistics_sink import (  # isort:skip
+    StatisticsParquetSink,
+    statistics_schema,
+)  # isort:skip
+
 from pixels_utils.titiler.endpoints.stac.crop._crop import (  # isort:skip
     STAC_CROP_ENDPOINT,
     Crop,
@@ -20,12 +27,36 @@ from pixels_utils.titiler.endpoints.stac.crop._crop import (  # isort:skip
     QueryParamsCrop,
 )  # isort:skip
 
+from pixels_utils.titiler.endpoints.stac.crop._crop_expressions import (  # isort:skip
+    CropExpressions,
+    assets_from_expressions,
+    evaluate_expressions,
+)  # isort:skip
+
+from pixels_utils.titiler.endpoints.stac.crop._crop_mask import CropMask  # isort:skip
+
+from pixels_utils.titiler.endpoints.stac.crop._crop_regional import (  # isort:skip
+    CropRegional,
+    cluster_geometries,
+)  # isort:skip
+
+from pixels_utils.titiler.endpoints.stac.crop._crop_tiled import CropTiled  # isort:skip
+from pixels_utils.titiler.endpoints.stac.crop._crop_multipart import CropMultiPart  # isort:skip
+
 __all__ = [
     "online_status_stac",
     "STAC_CROP_ENDPOINT",
     "QueryParamsCrop",
     "Crop",
     "CropPreValidation",
+    "CropExpressions",
+    "CropMask",
+    "CropMultiPart",
+    "CropRegional",
+    "CropTiled",
+    "cluster_geometries",
+    "assets_from_expressions",
+    "evaluate_expressions",
     "Info",
     "QueryParamsInfo",
     "STAC_INFO_ENDPOINT",
@@ -33,9 +64,13 @@ __all__ = [
     "QueryParamsStatistics",
     "StatisticsPreValidation",
     "Statistics",
+    "StatisticsFeatureCollection",
+    "StatisticsParquetSink",
+    "statistics_schema",
     "_check_asset_main",
     "get_assets_expression_query",
     "to_pixel_dimensions",
+    "to_pixel_dimensions_batch",
     "is_asset_available",
     "validate_assets",
 ]
@@ -1,9 +1,10 @@
 import logging
 import re
+from collections import Counter
 from dataclasses import field
 from enum import Enum
 from functools import cached_property
-from typing import Any, ClassVar, List, Type, Union
+from typing import Any, ClassVar, Dict, Iterable, List, Type, Union
 
 from joblib import Memory  # type: ignore
 from marshmallow import Schema, ValidationError, validate, validates, validates_schema
@@ -181,6 +182,37 @@ class StatisticsPreValidation:
         # )  # Should issue a warning if "nodata" not available for collection
 
 
+def _add_mask_to_expression(
+    serialized_query_params: Dict[str, Any], mask_enum: List[Enum], mask_asset: str, whitelist: bool
+) -> Dict[str, Any]:
+    """
+    Adds pixel-based masking by `mask_enum` to the expression of serialized statistics query params (in place).
+
+    Assets do not accept numexpr functions, so `mask_enum` is ignored (with a warning) if `assets` are passed. If the
+    expression is masked and `nodata` is not set, `nodata` is set to 0.0 (the mask value).
+
+    Returns:
+        Dict[str, Any]: The updated serialized query params.
+    """
+    if mask_enum is not None and serialized_query_params["assets"] is not None:
+        logging.warning(
+            "`assets` do not accept numexpr functions, so `mask_enum` will be ignored. Use `expression` instead."
+        )
+    if mask_enum is not None and serialized_query_params["expression"] is not None:
+        logging.debug("Adding masking parameters to `expression`.")
+        serialized_query_params["expression"] = build_numexpr_mask_enum(
+            expression=serialized_query_params["expression"],
+            mask_enum=mask_enum,
+            whitelist=whitelist,
+            mask_value=serialized_query_params["nodata"],
+            mask_asset=mask_asset,
+        )
+        serialized_query_params["nodata"] = (
+            0.0 if serialized_query_params["nodata"] is None else serialized_query_params["nodata"]
+        )
+    return serialized_query_params
+
+
 @retry((RequestsConnectionError, KeyError, RuntimeError), tries=3, delay=2)
 class Statistics:
     """
@@ -245,23 +277,7 @@ class Statistics:
             "coord_crs", None
         )  # titiler anomaly
 
-        # Note: Assets do not do not accept numexpr functions
-        if self.mask_enum is not None and self.serialized_query_params["assets"] is not None:
-            logging.warning(
-                "`assets` do not accept numexpr functions, so `mask_enum` will be ignored. Use `expression` instead."
-            )
-        if self.mask_enum is not None and self.serialized_query_params["expression"] is not None:
-            logging.debug("Adding masking parameters to `expression`.")
-            self.serialized_query_params["expression"] = build_numexpr_mask_enum(
-                expression=self.serialized_query_params["expression"],
-                mask_enum=self.mask_enum,
-                whitelist=self.whitelist,
-                mask_value=self.serialized_query_params["nodata"],
-                mask_asset=self.mask_asset,
-            )
-            self.serialized_query_params["nodata"] = (
-                0.0 if self.serialized_query_params["nodata"] is None else self.serialized_query_params["nodata"]
-            )
+        _add_mask_to_expression(self.serialized_query_params, self.mask_enum, self.mask_asset, self.whitelist)
         # self.geometry = shapely_to_geojson_geometry(geojson_to_shapely(self.query_params.feature))
         self.response
 
@@ -310,3 +326,165 @@ class Statistics:
         if r.status_code != 200:
             logging.warning("Statistics %s request failed. Reason: %s", r.request.method, r.reason)
         return STAC_statistics(r)
+
+
+def _features_from_collection(feature_collection: Any) -> List[Dict]:
+    """
+    Returns the list of features from a GeoJSON FeatureCollection (or an iterable of GeoJSON Features).
+
+    Args:
+        feature_collection (Any): GeoJSON FeatureCollection, or an iterable of GeoJSON Features.
+
+    Raises:
+        TypeError: If any of the features is not a valid geometry (see `_validate_geometry()`).
+
+    Returns:
+        List[Dict]: GeoJSON Features.
+    """
+    if isinstance(feature_collection, dict) and feature_collection.get("type") == "FeatureCollection":
+        features = list(feature_collection["features"])
+    else:
+        features = list(feature_collection)
+    for feature in features:
+        _validate_geometry(feature)
+    return features
+
+
+@retry((RequestsConnectionError, KeyError, RuntimeError), tries=3, delay=2)
+class StatisticsFeatureCollection:
+    """
+    Class to help faciilitate titiler STAC statistics endpoint for many features (e.g., fields) at once.
+
+    Titiler's statistics endpoint accepts a FeatureCollection via POST and returns statistics for each feature, so
+    features are posted in chunks of `max_features_per_request` rather than making one `Statistics` request per
+    feature. Results are mapped back to feature IDs via `StatisticsFeatureCollection.to_dict()`.
+
+    Note:
+        `height`/`width` apply to every feature in the request, so `gsd` cannot be converted to pixel dimensions per
+        feature and is ignored (titiler reads each feature at the native resolution of the assets instead).
+
+    Args:
+        query_params (QueryParamsStatistics): The QueryParams to pass to the statistics endpoint (see titiler docs for
+        more information). `query_params.feature` is ignored in favor of `features`.
+
+        features (Any): GeoJSON FeatureCollection, or an iterable of GeoJSON Features.
+        max_features_per_request (int, optional): Maximum number of features to POST in each request. Defaults to 50.
+        id_key (str, optional): Key in each feature's "properties" to use as the feature ID. If None, the feature's "id"
+        member is used if present, otherwise its position in `features`. Feature IDs must be unique. Defaults to None.
+
+        clear_cache (bool, optional): Whether to clear the cache. Defaults to False.
+        titiler_endpoint (str): The `https://myendpoint` part of the example URL above. Defaults to
+        `https://pixels.sentera.com/stac/statistics`.
+    """
+
+    def __init__(
+        self,
+        query_params: QueryParamsStatistics,
+        features: Any,
+        max_features_per_request: int = 50,
+        id_key: str = None,
+        clear_cache: bool = False,
+        titiler_endpoint: str = TITILER_ENDPOINT,
+        mask_enum: List[Enum] = None,
+        mask_asset: str = None,
+        whitelist: bool = True,
+    ):
+        if max_features_per_request < 1:
+            raise ValueError("<max_features_per_request> must be at least 1.")
+        self.query_params = query_params
+        self.features = _features_from_collection(features)
+        self.max_features_per_request = max_features_per_request
+        self.id_key = id_key
+        if id_key is not None and any(id_key not in (feature.get("properties") or {}) for feature in self.features):
+            raise ValueError(f'<id_key> "{id_key}" must be in the "properties" of every feature.')
+        duplicates = [feature_id for feature_id, count in Counter(self.feature_ids).items() if count > 1]
+        if duplicates:
+            raise ValueError(f"Feature IDs must be unique (duplicated IDs: {duplicates}).")
+        self.serialized_query_params = QueryParamsStatistics.Schema().dump(query_params)
+
+        self.clear_cache = clear_cache
+        self.titiler_endpoint = titiler_endpoint
+        self.mask_enum = mask_enum
+        self.mask_asset = mask_asset
+        self.whitelist = whitelist
+
+        errors = QueryParamsStatistics.Schema().validate(self.serialized_query_params)
+        if errors:
+            raise ValidationError(errors)
+
+        assets = self.serialized_query_params.get("assets", None)
+        self.serialized_query_params["assets"] = [assets] if isinstance(assets, str) else assets
+        _ = self.serialized_query_params.pop("feature", None)  # Features are passed as a FeatureCollection instead
+        if self.serialized_query_params.pop("gsd", None) is not None:
+            logging.warning(
+                "`gsd` cannot be applied per feature for a FeatureCollection and will be ignored. Pass `height` and "
+                "`width` instead if all features should be read at the same pixel dimensions."
+            )
+        self.serialized_query_params["coord-crs"] = self.serialized_query_params.pop(
+            "coord_crs", None
+        )  # titiler anomaly
+
+        _add_mask_to_expression(self.serialized_query_params, self.mask_enum, self.mask_asset, self.whitelist)
+        self.response
+
+    @cached_property
+    def feature_ids(self) -> List[Any]:
+        """Feature IDs, in the same order as `features`."""
+        if self.id_key is not None:
+            return [feature["properties"][self.id_key] for feature in self.features]
+        return [feature.get("id", i) for i, feature in enumerate(self.features)]
+
+    def _chunks(self, items: List) -> Iterable[List]:
+        n = self.max_features_per_request
+        return (items[i : i + n] for i in range(0, len(items), n))
+
+    @cached_property
+    def response(
+        self,
+    ) -> List[STAC_statistics]:
+        """
+        Return statistics on STAC item's COG for each chunk of features.
+
+        Returns:
+            List[STAC_statistics]: Responses from the titiler stac statistics endpoint (one per chunk of features).
+        """
+        online_status_stac(self.titiler_endpoint, stac_endpoint=self.query_params.url)
+        query = {k: v for k, v in self.serialized_query_params.items() if v is not None}
+        headers = {"Cache-Control": "no-cache", "Pragma": "no-cache"} if self.clear_cache is True else {}
+
+        responses = []
+        for features in self._chunks(self.features):
+            logging.debug(
+                'POST request to "%s" with %s features and the following args:\nparams: %s\nheaders: %s',
+                STAC_STATISTICS_ENDPOINT,
+                len(features),
+                query,
+                headers,
+            )
+            r = post(
+                STAC_STATISTICS_ENDPOINT,
+                params=query,
+                json={"type": "FeatureCollection", "features": features},
+                headers=headers,
+            )
+            if r.status_code != 200:
+                logging.warning("StatisticsFeatureCollection POST request failed. Reason: %s", r.reason)
+            responses.append(STAC_statistics(r))
+        return responses
+
+    def to_dict(self) -> Dict[Any, Dict]:
+        """
+        Maps the statistics of each feature (i.e., `feature["properties"]["statistics"]`) to its feature ID.
+
+        Returns:
+            Dict[Any, Dict]: Statistics for each feature, keyed by feature ID.
+        """
+        statistics = {}
+        for feature_ids, r in zip(self._chunks(self.feature_ids), self.response):
+            assert r.status_code == 200, f"Cannot parse statistics from FeatureCollection response. Reason: {r.reason}."
+            features = r.json()["features"]
+            assert len(features) == len(feature_ids), "Number of features in the response does not match the request."
+            statistics.update(
+                {feature_id: feature["properties"]["statistics"] for feature_id, feature in zip(feature_ids, features)}
+            )
+        return statistics
@@ -0,0 +1,235 @@
+import logging
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Union
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas import Timestamp
+
+from pixels_utils.titiler.endpoints.stac._statistics import Statistics, StatisticsFeatureCollection
+
+STATISTICS_STATS = [
+    "min",
+    "max",
+    "mean",
+    "count",
+    "sum",
+    "std",
+    "median",
+    "majority",
+    "minority",
+    "unique",
+    "valid_percent",
+    "masked_pixels",
+    "valid_pixels",
+]
+
+
+def statistics_schema(percentiles: Iterable[int] = (2, 98)) -> pa.Schema:
+    """
+    Returns the Arrow schema of flattened statistics (one row per field, scene, expression, and band).
+
+    Args:
+        percentiles (Iterable[int], optional): Percentiles requested from the statistics endpoint (i.e., the `p` query
+        parameter); each is stored in its own "percentile_<p>" column. Defaults to (2, 98), the titiler default.
+
+    Returns:
+        pa.Schema: The schema; "date" (the UTC date of the scene) is the default partition column.
+    """
+    return pa.schema(
+        [
+            ("field_id", pa.string()),
+            ("scene_id", pa.string()),
+            ("datetime", pa.timestamp("us", tz="UTC")),
+            ("date", pa.date32()),
+            ("expression", pa.string()),
+            ("band", pa.string()),
+        ]
+        + [(stat, pa.float64()) for stat in STATISTICS_STATS]
+        + [(f"percentile_{p}", pa.float64()) for p in percentiles]
+        + [("histogram_counts", pa.list_(pa.float64())), ("histogram_edges", pa.list_(pa.float64()))]
+    )
+
+
+class StatisticsParquetSink:
+    """
+    Streams statistics responses to a partitioned Parquet dataset, with one row per (field, scene, expression, band).
+
+    Statistics are flattened into the columns of `statistics_schema()` as soon as they are added (so each response is
+    only parsed once), buffered, and written as a new file in each partition every time `max_buffer_rows` rows are
+    buffered (and on `flush()`/`close()`). Existing files are never overwritten, so many runs (or many sinks) can append
+    to the same dataset, and memory stays bounded regardless of the number of rows. Rows can be added from many threads.
+
+    Example:
+        >>> with StatisticsParquetSink("ndvi_2022.parquet") as sink:
+        >>>     for _, scene in df_scenes.iterrows():
+        >>>         stats = StatisticsFeatureCollection(query_params, features, id_key="field_id")
+        >>>         sink.add_feature_collection(scene["id"], stats, datetime=scene["datetime"], expression="NDVI")
+        >>> df = pyarrow.parquet.read_table("ndvi_2022.parquet", filters=[("field_id", "=", "12")]).to_pandas()
+
+    Args:
+        root_path (str): Root directory of the Parquet dataset (created if it does not exist).
+        partition_cols (List[str], optional): Columns to partition the dataset by (hive flavor, e.g., "date=2022-06-08").
+        Defaults to ["date"].
+
+        percentiles (Iterable[int], optional): Percentiles requested from the statistics endpoint. Defaults to (2, 98).
+        max_buffer_rows (int, optional): Maximum number of rows to buffer before writing. Defaults to 100,000.
+        row_group_size (int, optional): Maximum number of rows in each Parquet row group. Defaults to None (no limit).
+        compression (str, optional): Parquet compression codec. Defaults to "zstd".
+    """
+
+    def __init__(
+        self,
+        root_path: str,
+        partition_cols: List[str] = None,
+        percentiles: Iterable[int] = (2, 98),
+        max_buffer_rows: int = 100_000,
+        row_group_size: int = None,
+        compression: str = "zstd",
+    ):
+        if max_buffer_rows < 1:
+            raise ValueError("<max_buffer_rows> must be at least 1.")
+        self.root_path = root_path
+        self.schema = statistics_schema(percentiles)
+        partition_cols = ["date"] if partition_cols is None else partition_cols
+        if any(col not in self.schema.names for col in partition_cols):
+            raise ValueError(f"<partition_cols> must be columns of the statistics schema: {self.schema.names}.")
+        self.partition_cols = list(partition_cols)
+        self.percentiles = list(percentiles)
+        self.max_buffer_rows = max_buffer_rows
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.n_rows_written = 0
+        self._lock = Lock()
+        self._buffer = {name: [] for name in self.schema.names}
+        self._n_buffered = 0
+
+    def __enter__(self) -> "StatisticsParquetSink":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(
+        self,
+        field_id: Any,
+        scene_id: str,
+        statistics: Union[Statistics, Dict],
+        datetime: Union[datetime, str] = None,
+        expression: str = None,
+    ) -> int:
+        """
+        Adds the statistics of a field in a scene.
+
+        Args:
+            field_id (Any): Field ID (stored as a string).
+            scene_id (str): Scene ID.
+            statistics (Union[Statistics, Dict]): `Statistics` object, or its parsed statistics (i.e.,
+            `response.json()["properties"]["statistics"]`, keyed by band).
+
+            datetime (Union[datetime, str], optional): Datetime of the scene. Defaults to None.
+            expression (str, optional): Label of the expression (e.g., "NDVI"). Defaults to the expression of the query
+            params if `statistics` is a `Statistics` object.
+
+        Raises:
+            ValueError: If the response of `statistics` failed.
+
+        Returns:
+            int: Number of rows added (one per band).
+        """
+        if not isinstance(statistics, dict):  # `Statistics` is wrapped by `retry`, so it cannot be used with isinstance
+            r = statistics.response
+            if r.status_code != 200:
+                raise ValueError(f"Cannot parse statistics from response. Reason: {r.reason}.")
+            expression = statistics.query_params.expression if expression is None else expression
+            statistics = r.json()["properties"]["statistics"]
+        return self._append({field_id: statistics}, scene_id, datetime, expression)
+
+    def add_feature_collection(
+        self,
+        scene_id: str,
+        statistics: Union[StatisticsFeatureCollection, Dict[Any, Dict]],
+        datetime: Union[datetime, str] = None,
+        expression: str = None,
+    ) -> int:
+        """
+        Adds the statistics of many fields in a scene.
+
+        Args:
+            scene_id (str): Scene ID.
+            statistics (Union[StatisticsFeatureCollection, Dict[Any, Dict]]): `StatisticsFeatureCollection` object, or
+            statistics keyed by field ID (i.e., `StatisticsFeatureCollection.to_dict()`).
+
+            datetime (Union[datetime, str], optional): Datetime of the scene. Defaults to None.
+            expression (str, optional): Label of the expression (e.g., "NDVI"). Defaults to the expression of the query
+            params if `statistics` is a `StatisticsFeatureCollection` object.
+
+        Returns:
+            int: Number of rows added.
+        """
+        if not isinstance(statistics, dict):
+            expression = statistics.query_params.expression if expression is None else expression
+            statistics = statistics.to_dict()
+        return self._append(statistics, scene_id, datetime, expression)
+
+    def _append(
+        self, statistics: Dict[Any, Dict], scene_id: str, datetime: Union[datetime, str], expression: str
+    ) -> int:
+        """Flattens statistics (keyed by field ID, then band) into the buffer, and writes it if it is full."""
+        timestamp = Timestamp(datetime) if datetime is not None else None
+        if timestamp is not None:
+            timestamp = timestamp.tz_localize("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
+        rows = []
+        for field_id, stats_field in statistics.items():
+            for band, stats in stats_field.items():
+                histogram = stats.get("histogram") or [None, None]
+                row = {
+                    "field_id": None if field_id is None else str(field_id),
+                    "scene_id": scene_id,
+                    "datetime": timestamp,
+                    "date": timestamp.date() if timestamp is not None else None,
+                    "expression": expression,
+                    "band": band,
+                    "histogram_counts": histogram[0],
+                    "histogram_edges": histogram[1],
+                }
+                row.update({stat: stats.get(stat) for stat in STATISTICS_STATS})
+                row.update({f"percentile_{p}": stats.get(f"percentile_{p}") for p in self.percentiles})
+                rows.append(row)
+
+        with self._lock:
+            for row in rows:
+                for name, values in self._buffer.items():
+                    values.append(row[name])
+            self._n_buffered += len(rows)
+            if self._n_buffered >= self.max_buffer_rows:
+                self._write()
+        return len(rows)
+
+    def _write(self):
+        """Writes the buffer as new files of the dataset (must be called with the lock held)."""
+        if self._n_buffered == 0:
+            return
+        table = pa.Table.from_pydict(self._buffer, schema=self.schema)
+        pq.write_to_dataset(
+            table,
+            self.root_path,
+            partition_cols=self.partition_cols,
+            existing_data_behavior="overwrite_or_ignore",  # file names are unique, so existing files are kept
+            compression=self.compression,
+            row_group_size=self.row_group_size,
+        )
+        logging.debug("Wrote %s statistics rows to %s.", self._n_buffered, self.root_path)
+        self.n_rows_written += self._n_buffered
+        self._buffer = {name: [] for name in self.schema.names}
+        self._n_buffered = 0
+
+    def flush(self):
+        """Writes any buffered rows."""
+        with self._lock:
+            self._write()
+
+    def close(self):
+        """Writes any buffered rows (the sink can still be used afterwards)."""
+        self.flush()
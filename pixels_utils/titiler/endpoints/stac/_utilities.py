@@ -3,7 +3,13 @@ from typing import Any, List, Tuple, Union
 
 from geo_utils.vector import geojson_to_shapely, validate_geojson
 from geopy.distance import distance
+from numpy import abs as np_abs
+from numpy import asarray as np_asarray
+from numpy import concatenate as np_concatenate
+from numpy import float64
+from numpy import round as np_round
 from numpy.typing import ArrayLike
+from pyproj import Geod
 from requests import get
 
 # from pixels_utils.constants.sentinel2 import SCL
@@ -41,6 +47,8 @@ def to_pixel_dimensions(geojson: Any, height: int, width: int, gsd: Union[int, f
     Returns:
         Tuple(int, int): height, width pixel size for the tile.
     """
+    if (height is not None and width is not None) or gsd is None:
+        return height, width  # precomputed (or no gsd); skip parsing the geometry
     bounds = geojson_to_shapely(validate_geojson(geojson)).bounds
 
     if height is None and gsd is not None:
@@ -55,6 +63,40 @@ def to_pixel_dimensions(geojson: Any, height: int, width: int, gsd: Union[int, f
     return height, width
 
 
+def to_pixel_dimensions_batch(bounds: Any, gsd: Union[int, float]) -> Tuple[ArrayLike, ArrayLike]:
+    """Calculates pixel height and width for a ground sampling distance (in meters) for many features at once.
+
+    Equivalent to `to_pixel_dimensions()` for each feature, but all geodesic distances are computed in a single
+    (vectorized) `pyproj.Geod.inv()` call on the WGS84 ellipsoid. The results can be passed as `height` and `width` to
+    `QueryParamsStatistics`/`QueryParamsCrop` so they are not recomputed for each request.
+
+    Example:
+        >>> gdf = gpd.read_file("fields.geojson")
+        >>> heights, widths = to_pixel_dimensions_batch(gdf.geometry, gsd=10)
+
+    Args:
+        bounds (Any): A GeoSeries (or GeoDataFrame) of geometries, or an array of bounds with shape (n, 4) formatted as
+        (minx, miny, maxx, maxy) in geographic coordinates (EPSG:4326).
+        gsd (Union[int, float]): The desired ground sample distance in meters per pixel.
+
+    Returns:
+        Tuple(ArrayLike, ArrayLike): height, width pixel sizes (one per feature).
+    """
+    if hasattr(bounds, "crs") and bounds.crs is not None and not bounds.crs.is_geographic:
+        bounds = bounds.to_crs(epsg=4326)
+    bounds = np_asarray(bounds.bounds if hasattr(bounds, "bounds") else bounds, dtype=float64).reshape(-1, 4)
+    minx, miny, maxx, maxy = bounds.T
+    # heights (minx, miny -> minx, maxy) and widths (minx, miny -> maxx, miny) in one call
+    _, _, dist = Geod(ellps="WGS84").inv(
+        np_concatenate([minx, minx]),
+        np_concatenate([miny, miny]),
+        np_concatenate([minx, maxx]),
+        np_concatenate([maxy, miny]),
+    )
+    pixels = np_abs(np_round(dist / gsd)).astype(int)
+    return pixels[: len(bounds)], pixels[len(bounds) :]
+
+
 def is_asset_available(item_url: str, asset: str, stac_info_endpoint: str = STAC_INFO_ENDPOINT) -> bool:
     """
     Checks whether the given asset is available for the given STAC item.
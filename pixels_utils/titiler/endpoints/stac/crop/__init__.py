@@ -1,3 +1,9 @@
-from pixels_utils.titiler.endpoints.stac.crop._crop_response_utils import parse_crop_response, rescale_stac_crop
+from pixels_utils.titiler.endpoints.stac.crop._crop_response_utils import (
+    parse_crop_response,
+    rescale_stac_crop,
+    split_crop_bands,
+)
+from pixels_utils.titiler.endpoints.stac.crop._crop_statistics import crop_statistics
+from pixels_utils.titiler.endpoints.stac.crop._crop_zonal_statistics import zonal_statistics
 
-__all__ = ["parse_crop_response", "rescale_stac_crop"]
+__all__ = ["crop_statistics", "parse_crop_response", "rescale_stac_crop", "split_crop_bands", "zonal_statistics"]
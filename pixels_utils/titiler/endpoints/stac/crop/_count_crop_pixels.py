@@ -1,11 +1,18 @@
-from typing import Dict, Iterable
-
-from numpy import count_nonzero as np_count_nonzero
-from numpy import isin as np_isin
-from numpy.ma import count as npma_count
-from numpy.ma import count_masked as npma_count_masked
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, Iterable, List, Tuple
+
+import numpy.ma as ma
+from numpy import arange as np_arange
+from numpy import bincount as np_bincount
+from numpy import errstate as np_errstate
+from numpy import intp
+from numpy import ndarray as np_ndarray
+from numpy import repeat as np_repeat
 from numpy.typing import ArrayLike
+from pandas import DataFrame
 
+from pixels_utils.titiler.mask._local_mask import N_CLASSES, build_mask_lut
 from pixels_utils.titiler.mask.enum_classes import Sentinel2_SCL
 
 # A_: Total within and total outside feature
@@ -23,38 +30,190 @@ C1 = "pix_by_class"
 C2 = "pct_by_class"
 
 
+@dataclass
+class FeaturePixelCounts:
+    """
+    Counts of pixels within and outside the feature for each band (and scene) of a data array.
+
+    Counts are kept as compact arrays with shape (bands,) or (scenes, bands); the dict and DataFrame views are only built
+    on request.
+
+    Args:
+        band_names (List[str]): Band names.
+        feature_in_pix (np_ndarray): Count of pixels within the feature.
+        feature_out_pix (np_ndarray): Count of pixels outside the feature.
+    """
+
+    band_names: List[str]
+    feature_in_pix: np_ndarray
+    feature_out_pix: np_ndarray
+
+    @cached_property
+    def feature_in_pct(self) -> np_ndarray:
+        with np_errstate(divide="ignore", invalid="ignore"):
+            return self.feature_in_pix / (self.feature_in_pix + self.feature_out_pix) * 100
+
+    @cached_property
+    def feature_out_pct(self) -> np_ndarray:
+        with np_errstate(divide="ignore", invalid="ignore"):
+            return self.feature_out_pix / (self.feature_in_pix + self.feature_out_pix) * 100
+
+    @property
+    def stack(self) -> bool:
+        """Whether counts are for a stack of scenes."""
+        return self.feature_in_pix.ndim == 2
+
+    def to_dict(self) -> Dict:
+        """
+        Returns the counts keyed by stat, then by band name (see `count_feature_pixels()`).
+
+        If counts are for a stack of scenes, each value is an array with one value per scene.
+        """
+        stats = {A1: self.feature_in_pix, A2: self.feature_out_pix, A3: self.feature_in_pct, A4: self.feature_out_pct}
+        return {
+            key: {
+                band_name: values[:, i] if self.stack else values[i].item()
+                for i, band_name in enumerate(self.band_names)
+            }
+            for key, values in stats.items()
+        }
+
+    def to_dataframe(self) -> DataFrame:
+        """Returns the counts as a DataFrame with one row per band (and scene)."""
+        n_scenes = self.feature_in_pix.shape[0] if self.stack else 1
+        df = DataFrame(
+            {
+                "band": list(self.band_names) * n_scenes,
+                A1: self.feature_in_pix.ravel(),
+                A2: self.feature_out_pix.ravel(),
+                A3: self.feature_in_pct.ravel(),
+                A4: self.feature_out_pct.ravel(),
+            }
+        )
+        if self.stack:
+            df.insert(0, "scene", np_repeat(np_arange(n_scenes), len(self.band_names)))
+        return df
+
+
+def feature_pixel_counts(data: ArrayLike, band_names: Iterable) -> FeaturePixelCounts:
+    """
+    Counts valid and invalid pixels for every band (and scene) of a data array at once.
+
+    Args:
+        data (ArrayLike): Masked data array. Must be 3-dimensional (bands, rows, columns) or 4-dimensional (scenes, bands,
+        rows, columns).
+
+        band_names (Iterable): Band names.
+
+    Returns:
+        FeaturePixelCounts: Pixel counts within and outside feature.
+    """
+    if data.ndim not in (3, 4):
+        raise ValueError(f"Array must be 3- or 4-dimensional (passed array has {data.ndim} dimensions).")
+    band_names = list(band_names)
+    if len(band_names) != data.shape[-3]:
+        raise ValueError(f"<band_names> must be the same length as the number of bands in data ({data.shape[-3]}).")
+    masked = ma.getmaskarray(data).sum(axis=(-2, -1))
+    return FeaturePixelCounts(
+        band_names=band_names,
+        feature_in_pix=data.shape[-2] * data.shape[-1] - masked,
+        feature_out_pix=masked,
+    )
+
+
 def count_feature_pixels(data: ArrayLike, band_names: Iterable) -> Dict:
     """
     Counts valid and invalid pixels for each band in data array.
 
     Args:
-        data (ArrayLike): Data array. Must be 3-dimensional.
+        data (ArrayLike): Data array. Must be 3-dimensional (or 4-dimensional for a stack of scenes).
         band_names (Iterable): Band names. These will be the keys of the returned dict.
 
     Returns:
         Dict: Geojson pixel stats within and outside feature.
     """
-    feature_stats = {}
-    feature_stats[A1] = {band_name: npma_count(data[i, :, :]) for i, band_name in enumerate(band_names)}
-    feature_stats[A2] = {band_name: npma_count_masked(data[i, :, :]) for i, band_name in enumerate(band_names)}
-    # feature_stats["valid_pix"] = {band_name: count(data[i, :, :]) - count_masked(data[i, :, :]) for i, band_name in enumerate(band_names)}
-    feature_stats[A3] = {
-        bn1: v_pix / (v_pix + iv_pix) * 100
-        for (bn1, v_pix), (_, iv_pix) in zip(feature_stats[A1].items(), feature_stats[A2].items())
-    }
-    feature_stats[A4] = {
-        bn1: iv_pix / (v_pix + iv_pix) * 100
-        for (bn1, v_pix), (_, iv_pix) in zip(feature_stats[A1].items(), feature_stats[A2].items())
-    }
-    return feature_stats
-
-
-def count_valid_whitelist_pixels(array_classes: ArrayLike, mask_enum: Iterable, whitelist: bool) -> Dict:
+    return feature_pixel_counts(data, band_names).to_dict()
+
+
+def _class_counts(array_classes: ArrayLike) -> Tuple[np_ndarray, np_ndarray]:
+    """
+    Counts the pixels of each class (within the feature) for each scene, in a single `numpy.bincount()` pass.
+
+    Args:
+        array_classes (ArrayLike): Masked class array (e.g., Sentinel-2 SCL classes) with shape (scenes, rows, columns).
+
+    Returns:
+        Tuple[np_ndarray, np_ndarray]: Count of each class value within the feature (scenes x 256), and count of pixels
+        outside the feature (scenes).
+    """
+    n_scenes = array_classes.shape[0]
+    classes = ma.getdata(array_classes).reshape(n_scenes, -1).astype(intp)
+    outside = ma.getmaskarray(array_classes).reshape(n_scenes, -1)
+    classes += (np_arange(n_scenes, dtype=intp) * N_CLASSES)[:, None]  # offset each scene to its own set of bins
+    counts = np_bincount(classes[~outside], minlength=n_scenes * N_CLASSES).reshape(n_scenes, N_CLASSES)
+    return counts, outside.sum(axis=1)
+
+
+def _class_breakdown(
+    counts: np_ndarray, n_outside: np_ndarray, mask_enum: Iterable, whitelist: bool, stack: bool = False
+) -> Dict:
+    """
+    Derives the mask ENUM pixel stats from class counts (see `count_valid_whitelist_pixels()`).
+
+    Args:
+        counts (np_ndarray): Count of each class value within the feature (scenes x 256).
+        n_outside (np_ndarray): Count of pixels outside the feature (scenes).
+        mask_enum (Iterable): Sentinel-2 SCL classes to consider for pixel-based masking.
+        whitelist (bool): Whether `mask_enum` classes are considered "valid" (True) or "invalid" (False).
+        stack (bool, optional): Whether to return an array of values (one per scene) for each stat rather than a scalar
+        for the first scene. Defaults to False.
+
+    Returns:
+        Dict: Mask ENUM pixel stats.
+    """
+
+    def _out(values):
+        return values if stack is True else values[0].item()
+
+    n_inside = counts.sum(axis=1)
+    n_total = n_inside + n_outside
+    with np_errstate(divide="ignore", invalid="ignore"):
+        mask_enum_stats = {
+            A1: _out(n_inside),  # Intersects feature
+            A2: _out(n_outside),  # Outside feature
+            A3: _out(n_inside / n_total * 100),
+            A4: _out(n_outside / n_total * 100),
+        }
+        if mask_enum:
+            whitelist_pix = counts[:, build_mask_lut(mask_enum, whitelist=whitelist)].sum(axis=1)
+            mask_enum_stats[B1] = _out(whitelist_pix)  # count of valid pixels within feature
+            mask_enum_stats[B2] = _out(n_inside - whitelist_pix)  # count of invalid pixels within feature
+            mask_enum_stats[B3] = _out(whitelist_pix / n_inside * 100)
+            mask_enum_stats[B4] = _out((n_inside - whitelist_pix) / n_inside * 100)
+        else:
+            mask_enum_stats[B1] = None
+            mask_enum_stats[B2] = None
+            mask_enum_stats[B3] = None
+            mask_enum_stats[B4] = None
+
+        # C_: Breakdown of Mask ENUM classes within feature
+        mask_enum_stats[C1] = {scl.name: _out(counts[:, scl]) for scl in Sentinel2_SCL}
+        mask_enum_stats[C2] = {scl.name: _out(counts[:, scl] / n_inside * 100) for scl in Sentinel2_SCL}
+    return mask_enum_stats
+
+
+def count_valid_whitelist_pixels(
+    array_classes: ArrayLike, mask_enum: Iterable, whitelist: bool, stack: bool = False
+) -> Dict:
     """
     Counts valid and invalid pixels in Sentinel2_SCL array.
 
+    Class counts are derived from a single `numpy.bincount()` pass over the pixels within the feature, and all other
+    stats are derived from those counts.
+
     Args:
         array_classes (ArrayLike): Class array (e.g., Sentinel2 SCL classes). Must be 3-dimensional.
+
         mask_enum (Iterable): Sentinel-2 SCL classes to consider for pixel-based masking. If `None`,
         pixel-based masking is not implemented. The `whitelist` setting must be considered to determine if `mask_enum`
         classes are deemed to be valid or invalid.
@@ -62,47 +221,16 @@ def count_valid_whitelist_pixels(array_classes: ArrayLike, mask_enum: Iterable,
         whitelist (bool): If `True`, the passed `mask_enum` classes are considerd "valid" for pixel-based
         masking; if `False`, the passed `mask_enum` classes are considered "invalid" for pixel-based masking.
 
+        stack (bool, optional): If `True`, the 1st dimension of `array_classes` is treated as a stack of scenes (e.g., a
+        time series of SCL crops), and counts for all scenes are computed in one vectorized call. If `False`, only the
+        first band is counted. Defaults to False.
+
     Returns:
         Dict: Mask ENUM pixel stats A) within and outside feature, B) unmasked (valid) and masked (invalid) within feature,
-        and breakdown of Mask ENUM classes within feature.
+        and breakdown of Mask ENUM classes within feature. If `stack=True`, each stat is an array with one value per
+        scene.
     """
-    mask_enum_stats = {}
-
-    # A_: Total within and total outside feature
-    mask_enum_stats[A1] = npma_count(array_classes[0, :, :])  # Intersects feature
-    mask_enum_stats[A2] = npma_count_masked(array_classes[0, :, :])  # Outside feature
-    mask_enum_stats[A3] = mask_enum_stats[A1] / (mask_enum_stats[A1] + mask_enum_stats[A2]) * 100
-    mask_enum_stats[A4] = mask_enum_stats[A2] / (mask_enum_stats[A1] + mask_enum_stats[A2]) * 100
-
-    # B_: Total unmasked (valid) and masked (invalid) within feature
-    if mask_enum and whitelist:
-        scl_wl = mask_enum
-    elif mask_enum and whitelist is False:
-        scl_wl = set(Sentinel2_SCL) - set(mask_enum)
-    else:
-        scl_wl = None
-        mask_enum_stats[B1] = None
-        mask_enum_stats[B2] = None
-        mask_enum_stats[B3] = None
-        mask_enum_stats[B4] = None
-
-    if scl_wl:
-        mask_enum_stats[B1] = np_count_nonzero(
-            np_isin(array_classes.data[0, :, :], scl_wl)
-        )  # count of pixels in scl_wl (not including feature mask)
-        mask_enum_stats[B2] = (
-            mask_enum_stats[A1] - mask_enum_stats[B1]
-        )  # count of pixels NOT in scl_wl (not including feature mask)
-        # invalid_mask_enum_pix + valid_mask_enum_pix  # should equal sum(list(mask_enum_stats[C1].values())) - mask_enum_stats[C1]["GEOJSON_MASK"]
-        mask_enum_stats[B3] = mask_enum_stats[B1] / (mask_enum_stats[B1] + mask_enum_stats[B2]) * 100
-        mask_enum_stats[B4] = mask_enum_stats[B2] / (mask_enum_stats[B1] + mask_enum_stats[B2]) * 100
-
-    # C_: Breakdown of Mask ENUM classes within feature
-    mask_enum_stats[C1] = {scl.name: np_count_nonzero(array_classes.data[0, :, :] == scl) for scl in Sentinel2_SCL}
-    mask_enum_stats[C2] = {
-        scl.name: (np_count_nonzero(array_classes.data[0, :, :] == scl) / mask_enum_stats[A1]) * 100
-        for scl in Sentinel2_SCL
-    }
-    mask_enum_stats[C1]["NO_DATA"] = mask_enum_stats[C1]["NO_DATA"] - mask_enum_stats[A2]
-    mask_enum_stats[C2]["NO_DATA"] = (mask_enum_stats[C1]["NO_DATA"] / mask_enum_stats[A1]) * 100
-    return mask_enum_stats
+    if array_classes.ndim != 3:
+        raise ValueError(f"Array must be 3-dimensional (passed array has {array_classes.ndim} dimensions).")
+    counts, n_outside = _class_counts(array_classes if stack is True else array_classes[:1, :, :])
+    return _class_breakdown(counts, n_outside, mask_enum=mask_enum, whitelist=whitelist, stack=stack)
@@ -2,7 +2,8 @@ import logging
 import re
 from dataclasses import field
 from enum import Enum
-from functools import cached_property
+from functools import cached_property, lru_cache
+from json import loads as json_loads
 from typing import Any, ClassVar, Dict, List, Tuple, Type, Union
 
 from geo_utils.world import round_coordinate
@@ -13,9 +14,11 @@ from numpy.typing import ArrayLike
 from pyproj.crs import CRS, CRSError
 from rasterio.enums import Resampling
 from rasterio.profiles import Profile
+from rasterio.transform import Affine
 from requests import get, post
 from requests.exceptions import ConnectionError as RequestsConnectionError
 from retry import retry
+from shapely.geometry.base import BaseGeometry
 
 from pixels_utils.scenes._utils import _validate_geometry
 from pixels_utils.titiler import TITILER_ENDPOINT
@@ -23,7 +26,13 @@ from pixels_utils.titiler.endpoints import STAC_ENDPOINT
 from pixels_utils.titiler.endpoints.stac import Info
 from pixels_utils.titiler.endpoints.stac._connect import online_status_stac
 from pixels_utils.titiler.endpoints.stac._utilities import to_pixel_dimensions
-from pixels_utils.titiler.endpoints.stac.crop._crop_response_utils import parse_crop_response
+from pixels_utils.titiler.endpoints.stac.crop._crop_grid import (
+    feature_to_crs,
+    mask_outside_geometry,
+    native_grid,
+    snap_bounds_to_grid,
+)
+from pixels_utils.titiler.endpoints.stac.crop._crop_response_utils import parse_crop_response, split_crop_bands
 from pixels_utils.titiler.endpoints.stac.types import STAC_crop
 from pixels_utils.titiler.mask._mask import build_numexpr_mask_enum
 
@@ -62,6 +71,7 @@ class QueryParamsCrop:
     return_mask: bool = None
     algorithm: str = None
     algorithm_params: str = None
+    snap_to_grid: bool = None
     Schema: ClassVar[Type[Schema]] = Schema
 
     @validates(field_name="coord_crs")
@@ -104,6 +114,15 @@ class QueryParamsCrop:
                 'Both "gsd" and "height" or "width" were passed, but only "gsd" or "height" and "width" is allowed.',
             )
 
+    @validates_schema
+    def validate_snap_to_grid(self, data, **kwargs):
+        if data["snap_to_grid"] is True and data["feature"] is None:
+            raise ValidationError('"feature" must be passed if "snap_to_grid" is True.')
+        if data["snap_to_grid"] is True and (data["height"] or data["width"]):
+            raise ValidationError(
+                'Both "snap_to_grid" and "height" or "width" were passed, but height and width are set by the grid.'
+            )
+
     @validates_schema
     def validate_assets_expression(self, data, **kwargs):
         if data["assets"] is None and data["expression"] is None:  # Neither are set
@@ -116,6 +135,36 @@ class QueryParamsCrop:
             raise ValidationError('"assets" must be a list of strings.')
 
 
+@lru_cache(maxsize=256)
+def _get_stac_item(url: str) -> bytes:
+    """Gets a STAC item (JSON), cached in memory so crops of the same scene (e.g., tiles) only request it once."""
+    r = get(url)
+    r.raise_for_status()
+    return r.content
+
+
+def snap_feature_to_grid(
+    query_params: QueryParamsCrop,
+) -> Tuple[str, Affine, BaseGeometry, Tuple[float, float, float, float], int, int]:
+    """
+    Snaps the feature of `query_params` to the native grid of its STAC item (see `Crop` with `snap_to_grid=True`).
+
+    Args:
+        query_params (QueryParamsCrop): The QueryParams of the crop; `url` and `feature` are required.
+
+    Returns:
+        Tuple[str, Affine, BaseGeometry, Tuple[float, float, float, float], int, int]: Native CRS, native affine
+        transform, feature geometry (in the native CRS), snapped bounds, width, and height.
+    """
+    item = json_loads(_get_stac_item(query_params.url))
+    assets = query_params.assets or [query_params.expression]
+    crs, transform = native_grid(item, assets=assets)
+    geometry = feature_to_crs(query_params.feature, dst_crs=crs, src_crs=query_params.coord_crs)
+    bounds, width, height = snap_bounds_to_grid(geometry.bounds, transform, gsd=query_params.gsd)
+    logging.debug("Snapped feature to %s grid: %s (%sx%s)", crs, bounds, width, height)
+    return crs, transform, geometry, bounds, width, height
+
+
 class CropPreValidation:
     def __init__(
         self,
@@ -210,7 +259,19 @@ class Crop:
         2. Sentinel-2 L2A NDVI expression for a cropped geometry
             NOTE: data cannot be downloaded from raw URL; must read `response.content` (binary data) via rasterio (or
             use`Crop.to_rasterio()` method directly)
-            https://pixels.sentera.com/stac/crop/53x47.tif?url=https%3A%2F%2Fearth-search.aws.element84.com%2Fv1%2Fcollections%2Fsentinel-2-l2a%2Fitems%2FS2A_15TXK_20230622_0_L2A&expression=where%28scl%3D%3D4%2C%28nir-red%29%2F%28nir%2Bred%29%2Cwhere%28scl%3D%3D5%2C%28nir-red%29%2F%28nir%2Bred%29%2C0.0%29%29%3B&asset_as_band=True&nodata=0.0
+            https://pixels.sentera.com/stac/crop/53x47.tif?url=https%3A%2F%2Fearth-search.aws.element84.com%2Fv1%2Fcollections%2Fsentinel-2-l2a%2Fitems%2FS2A_15TXK_20230622_0_L2A&expression=where%28%28scl%3D%3D4%29%7C%28scl%3D%3D5%29%2C%28nir-red%29%2F%28nir%2Bred%29%2C0.0%29%3B&asset_as_band=True&nodata=0.0
+
+        3. Several spectral indices bundled into a single request
+            Pass a semicolon (;) delimited expression (e.g., "(nir-red)/(nir+red);(nir-rededge1)/(nir+rededge1)"), and
+            masking (if any) is applied to each expression. Use `Crop.to_rasterio(split_bands=True, band_names=[...])`
+            to get a dictionary of per-index array views from the single download.
+
+        4. Crop snapped to the native (UTM) grid of the STAC item
+            With `snap_to_grid=True`, the bounds of the feature are snapped outward to the pixel edges of the item's
+            native grid (from its "proj:epsg"/"proj:code" and "proj:transform" metadata), and the bounding box is
+            requested in the native CRS at the native resolution (or at `gsd`, keeping the grid origin). The server
+            does not resample, crops of the same feature stack across dates pixel-for-pixel, and the request URL is
+            deterministic (i.e., cacheable). Pixels outside of the feature are masked locally in `Crop.to_rasterio()`.
 
         Args:
         query_params (QueryParamsCrop): The QueryParams to pass to the crop endpoint (see titiler docs for
@@ -250,10 +311,12 @@ class Crop:
         feature, gsd, height, width = [
             self.serialized_query_params.get(i, None) for i in ["feature", "gsd", "height", "width"]
         ]
+        self.snap_to_grid = self.serialized_query_params.pop("snap_to_grid", None) is True
         # Run to_pixel_dimensions() if feature is set (otherwise pass whatever already exists for height and width
+        # If snapping to the native grid, height and width are set by the grid (see `Crop.grid`)
         self.serialized_query_params["height"], self.serialized_query_params["width"] = (
             to_pixel_dimensions(geojson=feature, height=height, width=width, gsd=gsd)
-            if feature is not None
+            if feature is not None and self.snap_to_grid is False
             else [height, width]
         )
         _ = self.serialized_query_params.pop("gsd", None)  # Delete gsd from serialized_query_params
@@ -281,6 +344,18 @@ class Crop:
         # self.geometry = shapely_to_geojson_geometry(geojson_to_shapely(self.query_params.feature))
         self.response
 
+    @cached_property
+    def grid(self) -> Tuple[str, BaseGeometry, Tuple[float, float, float, float], int, int]:
+        """
+        Native grid of the STAC item that the feature is snapped to (only used if `snap_to_grid=True`).
+
+        Returns:
+            Tuple[str, BaseGeometry, Tuple[float, float, float, float], int, int]: Native CRS, feature geometry (in the
+            native CRS), snapped bounds, width, and height.
+        """
+        crs, _, geometry, bounds, width, height = snap_feature_to_grid(self.query_params)
+        return crs, geometry, bounds, width, height
+
     @cached_property
     def response(
         self,
@@ -300,7 +375,30 @@ class Crop:
         format_ = query.pop("format_", "")
         width_height = f"/{width}x{height}" if width is not None and height is not None else ""
 
-        if self.query_params.feature is None:
+        if self.snap_to_grid is True:
+            crs, _, bounds, width, height = self.grid
+            query.update({"coord-crs": crs, "dst-crs": crs})
+            logging.debug(
+                'GET request to "%s" with the following args:\nparams: %s\nheaders: %s',
+                STAC_CROP_ENDPOINT,
+                query,
+                headers,
+            )
+            stac_crop_url_get = STAC_CROP_URL_GET.format(
+                crop_endpoint=STAC_CROP_ENDPOINT,
+                minx=f"/{bounds[0]}",
+                miny=f",{bounds[1]}",
+                maxx=f",{bounds[2]}",
+                maxy=f",{bounds[3]}",
+                width_height=f"/{width}x{height}",
+                format_=format_,
+            )
+            r = get(
+                stac_crop_url_get,
+                params=query,
+                headers=headers,
+            )
+        elif self.query_params.feature is None:
             logging.debug(
                 'GET request to "%s" with the following args:\nparams: %s\nheaders: %s',
                 STAC_CROP_ENDPOINT,
@@ -349,17 +447,30 @@ class Crop:
             logging.warning("Crop %s request failed. Reason: %s", r.request.method, r.reason)
         return STAC_crop(r)
 
-    def to_rasterio(self, **kwargs) -> Tuple[ArrayLike, Profile, Dict]:
+    def to_rasterio(
+        self, split_bands: bool = False, **kwargs
+    ) -> Tuple[Union[ArrayLike, Dict[str, ArrayLike]], Profile, Dict]:
         """
         Convert STAC crop response to rasterio objects (array, profile, tags).
 
+        Args:
+            split_bands (bool, optional): Whether to return the masked data array as a dictionary of single-band array
+            views keyed by band name (see `parse_crop_response()`). If `band_names` is not passed, the semicolon (;)
+            delimited `expression` (before masking is applied) is used for the band names. Defaults to False.
+
         Returns:
-            Tuple[ArrayLike, Profile, Dict]: Output rasterio objects.
+            Tuple[Union[ArrayLike, Dict[str, ArrayLike]], Profile, Dict]: Output rasterio objects.
         """
         # TODO: Consider validating kwargs before passing to parse_crop_response()
+        if split_bands is True and kwargs.get("band_names") is None and self.query_params.expression is not None:
+            kwargs["band_names"] = [expr for expr in self.query_params.expression.split(";") if expr]
         data_mask, profile_mask, tags = parse_crop_response(
             r=self.response,
+            split_bands=split_bands and not self.snap_to_grid,
             **kwargs,
             # **{"dtype": float32, "band_names": [collection_ndvi.short_name], "band_description": [collection_ndvi.short_name]},
         )
+        if self.snap_to_grid is True:  # bounding box was cropped, so mask pixels outside the feature locally
+            data_mask = mask_outside_geometry(data_mask, self.grid[1], profile_mask["transform"])
+            data_mask = split_crop_bands(data_mask, kwargs.get("band_names")) if split_bands is True else data_mask
         return data_mask, profile_mask, tags
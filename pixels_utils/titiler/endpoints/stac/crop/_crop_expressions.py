@@ -0,0 +1,228 @@
+import logging
+import re
+from dataclasses import replace
+from enum import Enum
+from functools import cached_property
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy.ma as ma
+from numexpr import evaluate as ne_evaluate
+from numexpr.expressions import functions as ne_functions
+from numpy import float32
+from numpy import logical_or as np_logical_or
+from numpy.typing import ArrayLike, DTypeLike
+from rasterio.enums import Resampling
+from rasterio.profiles import Profile
+
+from pixels_utils.stac_catalogs import Expression
+from pixels_utils.titiler import TITILER_ENDPOINT
+from pixels_utils.titiler.endpoints.stac.crop._crop import Crop, QueryParamsCrop
+from pixels_utils.titiler.mask._local_mask import apply_mask_lut, build_mask_lut
+
+
+def assets_from_expressions(expressions: Iterable[str], constants: Iterable[str] = None) -> List[str]:
+    """
+    Returns the union of assets required by one or more expressions, in order of first appearance.
+
+    Example:
+        >>> assets_from_expressions(["(nir-red)/(nir+red)", "(nir-green)/(nir+green)", "sqrt(nir08)"])
+        ['nir', 'red', 'green', 'nir08']
+
+    Args:
+        expressions (Iterable[str]): NumExpr expressions (may also be semicolon (;) delimited).
+        constants (Iterable[str], optional): Names within the expressions that are constants rather than assets (e.g.,
+        "L" for SAVI). Defaults to None.
+
+    Returns:
+        List[str]: Unique assets across all expressions.
+    """
+    expressions = [expressions] if isinstance(expressions, str) else expressions
+    exclude = set(ne_functions.keys()) | set(constants or [])
+    assets = {}  # dict maintains insertion order
+    for expression in expressions:
+        for name in re.findall(r"[A-Za-z_]\w*", expression):
+            if name not in exclude:
+                assets[name] = None
+    return list(assets.keys())
+
+
+def _expressions_as_dict(expressions: Union[Dict[str, str], Iterable[Union[str, Expression]]]) -> Dict[str, str]:
+    """Returns `expressions` as a dict of {name: expression} (Expression objects are named by `short_name`)."""
+    if isinstance(expressions, dict):
+        return dict(expressions)
+    expressions = [expressions] if isinstance(expressions, (str, Expression)) else expressions
+    return {
+        (expression.short_name if isinstance(expression, Expression) else expression): (
+            expression.expression if isinstance(expression, Expression) else expression
+        )
+        for expression in expressions
+    }
+
+
+def evaluate_expressions(
+    data: ArrayLike,
+    band_names: List[str],
+    expressions: Union[Dict[str, str], Iterable[Union[str, Expression]]],
+    mask_enum: List[Enum] = None,
+    mask_asset: str = "scl",
+    whitelist: bool = True,
+    constants: Dict[str, Union[int, float]] = None,
+    dtype: DTypeLike = float32,
+) -> Dict[str, ArrayLike]:
+    """
+    Evaluates any number of NumExpr expressions locally on a (masked) band stack.
+
+    Each asset in `band_names` is made available to the expressions by name, and each expression is evaluated with
+    (multithreaded) NumExpr, which is the same engine titiler uses server-side. Pixel-based masking by `mask_enum` is
+    applied locally from the `mask_asset` band, so a single band stack can be masked any number of ways.
+
+    Note:
+        The number of NumExpr threads is process-wide state, so it is not set here; configure it once (e.g., with the
+        `NUMEXPR_MAX_THREADS` environment variable or `numexpr.set_num_threads()`) if the default is not suitable.
+
+    Args:
+        data (ArrayLike): Masked data array of raw assets (e.g., from `Crop` with `assets` and `asset_as_band=True`).
+        Must be 3-dimensional (bands, rows, columns).
+
+        band_names (List[str]): Asset name of each band in `data`.
+        expressions (Union[Dict[str, str], Iterable[Union[str, Expression]]]): Expressions to evaluate, either as a dict
+        of {name: expression}, or as an iterable of expression strings or `Expression` objects (keyed by the
+        expression string or `Expression.short_name`, respectively).
+
+        mask_enum (List[Enum], optional): Classes of `mask_asset` to consider for pixel-based masking. If `None`,
+        pixel-based masking is not applied. Defaults to None.
+
+        mask_asset (str, optional): The band of `data` containing classes (e.g., Sentinel-2 SCL). Defaults to "scl".
+        whitelist (bool, optional): Whether `mask_enum` classes are kept (True) or masked out (False). Defaults to True.
+        constants (Dict[str, Union[int, float]], optional): Values of any constants used in the expressions (e.g.,
+        {"L": 0.5} for SAVI). Defaults to None.
+
+        dtype (DTypeLike, optional): The dtype of the output arrays. Defaults to float32.
+
+    Returns:
+        Dict[str, ArrayLike]: Masked (3-dimensional) array for each expression, keyed by name.
+    """
+    if data.ndim != 3:
+        raise ValueError(f"Array must be 3-dimensional (passed array has {data.ndim} dimensions).")
+    band_names = list(band_names)
+    if len(band_names) != data.shape[0]:
+        raise ValueError(f"<band_names> must be the same length as the number of bands in data ({data.shape[0]}).")
+    expressions = _expressions_as_dict(expressions)
+
+    local_dict = {band_name: data.data[i, :, :] for i, band_name in enumerate(band_names)}
+    local_dict.update(constants or {})
+    mask = ma.getmaskarray(data).any(axis=0)  # titiler applies the same alpha mask to all bands
+    if mask_enum is not None:
+        if mask_asset not in band_names:
+            raise ValueError(f'<mask_asset> "{mask_asset}" must be one of the bands in data ({band_names}).')
+        mask = np_logical_or(mask, ~apply_mask_lut(local_dict[mask_asset], build_mask_lut(mask_enum, whitelist)))
+
+    arrays = {}
+    for name, expression in expressions.items():
+        missing = assets_from_expressions(expression, constants=local_dict.keys())
+        if missing:
+            raise ValueError(f'Expression "{name}" requires assets that are not in data: {missing}')
+        array = ne_evaluate(expression, local_dict=local_dict).astype(dtype, copy=False)
+        arrays[name] = ma.masked_array(array[None, :, :], mask=mask[None, :, :], fill_value=data.fill_value)
+    return arrays
+
+
+class CropExpressions:
+    """
+    Crops the union of assets required by many expressions once, then evaluates the expressions locally.
+
+    Each spectral index requested via `Crop` or `Statistics` is a separate download of the same footprint. Instead,
+    this class crops the raw assets (with `asset_as_band=True`) in a single request and evaluates any number of
+    expressions (e.g., every `Expression` from `expressions_from_collection()`) locally with NumExpr. The `mask_asset`
+    (e.g., "scl") is cropped as part of the same request so that pixel-based masking can be applied locally as well.
+
+    Note:
+        Most spectral indices expect reflectance, so consider passing `unscale=True` in `query_params` so titiler
+        applies the scale/offset of each asset. All assets of the request share the same resampling, so `resampling`
+        must be nearest (or unset) if `mask_asset` is passed; otherwise classes would be blended into invalid values.
+
+    Args:
+        query_params (QueryParamsCrop): The QueryParams to pass to the crop endpoint; `assets`, `expression`, and
+        `asset_as_band` are overridden.
+
+        expressions (Union[Dict[str, str], Iterable[Union[str, Expression]]]): Expressions to evaluate (see
+        `evaluate_expressions()`).
+
+        mask_asset (str, optional): Asset containing classes for pixel-based masking (e.g., "scl"). If `None`, masking
+        is not available in `CropExpressions.evaluate()`. Defaults to None.
+
+        constants (Dict[str, Union[int, float]], optional): Values of any constants used in the expressions. Defaults
+        to None.
+
+        clear_cache (bool, optional): Whether to clear the cache. Defaults to False.
+        titiler_endpoint (str): The titiler endpoint. Defaults to `https://pixels.sentera.com`.
+    """
+
+    def __init__(
+        self,
+        query_params: QueryParamsCrop,
+        expressions: Union[Dict[str, str], Iterable[Union[str, Expression]]],
+        mask_asset: str = None,
+        constants: Dict[str, Union[int, float]] = None,
+        clear_cache: bool = False,
+        titiler_endpoint: str = TITILER_ENDPOINT,
+    ):
+        if mask_asset is not None and query_params.resampling not in (None, Resampling.nearest.name):
+            raise ValueError(
+                f'<resampling> must be "nearest" to crop <mask_asset> "{mask_asset}" (classes cannot be interpolated); '
+                "use `CropMask` to crop the mask separately."
+            )
+        self.expressions = _expressions_as_dict(expressions)
+        self.mask_asset = mask_asset
+        self.constants = constants
+        self.assets = assets_from_expressions(self.expressions.values(), constants=(constants or {}).keys())
+        if mask_asset is not None and mask_asset not in self.assets:
+            self.assets.append(mask_asset)
+        logging.debug("Cropping %s assets for %s expressions.", len(self.assets), len(self.expressions))
+
+        self.query_params = replace(query_params, assets=self.assets, expression=None, asset_as_band=True)
+        self.crop = Crop(query_params=self.query_params, clear_cache=clear_cache, titiler_endpoint=titiler_endpoint)
+
+    @cached_property
+    def bands(self) -> Tuple[ArrayLike, Profile, Dict]:
+        """Masked band stack (one band per asset), rasterio profile, and tags; decoded once and cached."""
+        return self.crop.to_rasterio(dtype=float32, band_names=self.assets)
+
+    def evaluate(
+        self,
+        expressions: Union[Dict[str, str], Iterable[Union[str, Expression]]] = None,
+        mask_enum: List[Enum] = None,
+        whitelist: bool = True,
+        dtype: DTypeLike = float32,
+    ) -> Dict[str, ArrayLike]:
+        """
+        Evaluates expressions locally on the cached band stack (see `evaluate_expressions()`).
+
+        Args:
+            expressions (Union[Dict[str, str], Iterable[Union[str, Expression]]], optional): Expressions to evaluate;
+            must only require assets that were cropped. Defaults to all expressions passed on initialization.
+
+            mask_enum (List[Enum], optional): Classes of `mask_asset` to consider for pixel-based masking. Defaults to
+            None.
+
+            whitelist (bool, optional): Whether `mask_enum` classes are kept (True) or masked out (False). Defaults to
+            True.
+
+            dtype (DTypeLike, optional): The dtype of the output arrays. Defaults to float32.
+
+        Returns:
+            Dict[str, ArrayLike]: Masked (3-dimensional) array for each expression, keyed by name.
+        """
+        if mask_enum is not None and self.mask_asset is None:
+            raise ValueError("`mask_asset` must be set on initialization to apply `mask_enum` locally.")
+        data, _, _ = self.bands
+        return evaluate_expressions(
+            data=data,
+            band_names=self.assets,
+            expressions=self.expressions if expressions is None else expressions,
+            mask_enum=mask_enum,
+            mask_asset=self.mask_asset,
+            whitelist=whitelist,
+            constants=self.constants,
+            dtype=dtype,
+        )
@@ -0,0 +1,110 @@
+import re
+from math import ceil, floor
+from typing import Any, Dict, Iterable, Tuple
+
+import numpy.ma as ma
+from geo_utils.vector import geojson_to_shapely, validate_geojson
+from numpy import column_stack as np_column_stack
+from numpy.typing import ArrayLike
+from pyproj import Transformer
+from rasterio.features import geometry_mask
+from rasterio.transform import Affine
+from shapely import transform as shapely_transform
+from shapely.geometry.base import BaseGeometry
+
+
+def _item_crs(item: Dict, asset: Dict) -> str:
+    """Returns the CRS (e.g., "EPSG:32615") from the projection extension of a STAC asset or item."""
+    for properties in (asset, item.get("properties", {})):
+        if properties.get("proj:code") is not None:
+            return properties["proj:code"]
+        if properties.get("proj:epsg") is not None:
+            return f"EPSG:{properties['proj:epsg']}"
+    raise ValueError(f'STAC item "{item.get("id")}" does not have "proj:epsg" or "proj:code" metadata.')
+
+
+def native_grid(item: Dict, assets: Iterable[str] = None) -> Tuple[str, Affine]:
+    """
+    Gets the native grid (CRS and affine transform) of a STAC item from its projection extension metadata.
+
+    If several assets are passed (e.g., 10 m and 20 m Sentinel-2 bands), the finest grid is returned; coarser assets of
+    the same item share the grid origin, so they stay aligned to it.
+
+    Args:
+        item (Dict): STAC item (JSON).
+        assets (Iterable[str], optional): Assets (or an expression) to consider. Names that are not assets of the item
+        (e.g., numexpr functions) are ignored. Defaults to all assets.
+
+    Returns:
+        Tuple[str, Affine]: CRS (e.g., "EPSG:32615") and affine transform of the native grid.
+    """
+    item_assets = item.get("assets", {})
+    names = set(re.findall(r"[A-Za-z_]\w*", ";".join(assets))) if assets is not None else set(item_assets.keys())
+    grids = [
+        (_item_crs(item, item_assets[name]), Affine(*item_assets[name]["proj:transform"][:6]))
+        for name in names
+        if name in item_assets and item_assets[name].get("proj:transform") is not None
+    ]
+    if not grids and item.get("properties", {}).get("proj:transform") is not None:
+        grids = [(_item_crs(item, {}), Affine(*item["properties"]["proj:transform"][:6]))]
+    if not grids:
+        raise ValueError(f'STAC item "{item.get("id")}" does not have "proj:transform" metadata for {sorted(names)}.')
+    return min(grids, key=lambda grid: abs(grid[1].a))
+
+
+def geometry_to_crs(geometry: BaseGeometry, dst_crs: str, src_crs: str = None) -> BaseGeometry:
+    """Returns a shapely geometry reprojected from `src_crs` (defaults to EPSG:4326) to `dst_crs`."""
+    transformer = Transformer.from_crs("EPSG:4326" if src_crs is None else src_crs, dst_crs, always_xy=True)
+    return shapely_transform(geometry, lambda xy: np_column_stack(transformer.transform(xy[:, 0], xy[:, 1])))
+
+
+def feature_to_crs(feature: Any, dst_crs: str, src_crs: str = None) -> BaseGeometry:
+    """Returns the geometry of a GeoJSON feature reprojected from `src_crs` (defaults to EPSG:4326) to `dst_crs`."""
+    return geometry_to_crs(geojson_to_shapely(validate_geojson(feature)), dst_crs=dst_crs, src_crs=src_crs)
+
+
+def snap_bounds_to_grid(
+    bounds: Tuple[float, float, float, float], transform: Affine, gsd: float = None
+) -> Tuple[Tuple[float, float, float, float], int, int]:
+    """
+    Snaps bounds outward to the pixel edges of a (north-up) grid.
+
+    Args:
+        bounds (Tuple[float, float, float, float]): Bounds (minx, miny, maxx, maxy) in the CRS of the grid.
+        transform (Affine): Affine transform of the grid.
+        gsd (float, optional): Pixel size to use instead of the native pixel size of the grid (the grid origin is kept).
+        Defaults to None.
+
+    Returns:
+        Tuple[Tuple[float, float, float, float], int, int]: Snapped bounds, width, and height (in pixels).
+    """
+    x_res, y_res = (abs(transform.a), abs(transform.e)) if gsd is None else (gsd, gsd)
+    x0, y0 = transform.c, transform.f
+    minx, miny, maxx, maxy = bounds
+    col_min, col_max = floor((minx - x0) / x_res), ceil((maxx - x0) / x_res)
+    row_min, row_max = floor((y0 - maxy) / y_res), ceil((y0 - miny) / y_res)
+    width, height = max(col_max - col_min, 1), max(row_max - row_min, 1)
+    snapped = (
+        x0 + col_min * x_res,
+        y0 - (row_min + height) * y_res,
+        x0 + (col_min + width) * x_res,
+        y0 - row_min * y_res,
+    )
+    return snapped, width, height
+
+
+def mask_outside_geometry(data: ArrayLike, geometry: BaseGeometry, transform: Affine) -> ArrayLike:
+    """
+    Masks (in place) the pixels of `data` whose centers fall outside of `geometry`.
+
+    Args:
+        data (ArrayLike): Masked data array. Must be 3-dimensional (bands, rows, columns).
+        geometry (BaseGeometry): Geometry in the CRS of `data`.
+        transform (Affine): Affine transform of `data`.
+
+    Returns:
+        ArrayLike: `data`, with pixels outside of `geometry` masked.
+    """
+    outside = geometry_mask([geometry], out_shape=data.shape[-2:], transform=transform)
+    data.mask = ma.getmaskarray(data) | outside
+    return data
@@ -0,0 +1,96 @@
+from dataclasses import replace
+from enum import Enum
+from functools import cached_property
+from typing import Dict, List, Tuple
+
+import numpy.ma as ma
+from numpy import logical_or as np_logical_or
+from numpy import ndarray as np_ndarray
+from numpy.typing import ArrayLike
+from rasterio.enums import Resampling
+from rasterio.profiles import Profile
+
+from pixels_utils.titiler import TITILER_ENDPOINT
+from pixels_utils.titiler.endpoints.stac.crop._crop import Crop, QueryParamsCrop
+from pixels_utils.titiler.mask._local_mask import apply_mask_lut, build_mask_lut
+
+
+class CropMask:
+    """
+    Crops the class asset (e.g., Sentinel-2 "scl") of a scene/feature once, and applies any number of pixel-based masks
+    locally.
+
+    Every `mask_enum`/`whitelist` combination passed to `Crop` or `Statistics` is baked into a new numexpr expression,
+    and thus a new request. Instead, this class crops `mask_asset` once (with nearest resampling, so classes are not
+    blended), then evaluates any mask variant (e.g., ARABLE whitelist or CLOUDS blacklist) via a lookup table.
+
+    Args:
+        query_params (QueryParamsCrop): The QueryParams to pass to the crop endpoint; `assets`, `expression`,
+        `asset_as_band`, and `resampling` are overridden. To align with data cropped separately, use the same `feature`
+        and pixel dimensions (e.g., `gsd`).
+
+        mask_asset (str, optional): The asset containing classes. Defaults to "scl".
+        clear_cache (bool, optional): Whether to clear the cache. Defaults to False.
+        titiler_endpoint (str): The titiler endpoint. Defaults to `https://pixels.sentera.com`.
+    """
+
+    def __init__(
+        self,
+        query_params: QueryParamsCrop,
+        mask_asset: str = "scl",
+        clear_cache: bool = False,
+        titiler_endpoint: str = TITILER_ENDPOINT,
+    ):
+        self.mask_asset = mask_asset
+        self.query_params = replace(
+            query_params,
+            assets=[mask_asset],
+            expression=None,
+            asset_as_band=True,
+            resampling=Resampling.nearest.name,
+        )
+        self.crop = Crop(query_params=self.query_params, clear_cache=clear_cache, titiler_endpoint=titiler_endpoint)
+
+    @cached_property
+    def classes(self) -> Tuple[ArrayLike, Profile, Dict]:
+        """Masked class array (1 band), rasterio profile, and tags; decoded once and cached."""
+        return self.crop.to_rasterio(band_names=[self.mask_asset])
+
+    def mask(self, mask_enum: List[Enum], whitelist: bool = True) -> np_ndarray:
+        """
+        Returns the mask (True for invalid pixels) for a `mask_enum`/`whitelist` combination.
+
+        Pixels outside the feature (i.e., masked in the cropped class array) are always invalid.
+
+        Args:
+            mask_enum (List[Enum]): Classes to consider for pixel-based masking.
+            whitelist (bool, optional): Whether `mask_enum` classes are kept (True) or masked out (False). Defaults to
+            True.
+
+        Returns:
+            np_ndarray: Boolean mask with shape (1, rows, columns).
+        """
+        array_classes, _, _ = self.classes
+        return np_logical_or(
+            ma.getmaskarray(array_classes), ~apply_mask_lut(array_classes, build_mask_lut(mask_enum, whitelist))
+        )
+
+    def apply(self, data: ArrayLike, mask_enum: List[Enum], whitelist: bool = True) -> ArrayLike:
+        """
+        Masks `data` by a `mask_enum`/`whitelist` combination (in addition to any existing mask of `data`).
+
+        Args:
+            data (ArrayLike): Data array aligned to the cropped class array (i.e., same rows and columns).
+            mask_enum (List[Enum]): Classes to consider for pixel-based masking.
+            whitelist (bool, optional): Whether `mask_enum` classes are kept (True) or masked out (False). Defaults to
+            True.
+
+        Returns:
+            ArrayLike: Masked data array; the data itself is not copied.
+        """
+        mask = self.mask(mask_enum, whitelist)
+        if data.shape[-2:] != mask.shape[-2:]:
+            raise ValueError(f"<data> {data.shape} is not aligned with the {self.mask_asset} array {mask.shape}.")
+        return ma.masked_array(
+            ma.getdata(data), mask=np_logical_or(ma.getmaskarray(data), mask), fill_value=ma.asarray(data).fill_value
+        )
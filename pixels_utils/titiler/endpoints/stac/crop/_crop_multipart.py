@@ -0,0 +1,149 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from enum import Enum
+from functools import cached_property
+from typing import Dict, List, Tuple, Union
+
+from geo_utils.vector import shapely_to_geojson_geometry
+from numpy.typing import ArrayLike
+from rasterio.profiles import Profile
+from rasterio.transform import from_origin
+from shapely import get_parts as shapely_get_parts
+from shapely.geometry.base import BaseGeometry
+from shapely.ops import unary_union
+
+from pixels_utils.titiler import TITILER_ENDPOINT
+from pixels_utils.titiler.endpoints.stac.crop._crop import Crop, QueryParamsCrop, snap_feature_to_grid
+from pixels_utils.titiler.endpoints.stac.crop._crop_grid import mask_outside_geometry, snap_bounds_to_grid
+from pixels_utils.titiler.endpoints.stac.crop._crop_regional import cluster_geometries
+from pixels_utils.titiler.endpoints.stac.crop._crop_response_utils import split_crop_bands
+from pixels_utils.titiler.endpoints.stac.crop._crop_tiled import mosaic_crops
+
+
+class CropMultiPart:
+    """
+    Crops the parts of a sparse multipart feature (e.g., a farm with scattered fields) separately.
+
+    A single `Crop` of a MultiPolygon transfers (and decodes) every pixel of its bounding box, even if most of them are
+    outside the geometry. Here, the parts of the feature (in the native CRS of the STAC item) are clustered by tile (see
+    `cluster_geometries()`), and if the bounding boxes of the clusters cover less than `max_fill` of the feature's bounding
+    box, each cluster is requested by its own `Crop` (snapped to the native grid, and requested concurrently), so the
+    transferred pixels scale with the area of the parts rather than the area of their bounding box. Otherwise (i.e., the
+    feature is not sparse), a single `Crop` is requested.
+
+    Args:
+        query_params (QueryParamsCrop): The QueryParams to pass to the crop endpoint; `feature` is required, and
+        `height` and `width` are not allowed (they are set by the native grid).
+
+        tile_size (float, optional): Size of the tiles used to cluster parts, in meters. Defaults to 1000.
+        max_fill (float, optional): The feature is cropped by part only if the (snapped) bounding boxes of the clusters
+        cover less than this fraction of the (snapped) bounding box of the feature, i.e. if cropping by part transfers
+        less than `max_fill` of the pixels of a single `Crop` (see `CropMultiPart.fill`). Defaults to 0.5.
+
+        max_workers (int, optional): Maximum number of parts to request concurrently. Defaults to 4.
+        clear_cache (bool, optional): Whether to clear the cache. Defaults to False.
+        titiler_endpoint (str): The titiler endpoint. Defaults to `https://pixels.sentera.com`.
+        mask_enum (List[Enum], optional): Classes to consider for pixel-based masking (see `Crop`). Defaults to None.
+        mask_asset (str, optional): Asset containing the classes for pixel-based masking. Defaults to None.
+        whitelist (bool, optional): Whether `mask_enum` classes are valid (True) or invalid (False). Defaults to True.
+    """
+
+    def __init__(
+        self,
+        query_params: QueryParamsCrop,
+        tile_size: float = 1000,
+        max_fill: float = 0.5,
+        max_workers: int = 4,
+        clear_cache: bool = False,
+        titiler_endpoint: str = TITILER_ENDPOINT,
+        mask_enum: List[Enum] = None,
+        mask_asset: str = None,
+        whitelist: bool = True,
+    ):
+        if query_params.feature is None:
+            raise ValueError('"feature" must be passed to crop by part.')
+        if query_params.height is not None or query_params.width is not None:
+            raise ValueError('"height" and "width" cannot be passed to crop by part (they are set by the native grid).')
+        self.query_params = query_params
+        self.max_workers = max_workers
+        self.clear_cache = clear_cache
+        self.titiler_endpoint = titiler_endpoint
+        self.mask_enum = mask_enum
+        self.mask_asset = mask_asset
+        self.whitelist = whitelist
+
+        self.crs, transform, self.geometry, self.bounds, self.width, self.height = snap_feature_to_grid(query_params)
+        x_res, y_res = (abs(transform.a), abs(transform.e)) if query_params.gsd is None else (query_params.gsd,) * 2
+        self.transform = from_origin(self.bounds[0], self.bounds[3], x_res, y_res)
+
+        parts = list(shapely_get_parts(self.geometry))
+        self.parts = [
+            unary_union([parts[i] for i in cluster])
+            for cluster in cluster_geometries(parts, tile_size=tile_size, crs=self.crs)
+        ]
+        n_pixels = 0
+        for part in self.parts:
+            _, width, height = snap_bounds_to_grid(part.bounds, self.transform)
+            n_pixels += width * height
+        self.fill = n_pixels / (self.width * self.height)  # fraction of the bounding box that would be transferred
+        if self.fill >= max_fill:
+            self.parts = [self.geometry]
+        logging.debug(
+            "Parts cover %s%% of the bounding box; cropping %s part(s).", round(self.fill * 100, 1), len(self.parts)
+        )
+
+    @property
+    def is_sparse(self) -> bool:
+        """Whether the parts of the feature are cropped separately."""
+        return len(self.parts) > 1
+
+    def crop(self, part: BaseGeometry) -> Crop:
+        """Returns the `Crop` of a part (requested in the native CRS, snapped to the native grid)."""
+        feature = {"type": "Feature", "properties": {}, "geometry": shapely_to_geojson_geometry(part)}
+        return Crop(
+            query_params=replace(self.query_params, feature=feature, coord_crs=self.crs, snap_to_grid=True),
+            clear_cache=self.clear_cache,
+            titiler_endpoint=self.titiler_endpoint,
+            mask_enum=self.mask_enum,
+            mask_asset=self.mask_asset,
+            whitelist=self.whitelist,
+        )
+
+    @cached_property
+    def crops(self) -> List[Crop]:
+        """`Crop` of each part (requested concurrently)."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.crop, self.parts))
+
+    def to_rasterio(self, composite: bool = True, split_bands: bool = False, **kwargs) -> Union[
+        Tuple[Union[ArrayLike, Dict[str, ArrayLike]], Profile, Dict],
+        List[Tuple[Union[ArrayLike, Dict[str, ArrayLike]], Profile, Dict]],
+    ]:
+        """
+        Converts the crop of each part to rasterio objects (see `Crop.to_rasterio()`).
+
+        Args:
+            composite (bool, optional): Whether to mosaic the parts into a single masked array covering the bounding box
+            of the feature (True; pixels between parts are masked), or to return the rasterio objects of each part
+            (False). Defaults to True.
+
+            split_bands (bool, optional): Whether to return masked data arrays as dictionaries of single-band array
+            views keyed by band name. Defaults to False.
+
+            kwargs: Keyword arguments passed to `Crop.to_rasterio()` (e.g., `dtype` and `band_names`).
+
+        Returns:
+            Union[Tuple, List[Tuple]]: Output rasterio objects (data, profile, tags) of the composite, or of each part.
+        """
+        if split_bands is True and kwargs.get("band_names") is None and self.query_params.expression is not None:
+            kwargs["band_names"] = [expr for expr in self.query_params.expression.split(";") if expr]
+        if composite is False:
+            return [crop.to_rasterio(split_bands=split_bands, **kwargs) for crop in self.crops]
+        rasters = [crop.to_rasterio(**kwargs) for crop in self.crops]
+        data, profile = mosaic_crops(
+            [(data, profile) for data, profile, _ in rasters], self.transform, self.width, self.height
+        )
+        data = mask_outside_geometry(data, self.geometry, self.transform)
+        data = split_crop_bands(data, kwargs.get("band_names")) if split_bands is True else data
+        return data, profile, rasters[0][2]
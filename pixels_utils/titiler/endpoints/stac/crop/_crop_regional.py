@@ -0,0 +1,197 @@
+import logging
+from dataclasses import replace
+from enum import Enum
+from functools import cached_property
+from math import cos, radians
+from typing import Any, Dict, Hashable, List, Tuple, Union
+
+from geo_utils.vector import geojson_to_shapely, shapely_to_geojson_geometry, validate_geojson
+from numpy import asarray as np_asarray
+from numpy import floor as np_floor
+from numpy.typing import ArrayLike
+from pyproj.crs import CRS
+from rasterio.profiles import Profile
+from rasterio.transform import Affine
+from shapely import centroid as shapely_centroid
+from shapely import get_x as shapely_get_x
+from shapely import get_y as shapely_get_y
+from shapely.geometry.base import BaseGeometry
+from shapely.ops import unary_union
+
+from pixels_utils.titiler import TITILER_ENDPOINT
+from pixels_utils.titiler.endpoints.stac._statistics import _features_from_collection
+from pixels_utils.titiler.endpoints.stac.crop._crop import Crop, QueryParamsCrop
+from pixels_utils.titiler.endpoints.stac.crop._crop_grid import (
+    feature_to_crs,
+    mask_outside_geometry,
+    snap_bounds_to_grid,
+)
+from pixels_utils.titiler.endpoints.stac.crop._crop_response_utils import split_crop_bands
+
+METERS_PER_DEGREE = 111320  # approximate length of a degree of latitude (and of longitude at the equator)
+
+
+def cluster_geometries(geometries: List[BaseGeometry], tile_size: float = 5000, crs: str = None) -> List[List[int]]:
+    """
+    Clusters geometries into tiles of `tile_size` by their centroids.
+
+    Example:
+        >>> cluster_geometries([field_1, field_2, field_3], tile_size=5000)  # fields 1 and 3 are within the same tile
+        [[0, 2], [1]]
+
+    Args:
+        geometries (List[BaseGeometry]): Shapely geometries.
+        tile_size (float, optional): Size of each tile, in meters. Defaults to 5000.
+        crs (str, optional): CRS of `geometries`; geographic coordinates are converted to (approximate) meters around
+        the mean latitude of the geometries. Defaults to "EPSG:4326".
+
+    Returns:
+        List[List[int]]: Indexes of `geometries` within each cluster (clusters are ordered by their first geometry).
+    """
+    if len(geometries) == 0:
+        return []
+    centroids = shapely_centroid(np_asarray(geometries, dtype=object))
+    x, y = shapely_get_x(centroids), shapely_get_y(centroids)
+    if CRS.from_user_input("EPSG:4326" if crs is None else crs).is_geographic:
+        x, y = x * METERS_PER_DEGREE * cos(radians(float(y.mean()))), y * METERS_PER_DEGREE
+    tiles = zip(np_floor(x / tile_size).astype(int).tolist(), np_floor(y / tile_size).astype(int).tolist())
+    clusters = {}  # dict maintains insertion order
+    for i, tile in enumerate(tiles):
+        clusters.setdefault(tile, []).append(i)
+    return list(clusters.values())
+
+
+def clip_to_geometry(data: ArrayLike, profile: Profile, geometry: BaseGeometry) -> Tuple[ArrayLike, Profile]:
+    """
+    Clips a (native-grid) crop to the snapped window of a geometry, masking pixels outside of the geometry.
+
+    The window is snapped to the grid of `profile["transform"]` the same way `Crop` snaps the feature bounds with
+    `snap_to_grid=True`, so the clip has the same pixels, transform, and mask as a `Crop` of `geometry` alone.
+
+    Args:
+        data (ArrayLike): Masked data array (bands, rows, columns) covering `geometry`.
+        profile (Profile): Rasterio profile of `data`.
+        geometry (BaseGeometry): Geometry in the CRS of `data`.
+
+    Returns:
+        Tuple[ArrayLike, Profile]: Clipped masked data array and its profile.
+    """
+    transform = profile["transform"]
+    (minx, _, _, maxy), width, height = snap_bounds_to_grid(geometry.bounds, transform)
+    col_off, row_off = [int(round(v)) for v in ~transform * (minx, maxy)]
+    if col_off < 0 or row_off < 0 or col_off + width > data.shape[-1] or row_off + height > data.shape[-2]:
+        raise ValueError("Geometry is not within the bounds of the data.")
+    data_clip = data[:, row_off : row_off + height, col_off : col_off + width].copy()
+    profile_clip = profile.copy()
+    profile_clip.update(
+        transform=transform * Affine.translation(col_off, row_off),
+        width=width,
+        height=height,
+    )
+    return mask_outside_geometry(data_clip, geometry, profile_clip["transform"]), profile_clip
+
+
+class CropRegional:
+    """
+    Crops clusters of nearby features (e.g., fields) once each, and clips each feature from its cluster locally.
+
+    Rather than a `Crop` request (and GeoTIFF decode) for every field, fields are clustered by tile (see
+    `cluster_geometries()`), a single `Crop` is requested for the union of the fields in each cluster, and each field is
+    clipped from the cluster's masked array by local slicing. Cluster crops are snapped to the native grid of the item
+    (`snap_to_grid=True`), so each clip matches what `Crop(snap_to_grid=True).to_rasterio()` returns for that field.
+
+    Args:
+        query_params (QueryParamsCrop): The QueryParams to pass to the crop endpoint; `feature` and `snap_to_grid` are
+        overridden for each cluster.
+
+        features (Any): GeoJSON FeatureCollection, or an iterable of GeoJSON Features (in `coord_crs`, or EPSG:4326).
+        tile_size (float, optional): Size of the tiles used to cluster features, in meters. Defaults to 5000.
+        id_key (str, optional): Key of each feature's "properties" to use as the feature ID. Defaults to the feature's
+        "id" (or its position in `features`).
+
+        clear_cache (bool, optional): Whether to clear the cache. Defaults to False.
+        titiler_endpoint (str): The titiler endpoint. Defaults to `https://pixels.sentera.com`.
+        mask_enum (List[Enum], optional): Classes to consider for pixel-based masking (see `Crop`). Defaults to None.
+        mask_asset (str, optional): Asset containing the classes for pixel-based masking. Defaults to None.
+        whitelist (bool, optional): Whether `mask_enum` classes are valid (True) or invalid (False). Defaults to True.
+    """
+
+    def __init__(
+        self,
+        query_params: QueryParamsCrop,
+        features: Any,
+        tile_size: float = 5000,
+        id_key: str = None,
+        clear_cache: bool = False,
+        titiler_endpoint: str = TITILER_ENDPOINT,
+        mask_enum: List[Enum] = None,
+        mask_asset: str = None,
+        whitelist: bool = True,
+    ):
+        self.query_params = query_params
+        self.features = _features_from_collection(features)
+        self.tile_size = tile_size
+        self.id_key = id_key
+        self.clear_cache = clear_cache
+        self.titiler_endpoint = titiler_endpoint
+        self.mask_enum = mask_enum
+        self.mask_asset = mask_asset
+        self.whitelist = whitelist
+
+        # Normalized like `Crop` (see `feature_to_crs()`), so each feature is clipped exactly as `Crop` would crop it
+        self.geometries = [geojson_to_shapely(validate_geojson(feature)) for feature in self.features]
+        self.clusters = cluster_geometries(self.geometries, tile_size=tile_size, crs=query_params.coord_crs)
+        self._crops = {}
+        logging.debug("Clustered %s features into %s crops.", len(self.features), len(self.clusters))
+
+    @cached_property
+    def feature_ids(self) -> List[Hashable]:
+        """Feature IDs, in the same order as `features`."""
+        if self.id_key is not None:
+            return [feature["properties"][self.id_key] for feature in self.features]
+        return [feature.get("id", i) for i, feature in enumerate(self.features)]
+
+    def crop(self, cluster: int) -> Crop:
+        """Returns the `Crop` of a cluster (the union of its features, snapped to the native grid)."""
+        if cluster not in self._crops:
+            geometry = unary_union([self.geometries[i] for i in self.clusters[cluster]])
+            feature = {"type": "Feature", "properties": {}, "geometry": shapely_to_geojson_geometry(geometry)}
+            self._crops[cluster] = Crop(
+                query_params=replace(self.query_params, feature=feature, snap_to_grid=True),
+                clear_cache=self.clear_cache,
+                titiler_endpoint=self.titiler_endpoint,
+                mask_enum=self.mask_enum,
+                mask_asset=self.mask_asset,
+                whitelist=self.whitelist,
+            )
+        return self._crops[cluster]
+
+    def to_rasterio(
+        self, split_bands: bool = False, **kwargs
+    ) -> Dict[Hashable, Tuple[Union[ArrayLike, Dict[str, ArrayLike]], Profile, Dict]]:
+        """
+        Converts each cluster's crop to rasterio objects, then clips each feature locally.
+
+        Args:
+            split_bands (bool, optional): Whether to return each masked data array as a dictionary of single-band array
+            views keyed by band name (see `Crop.to_rasterio()`). Defaults to False.
+
+            kwargs: Keyword arguments passed to `Crop.to_rasterio()` (e.g., `dtype` and `band_names`).
+
+        Returns:
+            Dict[Hashable, Tuple[Union[ArrayLike, Dict[str, ArrayLike]], Profile, Dict]]: Masked data array, profile, and
+            tags of each feature, keyed by feature ID.
+        """
+        if split_bands is True and kwargs.get("band_names") is None and self.query_params.expression is not None:
+            kwargs["band_names"] = [expr for expr in self.query_params.expression.split(";") if expr]
+        rasters = {}
+        for cluster, indexes in enumerate(self.clusters):
+            crop = self.crop(cluster)
+            data, profile, tags = crop.to_rasterio(**kwargs)
+            crs = crop.grid[0]
+            for i in indexes:
+                geometry = feature_to_crs(self.features[i], dst_crs=crs, src_crs=self.query_params.coord_crs)
+                data_clip, profile_clip = clip_to_geometry(data, profile, geometry)
+                data_clip = split_crop_bands(data_clip, kwargs.get("band_names")) if split_bands is True else data_clip
+                rasters[self.feature_ids[i]] = data_clip, profile_clip, tags
+        return rasters
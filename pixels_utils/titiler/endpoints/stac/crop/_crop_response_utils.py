@@ -1,14 +1,19 @@
 from io import BytesIO
-from typing import Dict, Iterable, Tuple, Union
+from typing import Dict, Iterable, List, Tuple, Union
 
 import numpy.ma as ma
-from numpy import expand_dims as np_expand_dims
+from numpy import asarray as np_asarray
+from numpy import broadcast_to as np_broadcast_to
+from numpy import clip as np_clip
+from numpy import empty as np_empty
+from numpy import float64
+from numpy import floating as np_floating
+from numpy import issubdtype as np_issubdtype
 from numpy import load as np_load
-from numpy import logical_not as np_logical_not
 from numpy import min_scalar_type as np_min_scalar_type
 from numpy import ndarray as np_ndarray
-from numpy import repeat as np_repeat
-from numpy import zeros_like
+from numpy import result_type as np_result_type
+from numpy import subtract as np_subtract
 from numpy.typing import ArrayLike, DTypeLike
 from rasterio import Env
 from rasterio.errors import RasterioIOError
@@ -43,12 +48,14 @@ def _crop_set_mask(data: ArrayLike, profile: Profile, nodata: Union[float, int]
         raise ValueError(f"Array must be 3-dimensional (passed array has {data.ndim} dimensions).")
     nodata = 0 if nodata is None else nodata
 
-    # By default titiler will return a concatenated data,mask array.
-    data_no_alpha, mask = data[:-1, :, :], np_expand_dims(data[-1, :, :], axis=0)
-    array_mask = ma.masked_array(data_no_alpha, mask=np_logical_not(np_repeat(mask, data_no_alpha.shape[0], axis=0)))
+    # By default titiler will return a concatenated data,mask array. The data bands are kept as a view (no copy); the
+    # 2-D mask is built once from the alpha band and broadcast to all bands (masked arrays need a writeable full mask).
+    data_no_alpha, mask = data[:-1, :, :], data[-1, :, :] == 0
+    array_mask = ma.masked_array(data_no_alpha, mask=np_broadcast_to(mask, data_no_alpha.shape).copy(), copy=False)
 
     if not ma.maximum_fill_value(array_mask) <= nodata <= ma.minimum_fill_value(array_mask):
-        array_mask = array_mask.astype(np_min_scalar_type(nodata))  # set array dtype so nodata is valid
+        # set array dtype so nodata is valid
+        array_mask = array_mask.astype(np_result_type(array_mask.dtype, np_min_scalar_type(nodata)), copy=False)
     ma.set_fill_value(array_mask, nodata)
     profile.update(nodata=nodata)
 
@@ -76,18 +83,59 @@ def _response_to_rasterio(r: STAC_crop) -> DatasetReader:
     return ds
 
 
-def parse_crop_response(r: STAC_crop, **kwargs) -> Tuple[ArrayLike, Profile, Dict]:
+def split_crop_bands(data: ArrayLike, band_names: List[str]) -> Dict[str, ArrayLike]:
+    """
+    Splits a multi-band (masked) data array into a dictionary of single-band arrays keyed by band name.
+
+    Note:
+        Each value is a 3-dimensional view (i.e., `data[i : i + 1, :, :]`) of `data`, so no pixel data (nor mask) is
+        copied. Modifying a value in place will modify `data` as well.
+
+    Args:
+        data (ArrayLike): Data array. Must be 3-dimensional, with the 1st dimension being bands.
+        band_names (List[str]): Band names (e.g., `Expression.short_name` of each expression passed to `Crop`). Must
+        be the same length as the 1st dimension of `data`.
+
+    Raises:
+        ValueError: If `band_names` is not the same length as the number of bands in `data`.
+
+    Returns:
+        Dict[str, ArrayLike]: Single-band (3-dimensional) array views, keyed by band name.
+    """
+    if data.ndim != 3:
+        raise ValueError(f"Array must be 3-dimensional (passed array has {data.ndim} dimensions).")
+    band_names = [band_names] if isinstance(band_names, str) else band_names
+    if band_names is None or len(band_names) != data.shape[0]:
+        raise ValueError(
+            f"<band_names> must be the same length as the number of bands in data ({data.shape[0]}); got {band_names}."
+        )
+    return {band_name: data[i : i + 1, :, :] for i, band_name in enumerate(band_names)}
+
+
+def parse_crop_response(
+    r: STAC_crop, split_bands: bool = False, **kwargs
+) -> Tuple[Union[ArrayLike, Dict[str, ArrayLike]], Profile, Dict]:
     """
     Parses STAC_crop response into a masked data array, rasterio profile, and rasterio tags.
 
+    Note:
+        Multiple expressions can be requested in a single `Crop` by passing them semicolon (;) delimited (e.g.,
+        "(nir-red)/(nir+red);(nir-rededge1)/(nir+rededge1)"); titiler returns one band per expression. With
+        `split_bands=True`, the decoded array is handed back as a dictionary of per-expression array views (see
+        `split_crop_bands()`), so the footprint only has to be downloaded and decoded once.
+
     Args:
         r (STAC_crop): STAC crop response to parse.
+        split_bands (bool, optional): Whether to return the masked data array as a dictionary of single-band array
+        views keyed by `band_names` (True) or as a single 3-dimensional masked data array (False). If True,
+        `band_names` must be passed as a keyword argument. Defaults to False.
+
         kwargs: Additional keyword arguments used to control the output masked data array and rasterio profile. Specific
         keywords used by this function include `dtype`, `band_names`, and `nodata`. Other keywords are passed to the
         output `tags` dictionary.
 
     Returns:
-        Tuple[ArrayLike, Profile, Dict]: Parsed response objects.
+        Tuple[Union[ArrayLike, Dict[str, ArrayLike]], Profile, Dict]: Parsed response objects.
     """
     read_kwargs = {}
     read_kwargs["out_dtype"] = kwargs.get("dtype") if "dtype" in kwargs.keys() else None
@@ -108,41 +156,70 @@ def parse_crop_response(r: STAC_crop, **kwargs) -> Tuple[ArrayLike, Profile, Dic
     data_mask, profile_mask = _crop_set_mask(data, profile, nodata=nodata)
     tags.update(**profile_mask)
     tags.update(**kwargs)
+    if split_bands is True:
+        return split_crop_bands(data_mask, kwargs.get("band_names")), profile_mask, tags
     return data_mask, profile_mask, tags
 
 
-def rescale_stac_crop(data: ArrayLike, rescale: Iterable[str], dtype: DTypeLike) -> ArrayLike:
+def _parse_rescale(rescale: Iterable[str], n_bands: int) -> Tuple[np_ndarray, np_ndarray]:
+    """Parses `rescale` (e.g., ["0,255", "0,255"]) once into arrays of the output min and max of each band."""
+    if len(rescale) != n_bands:
+        raise RuntimeError(f"<rescale> argument must be the same length as data ({n_bands}).")
+    limits = []
+    for band_limits in rescale:
+        band_limits = band_limits.split(",") if isinstance(band_limits, str) else band_limits
+        if len(band_limits) != 2:
+            raise ValueError(f"Rescale argument {band_limits} is not formatted properly (check docstring).")
+        limits.append([float(limit) for limit in band_limits])
+    limits = np_asarray(limits, dtype=float64)
+    return limits[:, 0], limits[:, 1]
+
+
+def rescale_stac_crop(data: ArrayLike, rescale: Iterable[str], dtype: DTypeLike, chunk_size: int = None) -> ArrayLike:
     """
     Rescales STAC crop data.
 
+    The range of each band is computed over valid (unmasked) pixels only, in a single reduction across all bands; each
+    band is then linearly stretched from its range to the output range in `rescale`, writing into the output array in
+    place. Masked pixels are clipped to the output range.
+
     Args:
         data (ArrayLike): Data to be scaled (should be 3-dimensional).
         rescale (Iterable[str]): How to scale the data. Should be formatted as an iterable of strings, where the number
         of strings is equal to the length of the first dimension of `data`. Each string should be a comma-separated
-        integer, expressed as a string (e.g., ["0,255", "0,255", "0,255"]). This example presumes `data` has 3 bands,
+        min and max value of the output (e.g., ["0,255", "0,255", "0,255"]). This example presumes `data` has 3 bands,
         and will rescale each of its 3 bands between 0 and 255.
         dtype (DTypeLike): The dtype to format the scaled data.
+        chunk_size (int, optional): Number of rows to rescale at a time, which bounds the size of temporary arrays for
+        big rasters. Defaults to None (all rows at once).
 
     Raises:
-        RuntimeError: If `rescale` is not formatted properly.
+        RuntimeError: If `rescale` is not the same length as the number of bands in `data`.
+        ValueError: If `rescale` is not formatted properly.
 
     Returns:
-        ArrayLike: The scaled data array.
+        ArrayLike: The scaled (masked) data array.
     """
-    data_scaled = zeros_like(data, dtype=dtype)
-    if len(rescale) == data.shape[0]:
-        for i, limits in enumerate(rescale):
-            if len(limits.split(",")) != 2:
-                raise ValueError(f"Rescale argument {limits} is not formatted properly (check docstring).")
-            # l = int(limits.split(",")[0])
-            # u = int(limits.split(",")[1])
-            # scale_factor = 10000 / (u - l)
-            # data_scaled[i, :, :] = (data[i, :, :].data - l) / scale_factor
-            lower = data[i, :, :].data.min()
-            upper = data[i, :, :].data.max()
-            max_value = int(limits.split(",")[1])
-            # min_value = int(limits.split(",")[0])
-            data_scaled[i, :, :] = (data[i, :, :].data - lower) / (upper - lower) * max_value
-    else:
-        raise RuntimeError("<rescale> argument must be the same length as data ({data.shape[0]}).")
-    return data_scaled
+    out_min, out_max = _parse_rescale(rescale, data.shape[0])
+    data = ma.asarray(data)
+    lower = data.min(axis=(1, 2)).filled(0).astype(float64)
+    upper = data.max(axis=(1, 2)).filled(0).astype(float64)
+    span = upper - lower
+    span[span == 0] = 1  # constant (or fully masked) bands are scaled to the output min
+    lower, span, out_range = lower[:, None, None], span[:, None, None], (out_max - out_min)[:, None, None]
+    out_min, out_max = out_min[:, None, None], out_max[:, None, None]
+
+    data_scaled = np_empty(data.shape, dtype=dtype)
+    in_place = np_issubdtype(data_scaled.dtype, np_floating)
+    chunk_size = data.shape[1] if chunk_size is None else max(int(chunk_size), 1)
+    for row in range(0, data.shape[1], chunk_size):
+        rows = slice(row, row + chunk_size)
+        chunk = data_scaled[:, rows, :] if in_place else np_empty(data_scaled[:, rows, :].shape, dtype=float64)
+        np_subtract(data.data[:, rows, :], lower, out=chunk, casting="unsafe")
+        chunk /= span
+        chunk *= out_range
+        chunk += out_min
+        np_clip(chunk, out_min, out_max, out=chunk)
+        if not in_place:
+            data_scaled[:, rows, :] = chunk
+    return ma.masked_array(data_scaled, mask=ma.getmaskarray(data).copy(), copy=False)
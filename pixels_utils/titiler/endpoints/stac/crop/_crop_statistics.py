@@ -0,0 +1,272 @@
+from typing import Dict, Iterable, List, Tuple, Union
+from warnings import catch_warnings, simplefilter
+
+import numpy.ma as ma
+from numpy import asarray as np_asarray
+from numpy import bincount as np_bincount
+from numpy import diff as np_diff
+from numpy import dtype as np_dtype
+from numpy import empty as np_empty
+from numpy import flatnonzero as np_flatnonzero
+from numpy import float64, floating
+from numpy import isnan as np_isnan
+from numpy import issubdtype
+from numpy import lexsort as np_lexsort
+from numpy import linspace as np_linspace
+from numpy import nan
+from numpy import nanpercentile as np_nanpercentile
+from numpy import ndarray as np_ndarray
+from numpy import nonzero as np_nonzero
+from numpy import r_ as np_r_
+from numpy import searchsorted as np_searchsorted
+from numpy import unique as np_unique
+from numpy import zeros_like as np_zeros_like
+from numpy.typing import ArrayLike
+
+DEFAULT_PERCENTILES = (2, 98)
+DEFAULT_HISTOGRAM_BINS = 10
+
+
+def _parse_histogram_bins(histogram_bins: Union[str, int, Iterable[float]]) -> Union[int, np_ndarray]:
+    """Parses `histogram_bins` the way titiler does (i.e., "10" is a number of bins; "0,0.5,1" are bin edges)."""
+    if histogram_bins is None:
+        return DEFAULT_HISTOGRAM_BINS
+    if isinstance(histogram_bins, str):
+        histogram_bins = [float(b) for b in histogram_bins.split(",")]
+        histogram_bins = int(histogram_bins[0]) if len(histogram_bins) == 1 else histogram_bins
+    return histogram_bins if isinstance(histogram_bins, int) else np_asarray(histogram_bins, dtype=float64)
+
+
+def _parse_histogram_range(histogram_range: Union[str, Iterable[float]]) -> Tuple[float, float]:
+    """Parses `histogram_range` the way titiler does (e.g., "0,1")."""
+    if histogram_range is None:
+        return None
+    if isinstance(histogram_range, str):
+        histogram_range = [float(r) for r in histogram_range.split(",")]
+    if len(histogram_range) != 2:
+        raise ValueError(f"Histogram range {histogram_range} is not formatted properly (must be a min and max value).")
+    return float(histogram_range[0]), float(histogram_range[1])
+
+
+def _to_json(value: float) -> float:
+    """Returns a JSON-compatible float (undefined values, e.g. for a band without valid pixels, are returned as None)."""
+    value = float(value)
+    return None if np_isnan(value) else value
+
+
+def _histograms(
+    values: np_ndarray,
+    bands: np_ndarray,
+    n_bands: int,
+    band_min: np_ndarray,
+    band_max: np_ndarray,
+    histogram_bins: Union[int, np_ndarray],
+    histogram_range: Tuple[float, float],
+    dtype: np_dtype = float64,
+) -> Tuple[np_ndarray, np_ndarray]:
+    """
+    Computes `numpy.histogram()` for every band at once.
+
+    Args:
+        values (np_ndarray): Valid pixel values (flattened across all bands).
+        bands (np_ndarray): Band index of each value in `values`.
+        n_bands (int): Number of bands.
+        band_min (np_ndarray): Minimum valid value of each band (used if `histogram_range` is None).
+        band_max (np_ndarray): Maximum valid value of each band (used if `histogram_range` is None).
+        histogram_bins (Union[int, np_ndarray]): Number of equal-width bins, or monotonically increasing bin edges.
+        histogram_range (Tuple[float, float]): Lower and upper range of the bins (ignored if bin edges are passed).
+        dtype (np_dtype, optional): Data type of the original data; as in `numpy.histogram()`, equal-width bins are
+        computed in this dtype (float64 for integer data). Defaults to float64.
+
+    Returns:
+        Tuple[np_ndarray, np_ndarray]: Histogram counts (bands x bins) and bin edges (bands x bins + 1).
+    """
+    if isinstance(histogram_bins, int):
+        n_bins = histogram_bins
+        bin_dtype = np_dtype(dtype) if issubdtype(dtype, floating) else np_dtype(float64)
+        values = values.astype(bin_dtype, copy=False)
+        # The range and edges of each band are computed from the same scalars (and so in the same dtypes) as
+        # numpy.histogram(), then the bin of each value is computed and corrected against the edges with the same
+        # arithmetic, so values on (or rounded across) an edge land in the same bin as in numpy
+        lower, upper, width = (np_empty(n_bands, dtype=bin_dtype) for _ in range(3))
+        edges = np_empty((n_bands, n_bins + 1), dtype=bin_dtype)
+        for i in range(n_bands):
+            if histogram_range is not None:
+                first, last = histogram_range
+            elif np_isnan(band_min[i]):  # no valid values
+                first, last = 0, 1
+            else:
+                first, last = bin_dtype.type(band_min[i]), bin_dtype.type(band_max[i])
+            if first == last:  # numpy.histogram() widens the range by 0.5 on each side if all values are identical
+                first, last = first - 0.5, last + 0.5
+            edges[i] = np_linspace(first, last, n_bins + 1, endpoint=True, dtype=bin_dtype)
+            lower[i], upper[i], width[i] = first, last, last - first
+        keep = (values >= lower[bands]) & (values <= upper[bands])
+        values, bands = values[keep], bands[keep]
+        idx = (((values - lower[bands]) / width[bands]) * n_bins).astype(int)
+        idx[idx == n_bins] -= 1  # last bin is closed on the right
+        idx[values < edges[bands, idx]] -= 1
+        idx[(values >= edges[bands, idx + 1]) & (idx != n_bins - 1)] += 1
+    else:
+        n_bins = histogram_bins.size - 1
+        edges = histogram_bins[None, :].repeat(n_bands, axis=0)
+        keep = (values >= histogram_bins[0]) & (values <= histogram_bins[-1])
+        values, bands = values[keep], bands[keep]
+        idx = np_searchsorted(histogram_bins, values, side="right") - 1
+        idx[values == histogram_bins[-1]] = n_bins - 1  # last bin is closed on the right
+    counts = np_bincount(bands * n_bins + idx, minlength=n_bands * n_bins).reshape(n_bands, n_bins)
+    return counts, edges
+
+
+def _categorical_histograms(
+    values: np_ndarray, bands: np_ndarray, n_bands: int, c: List[Union[float, int]] = None
+) -> List[List[List]]:
+    """
+    Counts the pixels of each category in every band at once (titiler's categorical histogram, i.e. [counts, classes]).
+
+    Args:
+        values (np_ndarray): Valid pixel values (flattened across all bands).
+        bands (np_ndarray): Band index of each value in `values`.
+        n_bands (int): Number of bands.
+        c (List[Union[float, int]], optional): Categories to count (in order). Defaults to the unique values of each
+        band.
+
+    Returns:
+        List[List[List]]: Counts and categories of each band.
+    """
+    categories = np_unique(values) if c is None else np_unique(np_asarray(c, dtype=float64))
+    pos = np_searchsorted(categories, values).clip(max=max(categories.size - 1, 0))
+    match = categories[pos] == values if categories.size > 0 else np_zeros_like(values, dtype=bool)
+    counts = np_bincount(bands[match] * categories.size + pos[match], minlength=n_bands * categories.size)
+    counts = counts.reshape(n_bands, categories.size)
+    if c is not None:
+        order = np_searchsorted(categories, np_asarray(c, dtype=float64))
+        return [[counts[i, order].tolist(), list(c)] for i in range(n_bands)]
+    return [[counts[i, counts[i] > 0].tolist(), categories[counts[i] > 0].tolist()] for i in range(n_bands)]
+
+
+def _value_counts(values: np_ndarray, bands: np_ndarray, n_bands: int) -> Tuple[List, List, np_ndarray]:
+    """
+    Finds the majority value, minority value, and number of unique values of every band at once.
+
+    Ties are broken by the smallest value, matching `numpy.unique()` as used by titiler.
+
+    Returns:
+        Tuple[List, List, np_ndarray]: Majority value, minority value, and unique count of each band.
+    """
+    majority, minority = [nan] * n_bands, [nan] * n_bands
+    if values.size == 0:
+        return majority, minority, np_asarray([0] * n_bands)
+    order = np_lexsort((values, bands))
+    values_sorted, bands_sorted = values[order], bands[order]
+    starts = np_r_[0, np_flatnonzero((np_diff(values_sorted) != 0) | (np_diff(bands_sorted) != 0)) + 1]
+    run_values, run_bands = values_sorted[starts], bands_sorted[starts]
+    run_counts = np_diff(np_r_[starts, values_sorted.size])
+    unique = np_bincount(run_bands, minlength=n_bands)
+    for counts, out in ((-run_counts, majority), (run_counts, minority)):
+        ranked = np_lexsort((run_values, counts, run_bands))
+        first = ranked[np_r_[0, np_flatnonzero(np_diff(run_bands[ranked]) != 0) + 1]]
+        for band, value in zip(run_bands[first], run_values[first]):
+            out[band] = value
+    return majority, minority, unique
+
+
+def crop_statistics(
+    data: ArrayLike,
+    band_names: List[str] = None,
+    categorical: bool = False,
+    c: List[Union[float, int]] = None,
+    p: List[int] = None,
+    histogram_bins: Union[str, int, Iterable[float]] = None,
+    histogram_range: Union[str, Iterable[float]] = None,
+) -> Dict[str, Dict]:
+    """
+    Computes titiler-equivalent statistics locally from a masked data array (e.g., from `parse_crop_response()`).
+
+    Returns the same fields as the titiler STAC statistics endpoint (min, max, mean, count, sum, std, median, majority,
+    minority, unique, histogram, valid_percent, masked_pixels, valid_pixels, and percentile_<p>), so pipelines that
+    already fetch a `Crop` can skip the `Statistics` request. Reductions are computed across all bands at once, and the
+    output only contains built-in types so it can be passed directly to `json.dumps()`.
+
+    Args:
+        data (ArrayLike): Masked data array. Must be 3-dimensional (bands, rows, columns).
+        band_names (List[str], optional): Band names; these will be the keys of the returned dict. Defaults to "b1",
+        "b2", etc.
+
+        categorical (bool, optional): Whether to return the histogram as counts of each category (see `c`) rather
+        than counts of equal-width bins. Defaults to False.
+
+        c (List[Union[float, int]], optional): Categories to count if `categorical=True`. Defaults to all unique values.
+        p (List[int], optional): Percentiles to compute. Defaults to [2, 98].
+        histogram_bins (Union[str, int, Iterable[float]], optional): Number of bins (e.g., "10") or bin edges (e.g.,
+        "0,0.5,1"), following titiler. Defaults to 10.
+
+        histogram_range (Union[str, Iterable[float]], optional): Lower and upper range of the bins (e.g., "0,1").
+        Defaults to the min and max of each band.
+
+    Returns:
+        Dict[str, Dict]: Statistics for each band, keyed by band name.
+    """
+    if data.ndim != 3:
+        raise ValueError(f"Array must be 3-dimensional (passed array has {data.ndim} dimensions).")
+    n_bands = data.shape[0]
+    band_names = [f"b{i + 1}" for i in range(n_bands)] if band_names is None else band_names
+    band_names = [band_names] if isinstance(band_names, str) else band_names
+    if len(band_names) != n_bands:
+        raise ValueError(f"<band_names> must be the same length as the number of bands in data ({n_bands}).")
+    percentiles = list(DEFAULT_PERCENTILES if p is None else p)
+
+    data = ma.asarray(data).reshape(n_bands, -1)
+    mask = ma.getmaskarray(data)
+    values_2d = data.data.astype(float64, copy=False)
+    bands, pixels = np_nonzero(~mask)
+    values = values_2d[bands, pixels]
+
+    # Reductions across all bands at once
+    valid_pixels = np_bincount(bands, minlength=n_bands)
+    masked_pixels = data.shape[1] - valid_pixels
+    data_f = ma.masked_array(values_2d, mask=mask)
+    band_min, band_max = data_f.min(axis=1).filled(nan), data_f.max(axis=1).filled(nan)
+    band_sum = data_f.sum(axis=1).filled(nan)
+    band_mean, band_std = data_f.mean(axis=1).filled(nan), data_f.std(axis=1).filled(nan)
+    with catch_warnings():
+        simplefilter("ignore", category=RuntimeWarning)  # bands without valid pixels ("All-NaN slice encountered")
+        quantiles = np_nanpercentile(data_f.filled(nan), percentiles + [50], axis=1)
+
+    majority, minority, unique = _value_counts(values, bands, n_bands)
+
+    if categorical is True:
+        histograms = _categorical_histograms(values, bands, n_bands, c)
+    else:
+        h_counts, h_edges = _histograms(
+            values,
+            bands,
+            n_bands,
+            band_min,
+            band_max,
+            _parse_histogram_bins(histogram_bins),
+            _parse_histogram_range(histogram_range),
+            dtype=data.dtype,
+        )
+        histograms = [[h_counts[i].tolist(), h_edges[i].tolist()] for i in range(n_bands)]
+
+    statistics = {}
+    for i, band_name in enumerate(band_names):
+        statistics[band_name] = {
+            "min": _to_json(band_min[i]),
+            "max": _to_json(band_max[i]),
+            "mean": _to_json(band_mean[i]),
+            "count": float(valid_pixels[i]),
+            "sum": _to_json(band_sum[i]),
+            "std": _to_json(band_std[i]),
+            "median": _to_json(quantiles[-1][i]),
+            "majority": _to_json(majority[i]),
+            "minority": _to_json(minority[i]),
+            "unique": float(unique[i]),
+            "histogram": histograms[i],
+            "valid_percent": round(float(valid_pixels[i]) / data.shape[1] * 100, 2),
+            "masked_pixels": float(masked_pixels[i]),
+            "valid_pixels": float(valid_pixels[i]),
+            **{f"percentile_{int(pct)}": _to_json(quantiles[j][i]) for j, pct in enumerate(percentiles)},
+        }
+    return statistics
@@ -0,0 +1,198 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from enum import Enum
+from functools import cached_property
+from math import floor, sqrt
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy.ma as ma
+from geo_utils.vector import shapely_to_geojson_geometry
+from numpy import ones as np_ones
+from numpy import zeros as np_zeros
+from numpy.typing import ArrayLike
+from rasterio.profiles import Profile
+from rasterio.transform import Affine, from_origin
+from shapely.geometry import box
+
+from pixels_utils.titiler import TITILER_ENDPOINT
+from pixels_utils.titiler.endpoints.stac.crop._crop import Crop, QueryParamsCrop, snap_feature_to_grid
+from pixels_utils.titiler.endpoints.stac.crop._crop_grid import mask_outside_geometry
+from pixels_utils.titiler.endpoints.stac.crop._crop_response_utils import split_crop_bands
+
+DEFAULT_MAX_PIXELS = 1024 * 1024  # pixels (per band) of each sub-crop
+
+
+def split_bounds_to_tiles(
+    bounds: Tuple[float, float, float, float], transform: Affine, tile_size: int
+) -> List[Tuple[float, float, float, float]]:
+    """
+    Splits (grid-snapped) bounds into tiles of a global grid.
+
+    Tile edges are every `tile_size` pixels from the origin of `transform` (rather than from the corner of `bounds`),
+    so tiles of overlapping features (or of the same feature across scenes) line up with each other.
+
+    Args:
+        bounds (Tuple[float, float, float, float]): Bounds (minx, miny, maxx, maxy) snapped to the grid of `transform`
+        (see `snap_bounds_to_grid()`).
+
+        transform (Affine): Affine transform of the grid (e.g., the native grid of the STAC item).
+        tile_size (int): Width and height of each tile, in pixels.
+
+    Returns:
+        List[Tuple[float, float, float, float]]: Bounds of each tile (clipped to `bounds`), in row-major order.
+    """
+    x_res, y_res = abs(transform.a), abs(transform.e)
+    x0, y0 = transform.c, transform.f
+    minx, miny, maxx, maxy = bounds
+    col_min, col_max = round((minx - x0) / x_res), round((maxx - x0) / x_res)
+    row_min, row_max = round((y0 - maxy) / y_res), round((y0 - miny) / y_res)
+    tiles = []
+    for row in range(floor(row_min / tile_size) * tile_size, row_max, tile_size):
+        row_start, row_end = max(row, row_min), min(row + tile_size, row_max)
+        for col in range(floor(col_min / tile_size) * tile_size, col_max, tile_size):
+            col_start, col_end = max(col, col_min), min(col + tile_size, col_max)
+            tiles.append((x0 + col_start * x_res, y0 - row_end * y_res, x0 + col_end * x_res, y0 - row_start * y_res))
+    return tiles
+
+
+def mosaic_crops(
+    rasters: Iterable[Tuple[ArrayLike, Profile]], transform: Affine, width: int, height: int
+) -> Tuple[ArrayLike, Profile]:
+    """
+    Mosaics crops on the same grid (e.g., tiles from `split_bounds_to_tiles()`) into a single masked array.
+
+    Args:
+        rasters (Iterable[Tuple[ArrayLike, Profile]]): Masked data array (bands, rows, columns) and profile of each crop;
+        crops must have the same bands and pixel size, and be aligned to `transform`.
+
+        transform (Affine): Affine transform of the mosaic.
+        width (int): Width of the mosaic, in pixels.
+        height (int): Height of the mosaic, in pixels.
+
+    Returns:
+        Tuple[ArrayLike, Profile]: Masked data array and profile of the mosaic; pixels not valid in any crop are masked
+        (where valid pixels of crops overlap, the last crop wins).
+    """
+    data, profile = None, None
+    for data_crop, profile_crop in rasters:
+        if data is None:
+            shape = (data_crop.shape[0], height, width)
+            data = ma.masked_array(
+                np_zeros(shape, dtype=data_crop.dtype), mask=np_ones(shape, dtype=bool), fill_value=data_crop.fill_value
+            )
+            profile = profile_crop.copy()
+            profile.update(transform=transform, width=width, height=height)
+        crop_transform = profile_crop["transform"]
+        col_off, row_off = [int(round(v)) for v in ~transform * (crop_transform.c, crop_transform.f)]
+        rows, cols = slice(row_off, row_off + data_crop.shape[1]), slice(col_off, col_off + data_crop.shape[2])
+        # Only valid pixels are pasted, so overlapping crops do not mask pixels already filled by another crop
+        valid = ~ma.getmaskarray(data_crop)
+        data.data[:, rows, cols][valid] = ma.getdata(data_crop)[valid]
+        data.mask[:, rows, cols] &= ~valid
+    if data is None:
+        raise ValueError("At least one crop must be passed to mosaic.")
+    return data, profile
+
+
+class CropTiled:
+    """
+    Crops a large feature as a grid of smaller sub-crops that are fetched concurrently and mosaicked locally.
+
+    The feature is snapped to the native grid of the STAC item (as `Crop` with `snap_to_grid=True`), its bounds are
+    split into tiles of at most `max_pixels` pixels (see `split_bounds_to_tiles()`), each tile is requested by its own
+    `Crop` (in a thread pool), and the tiles are mosaicked into one masked array, with pixels outside the feature
+    masked. The output matches a single `Crop(snap_to_grid=True)` of the feature, without hitting titiler size limits or
+    transferring one huge response.
+
+    Args:
+        query_params (QueryParamsCrop): The QueryParams to pass to the crop endpoint; `feature` is required, and
+        `height` and `width` are not allowed (they are set by the native grid).
+
+        max_pixels (int, optional): Maximum number of pixels (per band) of each sub-crop; the memory of each response is
+        roughly `max_pixels` x number of bands x bytes per pixel. Defaults to 1024 x 1024.
+
+        max_workers (int, optional): Maximum number of sub-crops to request concurrently. Defaults to 4.
+        clear_cache (bool, optional): Whether to clear the cache. Defaults to False.
+        titiler_endpoint (str): The titiler endpoint. Defaults to `https://pixels.sentera.com`.
+        mask_enum (List[Enum], optional): Classes to consider for pixel-based masking (see `Crop`). Defaults to None.
+        mask_asset (str, optional): Asset containing the classes for pixel-based masking. Defaults to None.
+        whitelist (bool, optional): Whether `mask_enum` classes are valid (True) or invalid (False). Defaults to True.
+    """
+
+    def __init__(
+        self,
+        query_params: QueryParamsCrop,
+        max_pixels: int = DEFAULT_MAX_PIXELS,
+        max_workers: int = 4,
+        clear_cache: bool = False,
+        titiler_endpoint: str = TITILER_ENDPOINT,
+        mask_enum: List[Enum] = None,
+        mask_asset: str = None,
+        whitelist: bool = True,
+    ):
+        if query_params.feature is None:
+            raise ValueError('"feature" must be passed to tile a crop.')
+        if query_params.height is not None or query_params.width is not None:
+            raise ValueError('"height" and "width" cannot be passed to tile a crop (they are set by the native grid).')
+        self.query_params = query_params
+        self.max_workers = max_workers
+        self.clear_cache = clear_cache
+        self.titiler_endpoint = titiler_endpoint
+        self.mask_enum = mask_enum
+        self.mask_asset = mask_asset
+        self.whitelist = whitelist
+
+        self.crs, transform, self.geometry, self.bounds, self.width, self.height = snap_feature_to_grid(query_params)
+        x_res, y_res = (abs(transform.a), abs(transform.e)) if query_params.gsd is None else (query_params.gsd,) * 2
+        self.transform = from_origin(self.bounds[0], self.bounds[3], x_res, y_res)
+        grid_transform = Affine(x_res, 0.0, transform.c, 0.0, -y_res, transform.f)
+        self.tiles = split_bounds_to_tiles(self.bounds, grid_transform, tile_size=max(int(sqrt(max_pixels)), 1))
+        logging.debug("Split %sx%s crop into %s tiles.", self.width, self.height, len(self.tiles))
+
+    def crop(self, bounds: Tuple[float, float, float, float]) -> Crop:
+        """Returns the `Crop` of a tile (requested in the native CRS, snapped to the native grid)."""
+        # Shrink the tile by a fraction of a pixel so that snapping it outward cannot add a row/column due to rounding
+        buffer = min(abs(self.transform.a), abs(self.transform.e)) / 4
+        minx, miny, maxx, maxy = bounds
+        geometry = box(minx + buffer, miny + buffer, maxx - buffer, maxy - buffer)
+        feature = {"type": "Feature", "properties": {}, "geometry": shapely_to_geojson_geometry(geometry)}
+        return Crop(
+            query_params=replace(self.query_params, feature=feature, coord_crs=self.crs, snap_to_grid=True),
+            clear_cache=self.clear_cache,
+            titiler_endpoint=self.titiler_endpoint,
+            mask_enum=self.mask_enum,
+            mask_asset=self.mask_asset,
+            whitelist=self.whitelist,
+        )
+
+    @cached_property
+    def crops(self) -> List[Crop]:
+        """`Crop` of each tile (requested concurrently)."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.crop, self.tiles))
+
+    def to_rasterio(
+        self, split_bands: bool = False, **kwargs
+    ) -> Tuple[Union[ArrayLike, Dict[str, ArrayLike]], Profile, Dict]:
+        """
+        Converts the sub-crops to rasterio objects and mosaics them (see `Crop.to_rasterio()`).
+
+        Args:
+            split_bands (bool, optional): Whether to return the masked data array as a dictionary of single-band array
+            views keyed by band name. Defaults to False.
+
+            kwargs: Keyword arguments passed to `Crop.to_rasterio()` (e.g., `dtype` and `band_names`).
+
+        Returns:
+            Tuple[Union[ArrayLike, Dict[str, ArrayLike]], Profile, Dict]: Output rasterio objects.
+        """
+        if split_bands is True and kwargs.get("band_names") is None and self.query_params.expression is not None:
+            kwargs["band_names"] = [expr for expr in self.query_params.expression.split(";") if expr]
+        rasters = [crop.to_rasterio(**kwargs) for crop in self.crops]
+        data, profile = mosaic_crops(
+            [(data, profile) for data, profile, _ in rasters], self.transform, self.width, self.height
+        )
+        data = mask_outside_geometry(data, self.geometry, self.transform)
+        data = split_crop_bands(data, kwargs.get("band_names")) if split_bands is True else data
+        return data, profile, rasters[0][2]
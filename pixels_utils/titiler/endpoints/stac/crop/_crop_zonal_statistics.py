@@ -0,0 +1,155 @@
+from typing import Any, Dict, Hashable, List, Tuple
+
+import numpy.ma as ma
+from numpy import bincount as np_bincount
+from numpy import ceil as np_ceil
+from numpy import errstate as np_errstate
+from numpy import float64
+from numpy import floor as np_floor
+from numpy import full as np_full
+from numpy import int32
+from numpy import lexsort as np_lexsort
+from numpy import nan
+from numpy import ndarray as np_ndarray
+from numpy import nonzero as np_nonzero
+from numpy import sqrt as np_sqrt
+from numpy.typing import ArrayLike
+from pyproj.crs import CRS
+from rasterio.features import rasterize
+from rasterio.profiles import Profile
+
+from pixels_utils.titiler.endpoints.stac.crop._crop_statistics import DEFAULT_PERCENTILES, _to_json
+
+
+def _zones(zones: Any, crs: Any = None, id_key: str = None) -> Tuple[List[Hashable], List[Any]]:
+    """Returns the IDs and geometries of `zones` (reprojected to `crs` if `zones` is a GeoSeries/GeoDataFrame)."""
+    if hasattr(zones, "to_crs") and zones.crs is not None and crs is not None:
+        if CRS.from_user_input(zones.crs) != CRS.from_user_input(crs):
+            zones = zones.to_crs(crs)
+    if hasattr(zones, "geometry") and hasattr(zones, "columns"):  # GeoDataFrame
+        ids = list(zones[id_key]) if id_key is not None else list(zones.index)
+        return ids, list(zones.geometry)
+    if hasattr(zones, "items"):  # GeoSeries or dict
+        ids, geometries = zip(*zones.items()) if len(zones) > 0 else ((), ())
+        return list(ids), list(geometries)
+    geometries = list(zones)
+    return list(range(len(geometries))), geometries
+
+
+def _grouped_percentiles(values_sorted: np_ndarray, starts: np_ndarray, counts: np_ndarray, q: float) -> np_ndarray:
+    """Computes a percentile of each group of sorted values (linear interpolation, as `numpy.percentile()`)."""
+    pos = (counts - 1) * q / 100
+    lower, upper = np_floor(pos).astype(int), np_ceil(pos).astype(int)
+    v_lower, v_upper = values_sorted[starts + lower], values_sorted[starts + upper]
+    return v_lower + (v_upper - v_lower) * (pos - lower)
+
+
+def zonal_statistics(
+    data: ArrayLike,
+    profile: Profile,
+    zones: Any,
+    band_names: List[str] = None,
+    id_key: str = None,
+    p: List[int] = None,
+    all_touched: bool = False,
+) -> Dict[Hashable, Dict[str, Dict]]:
+    """
+    Computes statistics for many zones (e.g., fields) from a single crop raster that covers all of them.
+
+    Rather than making one `Statistics` request per zone, crop the region once (e.g., with `Crop` using the union or
+    bounding box of the zones as the feature), then pass the masked array and profile here. Zone IDs are rasterized
+    once, and count, min, max, mean, sum, std, median, and percentiles are computed for all zones and bands at once with
+    grouped (`numpy.bincount()` and sort-based) reductions.
+
+    Note:
+        If zones overlap, each pixel is assigned to the last zone that covers it.
+
+    Args:
+        data (ArrayLike): Masked data array. Must be 3-dimensional (bands, rows, columns).
+        profile (Profile): Rasterio profile of `data` (e.g., from `Crop.to_rasterio()`); "transform" is required and
+        "crs" is used to reproject `zones` if needed.
+
+        zones (Any): Zone geometries; a GeoDataFrame, GeoSeries, dict of {zone_id: geometry}, or iterable of
+        geometries (keyed by position).
+
+        band_names (List[str], optional): Band names; these will be the keys of each zone's dict. Defaults to "b1",
+        "b2", etc.
+
+        id_key (str, optional): Column of a GeoDataFrame to use as zone IDs. Defaults to the index.
+        p (List[int], optional): Percentiles to compute. Defaults to [2, 98].
+        all_touched (bool, optional): Whether to include all pixels touched by a zone (True), or only pixels whose
+        center is within the zone (False). Defaults to False.
+
+    Returns:
+        Dict[Hashable, Dict[str, Dict]]: Statistics for each band of each zone, keyed by zone ID (the same layout as
+        `StatisticsFeatureCollection.to_dict()`).
+    """
+    if data.ndim != 3:
+        raise ValueError(f"Array must be 3-dimensional (passed array has {data.ndim} dimensions).")
+    n_bands = data.shape[0]
+    band_names = [f"b{i + 1}" for i in range(n_bands)] if band_names is None else band_names
+    band_names = [band_names] if isinstance(band_names, str) else band_names
+    if len(band_names) != n_bands:
+        raise ValueError(f"<band_names> must be the same length as the number of bands in data ({n_bands}).")
+    percentiles = list(DEFAULT_PERCENTILES if p is None else p)
+
+    zone_ids, geometries = _zones(zones, crs=profile.get("crs"), id_key=id_key)
+    n_zones = len(zone_ids)
+    if n_zones == 0:
+        return {}
+    # Zone labels are 1..n_zones (0 is outside of all zones)
+    labels = rasterize(
+        [(geometry, i + 1) for i, geometry in enumerate(geometries) if geometry is not None and not geometry.is_empty],
+        out_shape=data.shape[1:],
+        transform=profile["transform"],
+        fill=0,
+        all_touched=all_touched,
+        dtype=int32,
+    ).ravel()
+    n_labels = n_zones + 1
+    zone_pixels = np_bincount(labels, minlength=n_labels)[1:]
+
+    data = ma.asarray(data).reshape(n_bands, -1)
+    bands, pixels = np_nonzero(~ma.getmaskarray(data) & (labels > 0)[None, :])
+    values = data.data[bands, pixels].astype(float64)
+    keys = bands * n_labels + labels[pixels]  # group of each valid pixel (band, zone)
+    n_keys = n_bands * n_labels
+
+    valid = np_bincount(keys, minlength=n_keys)
+    sums = np_bincount(keys, weights=values, minlength=n_keys)
+    with np_errstate(divide="ignore", invalid="ignore"):
+        means = sums / valid
+        std = np_sqrt(np_bincount(keys, weights=(values - means[keys]) ** 2, minlength=n_keys) / valid)
+
+    # Sort values within each group for min, max, and percentiles
+    order = np_lexsort((values, keys))
+    values_sorted = values[order]
+    group_keys = np_nonzero(valid)[0]  # sorted, so groups are in the same order as the sorted values
+    starts = (valid[group_keys].cumsum() - valid[group_keys]).astype(int)
+    quantiles = {}
+    for q in percentiles + [0, 50, 100]:
+        quantiles[q] = np_full(n_keys, nan)
+        quantiles[q][group_keys] = _grouped_percentiles(values_sorted, starts, valid[group_keys], q)
+
+    valid, sums, means, std = [a.reshape(n_bands, n_labels)[:, 1:] for a in (valid, sums, means, std)]
+    quantiles = {q: a.reshape(n_bands, n_labels)[:, 1:] for q, a in quantiles.items()}
+
+    statistics = {}
+    for z, zone_id in enumerate(zone_ids):
+        statistics[zone_id] = {
+            band_name: {
+                "min": _to_json(quantiles[0][b, z]),
+                "max": _to_json(quantiles[100][b, z]),
+                "mean": _to_json(means[b, z]),
+                "count": float(valid[b, z]),
+                "sum": _to_json(sums[b, z]) if valid[b, z] > 0 else None,
+                "std": _to_json(std[b, z]),
+                "median": _to_json(quantiles[50][b, z]),
+                "valid_percent": round(float(valid[b, z]) / zone_pixels[z] * 100, 2) if zone_pixels[z] > 0 else 0.0,
+                "masked_pixels": float(zone_pixels[z] - valid[b, z]),
+                "valid_pixels": float(valid[b, z]),
+                **{f"percentile_{int(q)}": _to_json(quantiles[q][b, z]) for q in percentiles},
+            }
+            for b, band_name in enumerate(band_names)
+        }
+    return statistics
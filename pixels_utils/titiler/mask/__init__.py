@@ -1,3 +1,4 @@
+from pixels_utils.titiler.mask._local_mask import apply_mask_lut, build_mask_lut
 from pixels_utils.titiler.mask._mask import build_numexpr_mask_enum
 
-__all__ = ["build_numexpr_mask_enum"]
+__all__ = ["apply_mask_lut", "build_mask_lut", "build_numexpr_mask_enum"]
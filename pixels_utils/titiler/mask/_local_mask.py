@@ -0,0 +1,52 @@
+from enum import Enum
+from typing import List
+
+import numpy.ma as ma
+from numpy import asarray as np_asarray
+from numpy import ndarray as np_ndarray
+from numpy import uint8
+from numpy import zeros as np_zeros
+from numpy.typing import ArrayLike
+
+N_CLASSES = 256  # Class assets (e.g., Sentinel-2 SCL) are uint8
+
+
+def build_mask_lut(mask_enum: List[Enum], whitelist: bool = True) -> np_ndarray:
+    """
+    Builds a boolean lookup table of valid classes, indexed by class value.
+
+    Example:
+        >>> from pixels_utils.titiler.mask.enum_classes import Sentinel2_SCL_Group
+        >>> lut = build_mask_lut(Sentinel2_SCL_Group.ARABLE, whitelist=True)
+        >>> lut[:6]
+        array([False, False, False, False,  True,  True])
+
+    Args:
+        mask_enum (List[Enum]): Classes to consider for pixel-based masking.
+        whitelist (bool, optional): If `True`, `mask_enum` classes are valid and all others are invalid; if `False`,
+        `mask_enum` classes are invalid and all others are valid. Defaults to True.
+
+    Returns:
+        np_ndarray: 256-element boolean array, where `lut[class]` is True if `class` is valid.
+    """
+    lut = np_zeros(N_CLASSES, dtype=bool)
+    lut[[int(class_enum) for class_enum in mask_enum]] = True
+    return lut if whitelist is True else ~lut
+
+
+def apply_mask_lut(array_classes: ArrayLike, lut: np_ndarray) -> np_ndarray:
+    """
+    Returns whether each pixel of a class array is valid according to `lut` (see `build_mask_lut()`).
+
+    Indexing a 256-element lookup table is a single pass over the class array, regardless of how many classes are in the
+    whitelist or blacklist.
+
+    Args:
+        array_classes (ArrayLike): Class array (e.g., Sentinel-2 SCL). If masked, the mask is ignored.
+        lut (np_ndarray): Boolean lookup table of valid classes.
+
+    Returns:
+        np_ndarray: Boolean array with the same shape as `array_classes` (True for valid pixels).
+    """
+    array_classes = ma.getdata(array_classes)
+    return lut[np_asarray(array_classes).astype(uint8, copy=False)]
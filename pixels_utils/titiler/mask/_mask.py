@@ -1,44 +1,26 @@
 from enum import Enum
-from typing import Generator, List, Union
+from typing import List, Union
 
 
-def _build_mask_by_assignment(
-    assignment: Generator[Union[int, Enum], Union[int, float], None], else_value: Union[int, float], mask_asset: str
-) -> str:
-    """Builds the NumExpr where clause to mask asset by scene classification.
+def _build_mask_condition(mask_enum: List[Union[int, Enum]], mask_asset: str) -> str:
+    """Builds the NumExpr condition that is True where `mask_asset` is any of the `mask_enum` classes.
 
     Args:
-        assignment (Generator[Union[int, Enum], Union[int, float]]): The assignment to be built into a NumExpr where
-        clause. The assignment is a generator of tuples, where the first element represents the value of pixels to
-        replace, and the second element represents the value to replace them with.
-
-        else_value (Union[int, float]): The value to assign to pixels that do not match.
-        mask_asset (str): The asset to be masked.
+        mask_enum (List[Union[int, Enum]]): The class values to match.
+        mask_asset (str): The asset containing the classes.
 
-    Whitelist example:
-        >>> from pixels_utils.stac_catalogs.earthsearch.v1 import EarthSearchCollections, expression_from_collection
-        >>> from pixels_utils.titiler.mask.enum_classes import Sentinel2_SCL, Sentinel2_SCL_Group
+    Example:
+        >>> from pixels_utils.titiler.mask.enum_classes import Sentinel2_SCL_Group
+        >>> print(_build_mask_condition(mask_enum=Sentinel2_SCL_Group.ARABLE, mask_asset="scl"))
+        "(scl==4)|(scl==5)"
 
-        >>> EXPRESSION_NDVI = expression_from_collection(collection=EarthSearchCollections.sentinel_2_l2a, spectral_index="NDVI").expression
-        >>> nodata = 0
-        >>> assignment = ((class_enum, EXPRESSION_NDVI) for class_enum in Sentinel2_SCL_Group.ARABLE)
-        >>> print(_build_mask_by_assignment(assignment=assignment, else_value=nodata, mask_asset="scl"))
-        "where(scl==4,(nir-red)/(nir+red),where(scl==5,(nir-red)/(nir+red),0))"
-
-    Blacklist example:
-        >>> EXPRESSION_NDVI = expression_from_collection(collection=EarthSearchCollections.sentinel_2_l2a, spectral_index="NDVI").expression
-        >>> assignment = ((class_enum, nodata) for class_enum in Sentinel2_SCL_Group.ARABLE)
-        >>> print(_build_mask_by_assignment(assignment=assignment, else_value=EXPRESSION_NDVI, mask_asset="scl"))
-        "where(scl==2,0,where(scl==3,0,where(scl==8,0,where(scl==9,0,where(scl==10,0,(nir-red)/(nir+red))))))"
+    Raises:
+        ValueError: If `mask_enum` is empty.
     """
-    class_enum, expression = next(assignment)
-    try:
-        else_value_final = _build_mask_by_assignment(
-            assignment=assignment, else_value=else_value, mask_asset=mask_asset
-        )
-    except StopIteration:
-        else_value_final = else_value
-    return f"where({mask_asset}=={int(class_enum)},{expression},{else_value_final})"
+    classes = list(dict.fromkeys(int(class_enum) for class_enum in mask_enum))  # drop duplicates, maintain order
+    if len(classes) == 0:
+        raise ValueError("<mask_enum> must contain at least one class.")
+    return "|".join([f"({mask_asset}=={class_value})" for class_value in classes])
 
 
 def build_numexpr_mask_enum(
@@ -50,6 +32,10 @@ def build_numexpr_mask_enum(
 ) -> str:
     """Builds the NumExpr `expression` as a "where clause" to mask `mask_enum` values from STAC Asset(s).
 
+    Each expression is emitted once, with all `mask_enum` classes combined into a single condition, e.g.:
+        whitelist: "where((scl==4)|(scl==5),(nir-red)/(nir+red),0);"
+        blacklist: "where((scl==4)|(scl==5),0,(nir-red)/(nir+red));"
+
     Note:
         Multiple expressions must be semicolon (;) delimited (e.g., "b1/b2;b2+b3").
         Refer to the [titiler source code](https://github.com/developmentseed/titiler/blob/495531cc81d7fb4e06299f6bd390d19048533373/src/titiler/core/titiler/core/dependencies.py#L122-L124)
@@ -71,16 +57,12 @@ def build_numexpr_mask_enum(
     """
     mask_value = 0.0 if mask_value is None else mask_value
 
-    expression = [expression] if isinstance(expression, str) else expression
-    if whitelist is True:  # whitelist - {expr} is part of the assignment
-        #
-        assignment = ((class_enum, "{expr}") for class_enum in mask_enum)
-        numexpr_str_template = "{0};".format(
-            _build_mask_by_assignment(assignment, else_value=mask_value, mask_asset="{mask_asset}")
-        )
-    else:  # blacklist - {expr} is the `else_value`
-        assignment = ((class_enum, mask_value) for class_enum in mask_enum)
-        numexpr_str_template = "{0};".format(
-            _build_mask_by_assignment(assignment, else_value="{expr}", mask_asset="{mask_asset}")
-        )
-    return "".join([numexpr_str_template.format(expr=expr, mask_asset=mask_asset) for expr in expression])
+    expression = [expr for expr in expression.split(";") if expr] if isinstance(expression, str) else expression
+    condition = _build_mask_condition(mask_enum, mask_asset=mask_asset)
+    if whitelist is True:  # whitelist - {expr} is kept where condition is True
+        numexpr_str_template = "where({condition},{expr},{mask_value});"
+    else:  # blacklist - {expr} is kept where condition is False
+        numexpr_str_template = "where({condition},{mask_value},{expr});"
+    return "".join(
+        [numexpr_str_template.format(condition=condition, expr=expr, mask_value=mask_value) for expr in expression]
+    )